@@ -58,9 +58,43 @@ import logging
 from datetime import datetime
 import os
 import time
+import threading
 
 logger = logging.getLogger(__name__)
 
+# 所有智能体共用一个 LLM 客户端：底层 HTTP 连接池（keep-alive）在并发的专科调用间复用，省去重复的 TCP/TLS 握手
+_shared_client: Optional[OpenAI] = None
+_shared_client_lock = threading.Lock()
+# 共享客户端的预热结果：None 表示尚未预热；每个客户端只预热一次
+_client_prewarmed: Optional[bool] = None
+_client_prewarm_lock = threading.Lock()
+
+def get_llm_client() -> OpenAI:
+    """获取进程内共享的 LLM 客户端（首次调用时创建，线程安全）"""
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = OpenAI(
+                    api_key=config.get_llm_api_key(),
+                    base_url=config.get_llm_base_url()
+                )
+    return _shared_client
+
+def prewarm_llm_client() -> bool:
+    """预热共享客户端：向 LLM 端点发一次轻量请求以建立连接，进程内只执行一次，失败不影响后续调用"""
+    global _client_prewarmed
+    if _client_prewarmed is None:
+        with _client_prewarm_lock:
+            if _client_prewarmed is None:
+                try:
+                    get_llm_client().models.list()
+                    _client_prewarmed = True
+                except Exception as e:
+                    logger.debug(f"LLM client prewarm failed: {e}")
+                    _client_prewarmed = False
+    return _client_prewarmed
+
 class BaseAgent(ABC):
     """智能体基类"""
     
@@ -70,17 +104,18 @@ class BaseAgent(ABC):
         self.specialty = specialty
         self.system_prompt = system_prompt
 
-        # 统一 LLM 客户端 (OpenAI / DeepSeek 兼容)
-        self.client = OpenAI(
-            api_key=config.get_llm_api_key(),
-            base_url=config.get_llm_base_url()
-        )
+        # 统一 LLM 客户端 (OpenAI / DeepSeek 兼容)，各智能体共享连接池
+        self.client = get_llm_client()
 
         # 历史记录 & RAG 缓存（延迟创建避免解析器类型注解问题）
         self.conversation_history = []  # list of dict
         # 结构: {raw, source, score, content}
         self.last_retrieved_chunks = []
     
+    def prewarm(self) -> bool:
+        """预热：各智能体共用一个客户端，委派给只执行一次的共享客户端预热"""
+        return prewarm_llm_client()
+
     @abstractmethod
     def analyze_case(self, case_info: Dict[str, Any], other_opinions: Optional[List[Dict[str, Any]]] = None, stream: bool = False) -> Any:
         """分析病例并提供专业意见
@@ -323,6 +358,11 @@ class BaseAgent(ABC):
             "response": response
         })
     
+    def clear_history(self):
+        """清空对话历史与RAG检索缓存（编排器复用时在会话之间调用）"""
+        self.conversation_history = []
+        self.last_retrieved_chunks = []
+    
     def _extract_confidence(self, response: str) -> float:
         """从响应中提取置信度分数
 
@@ -493,7 +533,8 @@ class BaseAgent(ABC):
         
         formatted_history = []
         for round_num in sorted(rounds.keys()):
-            formatted_history.append(f"\n=== 第{round_num}轮讨论 ===")
+            title = "多轮讨论前的意见" if round_num == 0 else f"第{round_num}轮讨论"
+            formatted_history.append(f"\n=== {title} ===")
             for opinion in rounds[round_num]:
                 agent_name = opinion.get('agent', '未知专家')
                 response = opinion.get('response', '')
@@ -427,10 +427,11 @@ class CoordinatorAgent(BaseAgent):
             return result
             
         except Exception as e:
-            logger.error(f"冲突检测过程出错: {str(e)}")
+            logger.error(f"冲突检测过程出错，按无冲突处理: {str(e)}")
             return {
                 "agent": self.name,
-                "conflicts_detected": True,  # 出错时默认有冲突
+                "conflict_detected": False,  # 出错时按无冲突处理，避免无谓的多轮讨论
+                "conflicts_detected": False,
                 "response": f"冲突检测过程出现错误: {str(e)}",
                 "consensus_score": 0.0,
                 "error": str(e),
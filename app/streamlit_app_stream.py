@@ -4,24 +4,35 @@
 """
 
 import streamlit as st
+import streamlit.components.v1 as components
 import time
 import json
 import markdown
+import numpy as np
 import html
 import re
 import glob
+import string
+import functools
+from collections import Counter
+import heapq
 from datetime import datetime
 from typing import Dict, Any, List, Optional, Generator
 import threading
 import queue
 import sys
 import os
+from pathlib import Path
+
+try:  # 可选依赖：orjson 序列化更快，缺失时回退标准库 json
+    import orjson
+except ImportError:
+    orjson = None
 
 # 添加项目根目录到路径
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(project_root)
 
-from mdt_system.orchestrator import MDTOrchestrator
 from utils.config import config
 from test_data import get_test_mdt_result
 import logging
@@ -39,6 +50,27 @@ def _get_cached_knowledge_store():
 # 轻量实例（内部惰性加载索引/嵌入），避免模块导入时阻塞
 knowledge_store = _get_cached_knowledge_store()
 
+# 编排器类惰性导入（智能体 / LLM 客户端等依赖较重），导入结果跨 rerun 缓存
+@st.cache_resource(show_spinner=False)
+def _get_orchestrator_cls():
+    from mdt_system.orchestrator import MDTOrchestrator
+    return MDTOrchestrator
+
+def _get_orchestrator():
+    """按浏览器会话复用编排器实例；编排器持有会话状态，不跨用户共享，复用前先重置"""
+    orchestrator = st.session_state.get('active_orchestrator')
+    if orchestrator is None:
+        orchestrator = _get_orchestrator_cls()()
+    else:
+        orchestrator.reset_session()
+    return orchestrator
+
+# 示例病例 JSON 缓存：以 (路径, mtime) 为键，文件修改后自动失效
+@st.cache_data(show_spinner=False)
+def _load_sample_case(path: Path, mtime: float) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
 # 设置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -438,9 +470,78 @@ st.markdown("""
     .mdt-flow-rounds {margin-top:6px;font-size:11px;color:#37486b;font-weight:600;}
     .mdt-flow-active-agents {margin-top:4px;font-size:10px;color:#5b6472;}
     .mdt-flow-divider {height:1px;background:linear-gradient(90deg,transparent,#c8d2e2,transparent);margin:12px 0;}
+
+    /* 结果卡片（模板仅内联随数据变化的颜色） */
+    .mdt-card {background:white;border-radius:15px;margin-bottom:20px;box-shadow:0 4px 12px rgba(0,0,0,0.15);overflow:hidden;border:1px solid #e0e0e0;}
+    .mdt-card-header {color:white;padding:15px;text-align:center;}
+    .mdt-card-header h4 {margin:0;color:white;font-size:16px;}
+    .mdt-card-header p {margin:5px 0 0 0;color:rgba(255,255,255,0.9);font-size:12px;}
+    .mdt-card-body {padding:20px;}
+    .mdt-card-footer {border-top:1px solid #eee;padding-top:10px;margin-top:15px;color:#666;}
+    .mdt-status-card {border:2px solid;border-radius:15px;padding:20px;margin:10px 0;box-shadow:0 4px 8px rgba(0,0,0,0.1);text-align:center;}
+    .mdt-status-card h3 {margin:0;}
+    .mdt-status-card p {margin:5px 0;font-size:16px;color:#333;}
+    .mdt-score-pill {color:white;padding:10px;border-radius:10px;text-align:center;}
+    .mdt-coord-metrics {display:flex;gap:16px;margin:10px 0;}
+    .mdt-coord-box {flex:1;color:white;padding:20px;border-radius:15px;text-align:center;box-shadow:0 4px 8px rgba(0,0,0,0.1);}
+    .mdt-coord-box h2 {margin:0;color:white;}
+    .mdt-coord-box p {margin:5px 0;}
+    .mdt-coord-consensus {background:linear-gradient(135deg,#667eea 0%,#764ba2 100%);}
+    .mdt-coord-rounds {background:linear-gradient(135deg,#f093fb 0%,#f5576c 100%);}
+    .mdt-coord-frame {background:linear-gradient(135deg,#667eea 0%,#764ba2 100%);padding:3px;border-radius:15px;margin:10px 0;}
+    .mdt-coord-inner {background:white;padding:25px;border-radius:12px;box-shadow:0 4px 8px rgba(0,0,0,0.1);}
+    .mdt-coord-agent {background:linear-gradient(135deg,#667eea 0%,#764ba2 100%);color:white;padding:10px 20px;border-radius:10px;text-align:center;margin-bottom:20px;}
+    .mdt-coord-agent h4 {margin:0;color:white;}
 </style>
 """, unsafe_allow_html=True)
 
+# 示例病例（模块级常量，避免每次 rerun 重建）
+_SAMPLE_CASES = {
+    "CTD-ILD": {
+        "file": "ctd_ild_case.json",
+        "description": "类风湿关节炎相关间质性肺病，UIP模式"
+    },
+    "IPF": {
+        "file": "ipf_case.json",
+        "description": "特发性肺纤维化，典型UIP模式，快速进展"
+    },
+    "过敏性肺炎": {
+        "file": "hp_case.json",
+        "description": "慢性过敏性肺炎，鸽子暴露相关"
+    },
+    "机化性肺炎": {
+        "file": "op_case.json",
+        "description": "机化性肺炎，激素敏感型"
+    },
+    "肺癌": {
+        "file": "lung_cancer_case.json",
+        "description": "肺腺癌，分期和治疗决策"
+    },
+    "乳腺癌": {
+        "file": "breast_cancer_case.json",
+        "description": "乳腺癌，多学科综合治疗"
+    }
+}
+
+# 示例病例文件的绝对路径表（导入时计算一次）
+_SAMPLE_CASE_PATHS = {
+    name: Path(project_root) / "data" / "sample_cases" / info["file"]
+    for name, info in _SAMPLE_CASES.items()
+}
+
+# 病例录入表单各字段的填写说明
+_FIELD_PLACEHOLDERS = {
+    "patient_id": "请输入患者唯一标识码，如：ILD_001",
+    "chief_complaint": "请描述患者主要症状，如：\n• 呼吸困难的性质和程度\n• 咳嗽特点（干咳/有痰）\n• 症状持续时间\n• 诱发或缓解因素",
+    "medical_history": "请详细记录患者既往病史，如：\n• 自身免疫性疾病史\n• 长期用药史\n• 职业暴露史\n• 家族史等",
+    "present_illness": "请描述现病史，如：\n• 起病时间和方式\n• 症状演变过程\n• 就诊经过\n• 治疗效果等",
+    "examination_results": "请填写影像学检查结果，如：\n• HRCT表现\n• X线胸片\n• 其他影像学检查\n• 典型征象描述",
+    "physical_examination": "请记录体格检查结果，如：\n• 胸部听诊所见\n• 呼吸音特点\n• 啰音分布\n• 其他阳性体征",
+    "lab_results": "请填写实验室检查结果，如：\n• 血常规\n• 生化指标\n• 炎症标志物\n• 免疫指标等",
+    "biomarker_results": "请填写生物标志物检测结果，如：\n• 自身抗体\n• ILD相关标志物\n• KL-6、SP-A、SP-D等\n• 其他特异性标志物",
+    "pulmonary_function_tests": "请填写肺功能检查结果，如：\n• FVC、FEV1等指标\n• DLCO检测结果\n• 通气功能评估\n• 气体交换功能",
+}
+
 # 专家配色方案
 EXPERT_COLORS = {
     "呼吸科专家": "#667eea",
@@ -462,6 +563,100 @@ EXPERT_NAME_MAPPING = {
     "MDT协调员": ["coordinator", "协调员", "mdt协调员"]
 }
 
+@functools.lru_cache(maxsize=None)
+def _build_expert_reverse_index(selected_experts: tuple) -> Dict[str, str]:
+    """构建 {别名(小写): 专家名} 反向索引，按所选专家组合缓存"""
+    rev: Dict[str, str] = {}
+    for expert_name in selected_experts:
+        for k in EXPERT_NAME_MAPPING.get(expert_name, [expert_name]):
+            rev.setdefault(k.lower(), expert_name)
+        rev.setdefault(expert_name.lower(), expert_name)
+    return rev
+
+def _filter_by_experts(data: Dict[str, Any], selected_experts: List[str]) -> Dict[str, Any]:
+    """按所选专家过滤阶段结果：先做键 / agent 字段的 O(1) 查表，未命中再回退子串匹配"""
+    selected = tuple(selected_experts)
+    rev = _build_expert_reverse_index(selected)
+    # 常见情况：所选专家覆盖全部数据键，直接返回原数据
+    if all(key.lower() in rev for key in data):
+        return data
+    filtered: Dict[str, Any] = {}
+    for key, value in data.items():
+        agent_name = value.get('agent', '') if isinstance(value, dict) else ''
+        if key.lower() in rev or (agent_name and agent_name.lower() in rev):
+            filtered[key] = value
+            continue
+        # 回退：保留原有的子串匹配语义（如 "呼吸科医生(主治)" 之类的变体名称）
+        for expert_name in selected:
+            if expert_name in key or (agent_name and (
+                expert_name in agent_name
+                or any(keyword in agent_name for keyword in EXPERT_NAME_MAPPING.get(expert_name, []))
+            )):
+                filtered[key] = value
+                break
+    return filtered
+
+# 专家卡片：收起状态下的摘要长度与清洗用正则
+_CARD_SUMMARY_CHARS = 200
+_SCRIPT_TAG_RE = re.compile(r"<\/?(script|iframe|style)[^>]*>", re.IGNORECASE)
+_EXTRA_BLANK_RE = re.compile(r"\n{3,}")
+
+# HTML 卡片模板：模块级预构建，每张卡片只发出一次 st.markdown
+# （模板顶格书写，避免 st.markdown 的 dedent 与嵌入内容缩进不一致时被当作代码块；
+#  公共样式见顶部 CSS 中的 .mdt-card / .mdt-status-card / .mdt-score-pill / .mdt-coord-*，
+#  模板内只保留随数据变化的颜色）
+_EXPERT_CARD_TPL = string.Template("""
+<div class="mdt-card">
+<div class="mdt-card-header" style="background: $color;">
+<h4>$name</h4>
+<p>$specialty</p>
+</div>
+<div class="mdt-card-body">
+<div class="card-scroll">$content</div>
+<div class="mdt-card-footer"><small>时间: $time</small></div>
+</div>
+</div>
+""")
+
+# 全宽阶段卡片：标题 + 说明 + 状态块合并为一次输出
+_PHASE_STATUS_CARD_TPL = string.Template("""
+<div class="phase-wide-card">
+<h3 class="section-title">$title</h3>
+<p class="sub-note">$note</p>
+<div class="mdt-status-card" style="background: $bg; border-color: $border;">
+<h3 style="color: $border;">$icon $heading</h3>
+<p>$status</p>
+</div>
+</div>
+""")
+
+_PHASE_HEADER_TPL = string.Template("""
+<div class="phase-wide-card">
+<h3 class="section-title">$title</h3>
+<p class="sub-note">$note</p>
+</div>
+""")
+
+_SCORE_PILL_TPL = string.Template(
+    '<div class="mdt-score-pill" style="background: $color;"><strong>共识度: $score</strong></div>'
+)
+
+# 最终协调：三个指标块以 flex 行一次输出，替代 st.columns(3) + 三次 st.markdown
+_COORD_METRICS_TPL = string.Template("""
+<div class="mdt-coord-metrics">
+<div class="mdt-coord-box mdt-coord-consensus"><h2>$consensus</h2><p>最终共识度</p></div>
+<div class="mdt-coord-box mdt-coord-rounds"><h2>$rounds</h2><p>讨论轮数</p></div>
+<div class="mdt-coord-box" style="background: $status_color;"><h2>$status_icon</h2><p>$status_text</p></div>
+</div>
+""")
+
+_COORD_RESPONSE_TPL = string.Template("""
+<div class="mdt-coord-frame">
+<div class="mdt-coord-inner">
+<div class="mdt-coord-agent"><h4>$agent</h4></div>$content</div>
+</div>
+""")
+
 def get_expert_color(expert_name: str) -> str:
     """获取专家对应的颜色"""
     for key, color in EXPERT_COLORS.items():
@@ -590,6 +785,74 @@ def render_markdown_content(content: str) -> str:
     <div class=\"mdt-md\">{formatted_content}</div>
     """
 
+@st.cache_data(show_spinner=False, max_entries=1024, ttl=3600)
+def _render_markdown_cached(content: str) -> str:
+    """结果视图使用的缓存版渲染：MDT 结果生成后不再变化，跨 rerun 复用 HTML。
+    流式输出的中间文本每次都不同，仍直接调用 render_markdown_content，避免污染缓存。"""
+    return render_markdown_content(content)
+
+@functools.lru_cache(maxsize=64)
+def _preview(text: str, n: int = 4000) -> str:
+    """Prompt 预览截断（str 的哈希值会被缓存，重复 rerun 时直接命中）"""
+    return text[:n]
+
+@functools.lru_cache(maxsize=4096)
+def _fmt_ts(ts: str) -> str:
+    """ISO 时间戳 → HH:MM:SS（结果中的时间戳不可变，跨 rerun 复用解析结果）"""
+    if not ts:
+        return 'N/A'
+    try:
+        return datetime.fromisoformat(ts).strftime('%H:%M:%S')
+    except Exception:
+        return ts
+
+_ORJSON_OPTS = (orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson is not None else 0
+
+def _dumps(obj: Any) -> str:
+    """结果 JSON 序列化（缩进 2、保留中文），优先使用 orjson"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=_ORJSON_OPTS).decode()
+        except TypeError:  # orjson.JSONEncodeError 是 TypeError 子类；交给标准库处理
+            pass
+    return json.dumps(obj, ensure_ascii=False, indent=2)
+
+def _dumps_phase(phase_result: Any) -> Optional[bytes]:
+    """流式阶段完成时预序列化阶段结果；无 orjson 或无法序列化时返回 None"""
+    if orjson is None:
+        return None
+    try:
+        return orjson.dumps(phase_result, option=_ORJSON_OPTS)
+    except TypeError:
+        return None
+
+def _dumps_result(result: Dict[str, Any], phases_raw: Optional[Dict[str, bytes]] = None) -> str:
+    """导出完整结果：若各阶段已预序列化，则只序列化外层字段并拼接阶段字节，避免重复遍历阶段内容"""
+    phases = result.get("phases")
+    if (orjson is None or not phases or not phases_raw
+            or set(phases) != set(phases_raw) or any(v is None for v in phases_raw.values())):
+        return _dumps(result)
+    head = {k: v for k, v in result.items() if k != "phases"}
+    try:
+        head_bytes = orjson.dumps(head, option=_ORJSON_OPTS)
+    except TypeError:
+        return _dumps(result)
+    # 阶段子树整体右移两级缩进，输出与整体 OPT_INDENT_2 序列化一致（phases 字段位于末尾）
+    body = b",\n".join(
+        b"    " + orjson.dumps(k) + b": " + phases_raw[k].replace(b"\n", b"\n    ")
+        for k in phases
+    )
+    phases_bytes = b'  "phases": {\n' + body + b"\n  }"
+    if head_bytes == b"{}":
+        return (b"{\n" + phases_bytes + b"\n}").decode()
+    return (head_bytes[:-2] + b",\n" + phases_bytes + b"\n}").decode()
+
+def _metric_row(items: List[tuple]):
+    """一行指标：单次 st.columns，直接调用列对象的 metric 方法"""
+    cols = st.columns(len(items))
+    for col, (label, value) in zip(cols, items):
+        col.metric(label, value)
+
 def display_case_summary():
     """显示病例摘要信息（只读模式）"""
     case_data = st.session_state.get("case_data", {})
@@ -668,6 +931,11 @@ def main():
             available_experts,
             default=available_experts
         )
+        st.checkbox(
+            "显示全部交互边",
+            key="show_all_edges",
+            help=f"协作图默认隐藏弱互动边，并最多绘制权重最高的 {_MAX_GRAPH_EDGES} 条边"
+        )
 
         if st.button(
             "🚀 开始MDT讨论",
@@ -821,102 +1089,104 @@ def main():
         if st.button("♻️ 热加载全部", use_container_width=True):
             _reload_all_prompts()
             st.success("Prompt 已热加载")
-        # 友好标签 & 分类过滤
-        col_pf, col_cat = st.columns([2,1])
-        with col_pf:
-            prompt_filter = st.text_input("按 ID 过滤 (前缀)", "")
-        with col_cat:
-            cat_filter = st.selectbox(
-                "分类过滤",
-                options=["(全部)", "系统提示", "主分析", "协调流程", "病理子任务", "风湿子任务", "数据子任务", "通用任务", "清单"],
-                index=0
-            )
-        try:
-            _all_prompts = _list_prompts()
-            # 读取全部元数据并按 group 聚合
-            from prompts.loader import get_prompt_meta as __pm
-            group_map: dict[str, list[str]] = {}
-            for pid in _all_prompts.keys():
-                meta = __pm(pid) or {}
-                g = meta.get('group', '未分组') or '未分组'
-                group_map.setdefault(g, []).append(pid)
-            keys_raw = sorted(_all_prompts.keys())
-            def _visible(pid: str) -> bool:
-                if prompt_filter and not pid.startswith(prompt_filter.upper()):
-                    return False
-                if cat_filter and cat_filter != "(全部)":
-                    meta = _get_prompt_meta(pid)
-                    if not meta or meta.get('category') != cat_filter:
+        # 浏览器默认折叠：未勾选时跳过元数据读取与按钮渲染
+        if st.checkbox("🔎 打开 Prompt 浏览器", key="__show_prompt_explorer"):
+            # 友好标签 & 分类过滤
+            col_pf, col_cat = st.columns([2,1])
+            with col_pf:
+                prompt_filter = st.text_input("按 ID 过滤 (前缀)", "")
+            with col_cat:
+                cat_filter = st.selectbox(
+                    "分类过滤",
+                    options=["(全部)", "系统提示", "主分析", "协调流程", "病理子任务", "风湿子任务", "数据子任务", "通用任务", "清单"],
+                    index=0
+                )
+            try:
+                _all_prompts = _list_prompts()
+                # 读取全部元数据（每次 rerun 只查一遍，后续分组/过滤/预览复用）并按 group 聚合
+                meta_index: dict[str, dict] = {pid: _get_prompt_meta(pid) or {} for pid in _all_prompts}
+                group_map: dict[str, list[str]] = {}
+                for pid, meta in meta_index.items():
+                    g = meta.get('group', '未分组') or '未分组'
+                    group_map.setdefault(g, []).append(pid)
+                keys_raw = sorted(_all_prompts.keys())
+                def _visible(pid: str) -> bool:
+                    if prompt_filter and not pid.startswith(prompt_filter.upper()):
                         return False
-                return True
-            keys = [k for k in keys_raw if _visible(k)]
-            # 树形分组展示
-            with st.expander("按智能体分组浏览 (Group → Prompts)", expanded=False):
-                for g_name in sorted(group_map.keys()):
-                    with st.container():
-                        st.markdown(f"**📂 {g_name}**")
-                        sub_cols = st.columns(2)
-                        col_idx = 0
-                        for pid in sorted(group_map[g_name]):
-                            if pid not in keys:  # 过滤后不可见
-                                continue
-                            meta = _get_prompt_meta(pid) or {}
-                            label = meta.get('label', pid)
-                            short_desc = meta.get('description', '')[:40]
-                            with sub_cols[col_idx % 2]:
-                                if st.button(f"{label}\n{pid}", key=f"btn_{pid}", help=short_desc):
-                                    st.session_state['__prompt_selected_pid'] = pid
-                            col_idx += 1
-                        st.markdown("---")
-            # 回退：下拉快速定位 + 与按钮互通
-            display_options = ["(选择以预览)"]
-            id_map: dict[str, str | None] = {"(选择以预览)": None}
-            for pid in keys:
-                meta = _get_prompt_meta(pid) or {}
-                label = meta.get('label', pid)
-                display_text = f"{label} · {pid}"
-                display_options.append(display_text)
-                id_map[display_text] = pid
-            selected_display = st.selectbox("快速选择", options=display_options, key="select_prompt_dropdown")
-            selected_pid = (id_map.get(selected_display) if selected_display else None) or st.session_state.get('__prompt_selected_pid')
-            if selected_pid:
-                raw_text = _get_prompt(selected_pid)
-                meta = _get_prompt_meta(selected_pid) or {}
-                st.caption(f"文件: {_all_prompts[selected_pid]}")
-                st.markdown(f"**名称:** {meta.get('label', selected_pid)}  ")
-                if meta.get('description'):
-                    st.markdown(f"**说明:** {meta['description']}")
-                badge_cols = st.columns(3)
-                with badge_cols[0]:
-                    st.metric("分类", meta.get('category', '—'))
-                with badge_cols[1]:
-                    st.metric("角色", meta.get('role', '—'))
-                with badge_cols[2]:
-                    st.metric("ID", selected_pid)
-                with st.expander("查看原始Markdown", expanded=False):
-                    st.code(raw_text[:4000], language="markdown")
-                # 占位符检测
-                import re as _re
-                ph = sorted(set(_re.findall(r"\{([a-zA-Z_][a-zA-Z0-9_]*)\}", raw_text)))
-                if ph:
-                    st.write("占位符:", ", ".join(ph))
-                # 演示安全格式化
-                if st.checkbox("⚙️ 演示 safe_format", key=f"sf_{selected_pid}"):
-                    demo_json = st.text_area("提供 JSON 格式数据 (可缺失)", value="{}", height=120)
-                    try:
-                        import json as _json
-                        data_obj = _json.loads(demo_json or '{}')
-                        formatted, missing = _safe_format(raw_text, **data_obj)
-                        st.markdown("**格式化结果 (截断前 800 字):**")
-                        st.code(formatted[:800], language="markdown")
-                        if missing:
-                            st.warning("缺失变量: " + ", ".join(missing))
-                        else:
-                            st.success("无缺失变量")
-                    except Exception as _e:
-                        st.error(f"解析/格式化失败: {_e}")
-        except Exception as _e:
-            st.warning(f"加载 Prompt 列表失败: {_e}")
+                    if cat_filter and cat_filter != "(全部)":
+                        if meta_index.get(pid, {}).get('category') != cat_filter:
+                            return False
+                    return True
+                keys = [k for k in keys_raw if _visible(k)]
+                # 树形分组展示
+                with st.expander("按智能体分组浏览 (Group → Prompts)", expanded=False):
+                    for g_name in sorted(group_map.keys()):
+                        with st.container():
+                            st.markdown(f"**📂 {g_name}**")
+                            sub_cols = st.columns(2)
+                            col_idx = 0
+                            for pid in sorted(group_map[g_name]):
+                                if pid not in keys:  # 过滤后不可见
+                                    continue
+                                meta = meta_index.get(pid, {})
+                                label = meta.get('label', pid)
+                                short_desc = meta.get('description', '')[:40]
+                                with sub_cols[col_idx % 2]:
+                                    if st.button(f"{label}\n{pid}", key=f"btn_{pid}", help=short_desc):
+                                        st.session_state['__prompt_selected_pid'] = pid
+                                col_idx += 1
+                            st.markdown("---")
+                # 回退：下拉快速定位 + 与按钮互通
+                display_options = ["(选择以预览)"]
+                id_map: dict[str, str | None] = {"(选择以预览)": None}
+                for pid in keys:
+                    label = meta_index.get(pid, {}).get('label', pid)
+                    display_text = f"{label} · {pid}"
+                    display_options.append(display_text)
+                    id_map[display_text] = pid
+                selected_display = st.selectbox("快速选择", options=display_options, key="select_prompt_dropdown")
+                selected_pid = (id_map.get(selected_display) if selected_display else None) or st.session_state.get('__prompt_selected_pid')
+                if selected_pid:
+                    raw_text = _get_prompt(selected_pid)
+                    meta = meta_index.get(selected_pid, {})
+                    st.caption(f"文件: {_all_prompts[selected_pid]}")
+                    st.markdown(f"**名称:** {meta.get('label', selected_pid)}  ")
+                    if meta.get('description'):
+                        st.markdown(f"**说明:** {meta['description']}")
+                    _metric_row([
+                        ("分类", meta.get('category', '—')),
+                        ("角色", meta.get('role', '—')),
+                        ("ID", selected_pid),
+                    ])
+                    with st.expander("查看原始Markdown", expanded=False):
+                        st.code(_preview(raw_text, 4000), language="markdown")
+                    # 占位符检测
+                    import re as _re
+                    ph = sorted(set(_re.findall(r"\{([a-zA-Z_][a-zA-Z0-9_]*)\}", raw_text)))
+                    if ph:
+                        st.write("占位符:", ", ".join(ph))
+                    # 演示安全格式化
+                    if st.checkbox("⚙️ 演示 safe_format", key=f"sf_{selected_pid}"):
+                        demo_json = st.text_area("提供 JSON 格式数据 (可缺失)", value="{}", height=120)
+                        # 仅在点击按钮时解析 JSON 并格式化，避免每次输入都触发
+                        fmt_key = f"_fmt_{selected_pid}"
+                        if st.button("应用格式化", key=f"apply_fmt_{selected_pid}"):
+                            try:
+                                data_obj = json.loads(demo_json or '{}')
+                                st.session_state[fmt_key] = _safe_format(raw_text, **data_obj)
+                            except Exception as _e:
+                                st.error(f"解析/格式化失败: {_e}")
+                        fmt_result = st.session_state.get(fmt_key)
+                        if fmt_result:
+                            formatted, missing = fmt_result
+                            st.markdown("**格式化结果 (截断前 800 字):**")
+                            st.code(_preview(formatted, 800), language="markdown")
+                            if missing:
+                                st.warning("缺失变量: " + ", ".join(missing))
+                            else:
+                                st.success("无缺失变量")
+            except Exception as _e:
+                st.warning(f"加载 Prompt 列表失败: {_e}")
     
     # 病例信息显示/输入
     if not st.session_state.get("start_stream", False):
@@ -924,39 +1194,12 @@ def main():
         
         # 添加示例病例选择功能
         with st.expander("📁 示例病例选择", expanded=True):
-            sample_cases = {
-                "CTD-ILD": {
-                    "file": "ctd_ild_case.json",
-                    "description": "类风湿关节炎相关间质性肺病，UIP模式"
-                },
-                "IPF": {
-                    "file": "ipf_case.json", 
-                    "description": "特发性肺纤维化，典型UIP模式，快速进展"
-                },
-                "过敏性肺炎": {
-                    "file": "hp_case.json",
-                    "description": "慢性过敏性肺炎，鸽子暴露相关"
-                },
-                "机化性肺炎": {
-                    "file": "op_case.json",
-                    "description": "机化性肺炎，激素敏感型"
-                },
-                "肺癌": {
-                    "file": "lung_cancer_case.json",
-                    "description": "肺腺癌，分期和治疗决策"
-                },
-                "乳腺癌": {
-                    "file": "breast_cancer_case.json", 
-                    "description": "乳腺癌，多学科综合治疗"
-                }
-            }
-            
             col_select, col_load = st.columns([3, 1])
             
             with col_select:
                 selected_case = st.selectbox(
                     "选择示例病例类型",
-                    options=list(sample_cases.keys()),
+                    options=list(_SAMPLE_CASES.keys()),
                     help="选择不同类型的病例进行测试"
                 )
             
@@ -964,22 +1207,20 @@ def main():
                 st.write("")  # 添加空行对齐
                 if st.button(f"📁 加载", key="load_case"):
                     try:
-                        if selected_case and selected_case in sample_cases:
-                            case_file = sample_cases[selected_case]["file"]
-                            case_path = os.path.join(project_root, "data", "sample_cases", case_file)
-                            with open(case_path, 'r', encoding='utf-8') as f:
-                                sample_case = json.load(f)
+                        if selected_case and selected_case in _SAMPLE_CASES:
+                            case_path = _SAMPLE_CASE_PATHS[selected_case]
+                            sample_case = _load_sample_case(case_path, case_path.stat().st_mtime)
                             st.session_state.sample_case = sample_case
                             st.success(f"✅ {selected_case}示例病例已加载")
-                            st.info(f"📝 {sample_cases[selected_case]['description']}")
+                            st.info(f"📝 {_SAMPLE_CASES[selected_case]['description']}")
                             st.rerun()
                         else:
                             st.error("请先选择一个病例")
                     except Exception as e:
                         st.error(f"加载示例病例失败: {e}")
             
-            if selected_case and selected_case in sample_cases:
-                st.markdown(f"**{selected_case}**: {sample_cases[selected_case]['description']}")
+            if selected_case and selected_case in _SAMPLE_CASES:
+                st.markdown(f"**{selected_case}**: {_SAMPLE_CASES[selected_case]['description']}")
         
         # 病例信息表单 - 3行3列布局
         # 如果有加载的示例病例，使用其数据作为默认值，否则显示填写说明
@@ -998,18 +1239,18 @@ def main():
         with col1_1:
             patient_id = st.text_input("患者ID", 
                 value=sample_data.get("patient_id", ""),
-                placeholder="请输入患者唯一标识码，如：ILD_001" if not has_loaded_case else "")
+                placeholder=_FIELD_PLACEHOLDERS["patient_id"] if not has_loaded_case else "")
         
         with col1_2:
             chief_complaint = st.text_area("主要症状", 
                 value=sample_data.get("chief_complaint", ""),
-                placeholder="请描述患者主要症状，如：\n• 呼吸困难的性质和程度\n• 咳嗽特点（干咳/有痰）\n• 症状持续时间\n• 诱发或缓解因素" if not has_loaded_case else "",
+                placeholder=_FIELD_PLACEHOLDERS["chief_complaint"] if not has_loaded_case else "",
                 height=100)
         
         with col1_3:
             medical_history = st.text_area("既往史", 
                 value=sample_data.get("medical_history", ""),
-                placeholder="请详细记录患者既往病史，如：\n• 自身免疫性疾病史\n• 长期用药史\n• 职业暴露史\n• 家族史等" if not has_loaded_case else "",
+                placeholder=_FIELD_PLACEHOLDERS["medical_history"] if not has_loaded_case else "",
                 height=100)
         
         # 第二行
@@ -1018,19 +1259,19 @@ def main():
         with col2_1:
             present_illness = st.text_area("现病史", 
                 value=sample_data.get("symptoms", ""),
-                placeholder="请描述现病史，如：\n• 起病时间和方式\n• 症状演变过程\n• 就诊经过\n• 治疗效果等" if not has_loaded_case else "",
+                placeholder=_FIELD_PLACEHOLDERS["present_illness"] if not has_loaded_case else "",
                 height=120)
         
         with col2_2:
             examination_results = st.text_area("检查结果", 
                 value=sample_data.get("imaging_results", ""),
-                placeholder="请填写影像学检查结果，如：\n• HRCT表现\n• X线胸片\n• 其他影像学检查\n• 典型征象描述" if not has_loaded_case else "",
+                placeholder=_FIELD_PLACEHOLDERS["examination_results"] if not has_loaded_case else "",
                 height=120)
         
         with col2_3:
             physical_examination = st.text_area("体格检查", 
                 value=sample_data.get("physical_examination", ""),
-                placeholder="请记录体格检查结果，如：\n• 胸部听诊所见\n• 呼吸音特点\n• 啰音分布\n• 其他阳性体征" if not has_loaded_case else "",
+                placeholder=_FIELD_PLACEHOLDERS["physical_examination"] if not has_loaded_case else "",
                 height=120)
         
         # 第三行
@@ -1039,35 +1280,44 @@ def main():
         with col3_1:
             lab_results = st.text_area("实验室检查", 
                 value=sample_data.get("lab_results", ""),
-                placeholder="请填写实验室检查结果，如：\n• 血常规\n• 生化指标\n• 炎症标志物\n• 免疫指标等" if not has_loaded_case else "",
+                placeholder=_FIELD_PLACEHOLDERS["lab_results"] if not has_loaded_case else "",
                 height=100)
         
         with col3_2:
             biomarker_results = st.text_area("生物标志物", 
                 value=sample_data.get("biomarker_results", ""),
-                placeholder="请填写生物标志物检测结果，如：\n• 自身抗体\n• ILD相关标志物\n• KL-6、SP-A、SP-D等\n• 其他特异性标志物" if not has_loaded_case else "",
+                placeholder=_FIELD_PLACEHOLDERS["biomarker_results"] if not has_loaded_case else "",
                 height=100)
         
         with col3_3:
             pulmonary_function_tests = st.text_area("肺功能检查", 
                 value=sample_data.get("pulmonary_function_tests", ""),
-                placeholder="请填写肺功能检查结果，如：\n• FVC、FEV1等指标\n• DLCO检测结果\n• 通气功能评估\n• 气体交换功能" if not has_loaded_case else "",
+                placeholder=_FIELD_PLACEHOLDERS["pulmonary_function_tests"] if not has_loaded_case else "",
                 height=100)
             
         # 保存病例数据到session state（包含所有字段）
-        st.session_state.case_data = {
-            "patient_id": patient_id,
-            "chief_complaint": chief_complaint,
-            "present_illness": present_illness,
-            "medical_history": medical_history,
-            "examination_results": examination_results,
-            "physical_examination": physical_examination,
-            "lab_results": lab_results,
-            "biomarker_results": biomarker_results,
-            "pulmonary_function_tests": pulmonary_function_tests,
-            "timestamp": datetime.now().isoformat(),
-            "full_case_data": sample_data  # 保存完整的病例数据
-        }
+        # 仅在输入变化时重建，保持 timestamp 稳定，避免无谓地使下游缓存失效
+        case_sig = hash((
+            patient_id, chief_complaint, present_illness, medical_history,
+            examination_results, physical_examination, lab_results,
+            biomarker_results, pulmonary_function_tests,
+            sample_data.get("patient_id") if sample_data else None,  # 已加载病例的稳定标识；未加载时为 None
+        ))
+        if st.session_state.get("_case_sig") != case_sig or "case_data" not in st.session_state:
+            st.session_state._case_sig = case_sig
+            st.session_state.case_data = {
+                "patient_id": patient_id,
+                "chief_complaint": chief_complaint,
+                "present_illness": present_illness,
+                "medical_history": medical_history,
+                "examination_results": examination_results,
+                "physical_examination": physical_examination,
+                "lab_results": lab_results,
+                "biomarker_results": biomarker_results,
+                "pulmonary_function_tests": pulmonary_function_tests,
+                "timestamp": datetime.now().isoformat(),
+                "full_case_data": sample_data  # 保存完整的病例数据
+            }
     
     # 在MDT讨论时显示病例信息并执行MDT
     elif st.session_state.get("start_stream", False) and not st.session_state.get("stream_complete", False):
@@ -1088,7 +1338,7 @@ def main():
         
         if st.button("🔄 开始新的讨论"):
             # 重置状态
-            for key in ["start_stream", "stream_complete", "current_phase", "expert_containers", "mdt_result"]:
+            for key in ["start_stream", "stream_complete", "current_phase", "expert_containers", "mdt_result", "mdt_phases_raw"]:
                 if key in st.session_state:
                     del st.session_state[key]
             st.rerun()
@@ -1101,13 +1351,11 @@ def display_mdt_results(result: Dict[str, Any], case_data: Dict[str, Any]):
     
     # 基本信息
     st.subheader("📄 会议基本信息")
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.metric("会议ID", result.get("session_id", "N/A"))
-    with col2:
-        st.metric("参与专家", len(selected_experts))
-    with col3:
-        st.metric("会议时长", result.get("duration", "N/A"))
+    _metric_row([
+        ("会议ID", result.get("session_id", "N/A")),
+        ("参与专家", len(selected_experts)),
+        ("会议时长", result.get("duration", "N/A")),
+    ])
     
     # 各阶段结果
     st.subheader("🔍 多轮MDT讨论结果")
@@ -1141,29 +1389,21 @@ def display_mdt_results(result: Dict[str, Any], case_data: Dict[str, Any]):
     # 下载结果
     display_download_section(result, case_data)
 
+def _render_expert_grid(agent_list: List[tuple], phase_tag: str, round_num: Optional[int] = None):
+    """以单个 st.columns 布局渲染专家卡片（每行最多3个，按列轮转填充）"""
+    cols_per_row = min(3, len(agent_list))
+    cols = st.columns(cols_per_row)
+    for idx, (_agent_name, response) in enumerate(agent_list):
+        with cols[idx % cols_per_row]:
+            display_expert_card(response, idx, phase_tag, round_num)
+
 def display_individual_analysis(individual_data: Dict[str, Any], selected_experts: List[str]):
     """显示各专科独立分析"""
     st.markdown("### 🏥 各专科独立分析")
     st.markdown("每位专家基于病例信息进行独立分析，确保观点的客观性和多样性")
     
     # 过滤只显示选中的专家
-    filtered_data = {}
-    for key, value in individual_data.items():
-        expert_found = False
-        for expert_name in selected_experts:
-            possible_keys = EXPERT_NAME_MAPPING.get(expert_name, [expert_name])
-            if key in possible_keys or expert_name in key:
-                filtered_data[key] = value
-                expert_found = True
-                break
-        
-        # 如果没有找到匹配，检查 agent 字段
-        if not expert_found and isinstance(value, dict):
-            agent_name = value.get('agent', '')
-            for expert_name in selected_experts:
-                if expert_name in agent_name or any(keyword in agent_name for keyword in EXPERT_NAME_MAPPING.get(expert_name, [])):
-                    filtered_data[key] = value
-                    break
+    filtered_data = _filter_by_experts(individual_data, selected_experts)
     
     agent_list = list(filtered_data.items())
 
@@ -1173,16 +1413,8 @@ def display_individual_analysis(individual_data: Dict[str, Any], selected_expert
         st.info("暂无可显示的专家独立分析。")
         st.markdown("---")
         return
-    cols_per_row = min(3, num_agents)
 
-    # 分批显示卡片
-    for i in range(0, num_agents, cols_per_row):
-        batch = agent_list[i:i + cols_per_row]
-        cols = st.columns(len(batch))
-        
-        for j, (agent_name, response) in enumerate(batch):
-            with cols[j]:
-                display_expert_card(response, i + j, "individual")
+    _render_expert_grid(agent_list, "individual")
     
     st.markdown("---")
 
@@ -1192,23 +1424,7 @@ def display_sharing_discussion(sharing_data: Dict[str, Any], selected_experts: L
     st.markdown("专家们查看彼此的意见后进行初步交流和补充")
     
     # 过滤只显示选中的专家
-    filtered_data = {}
-    for key, value in sharing_data.items():
-        expert_found = False
-        for expert_name in selected_experts:
-            possible_keys = EXPERT_NAME_MAPPING.get(expert_name, [expert_name])
-            if key in possible_keys or expert_name in key:
-                filtered_data[key] = value
-                expert_found = True
-                break
-        
-        # 如果没有找到匹配，检查 agent 字段
-        if not expert_found and isinstance(value, dict):
-            agent_name = value.get('agent', '')
-            for expert_name in selected_experts:
-                if expert_name in agent_name or any(keyword in agent_name for keyword in EXPERT_NAME_MAPPING.get(expert_name, [])):
-                    filtered_data[key] = value
-                    break
+    filtered_data = _filter_by_experts(sharing_data, selected_experts)
     
     agent_list = list(filtered_data.items())
 
@@ -1218,71 +1434,45 @@ def display_sharing_discussion(sharing_data: Dict[str, Any], selected_experts: L
         st.info("暂无可显示的专科间讨论内容。")
         st.markdown("---")
         return
-    cols_per_row = min(3, num_agents)
 
-    # 分批显示卡片
-    for i in range(0, num_agents, cols_per_row):
-        batch = agent_list[i:i + cols_per_row]
-        cols = st.columns(len(batch))
-        
-        for j, (agent_name, response) in enumerate(batch):
-            with cols[j]:
-                display_expert_card(response, i + j, "sharing")
+    _render_expert_grid(agent_list, "sharing")
     
     st.markdown("---")
 
 def display_conflict_detection(conflict_data: Dict[str, Any]):
     """显示意见冲突检测 (全宽专业卡片样式)"""
-    st.markdown("""
-    <div class="phase-wide-card">
-        <h3 class="section-title">⚔️ 意见冲突检测</h3>
-        <p class="sub-note">智能分析各专家意见中的分歧点，决定是否需要深入讨论</p>
-    """, unsafe_allow_html=True)
-    
-    conflicts_detected = conflict_data.get("conflict_detected", False)
-    
-    # 创建大卡片
-    conflict_color = "#ffebee" if conflicts_detected else "#e8f5e8"
-    border_color = "#f44336" if conflicts_detected else "#4caf50"
-    icon = "🔴" if conflicts_detected else "🟢"
-    status_text = "检测到专家意见存在显著分歧" if conflicts_detected else "专家意见基本一致，无显著冲突"
-    
-    st.markdown(f"""
-    <div style="
-        background: {conflict_color};
-        border: 2px solid {border_color};
-        border-radius: 15px;
-        padding: 20px;
-        margin: 10px 0;
-        box-shadow: 0 4px 8px rgba(0,0,0,0.1);
-    ">
-        <div style="text-align: center; margin-bottom: 15px;">
-            <h3 style="margin: 0; color: {border_color};">{icon} 冲突检测结果</h3>
-            <p style="margin: 5px 0; font-size: 16px; color: #333;">{status_text}</p>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    get = conflict_data.get
+    conflicts_detected, analysis, consensus_score = (
+        get("conflict_detected", False), get("conflict_analysis"), get("consensus_score", 0.0)
+    )
+    
+    st.markdown(_PHASE_STATUS_CARD_TPL.substitute(
+        title="⚔️ 意见冲突检测",
+        note="智能分析各专家意见中的分歧点，决定是否需要深入讨论",
+        bg="#ffebee" if conflicts_detected else "#e8f5e8",
+        border="#f44336" if conflicts_detected else "#4caf50",
+        icon="🔴" if conflicts_detected else "🟢",
+        heading="冲突检测结果",
+        status="检测到专家意见存在显著分歧" if conflicts_detected else "专家意见基本一致，无显著冲突",
+    ), unsafe_allow_html=True)
     
     # 分析详情
-    if "conflict_analysis" in conflict_data:
-        analysis = conflict_data["conflict_analysis"]
-        
+    if analysis is not None:
         col1, col2 = st.columns([3, 1])
         with col1:
             with st.expander("查看详细分析", expanded=False):
                 st.write("**冲突分析详情：**")
                 if isinstance(analysis, str):
-                    rendered_analysis = render_markdown_content(analysis)
+                    rendered_analysis = _render_markdown_cached(analysis)
                     st.markdown(rendered_analysis, unsafe_allow_html=True)
                 elif isinstance(analysis, dict):
                     analysis_text = analysis.get('response', '无分析结果')
-                    rendered_analysis = render_markdown_content(analysis_text)
+                    rendered_analysis = _render_markdown_cached(analysis_text)
                     st.markdown(rendered_analysis, unsafe_allow_html=True)
                 else:
                     st.write('无分析结果')
         
         with col2:
-            consensus_score = conflict_data.get('consensus_score', 0.0)
             st.metric(
                 "初步共识度", 
                 f"{consensus_score:.2f}",
@@ -1290,7 +1480,6 @@ def display_conflict_detection(conflict_data: Dict[str, Any]):
                 help="基于专家意见一致性计算的共识度分数"
             )
     
-    st.markdown("</div>", unsafe_allow_html=True)
     st.markdown("---")
 
 def display_multi_round_discussion(multi_round_data: Dict[str, Any], selected_experts: List[str]):
@@ -1298,11 +1487,10 @@ def display_multi_round_discussion(multi_round_data: Dict[str, Any], selected_ex
     total_rounds = multi_round_data.get("total_rounds", 0)
     
     if total_rounds > 0:
-        st.markdown(f"""
-        <div class=\"phase-wide-card\">
-            <h3 class=\"section-title\">💬 多轮深入讨论</h3>
-            <p class=\"sub-note\">经过冲突检测，专家们进行了 <strong>{total_rounds}轮</strong> 深入讨论以寻求共识</p>
-        """, unsafe_allow_html=True)
+        st.markdown(_PHASE_HEADER_TPL.substitute(
+            title="💬 多轮深入讨论",
+            note=f"经过冲突检测，专家们进行了 <strong>{total_rounds}轮</strong> 深入讨论以寻求共识",
+        ), unsafe_allow_html=True)
         
         rounds = multi_round_data.get("rounds", [])
         
@@ -1320,38 +1508,15 @@ def display_multi_round_discussion(multi_round_data: Dict[str, Any], selected_ex
                     st.markdown(f"#### 第 {round_num} 轮讨论结果")
                 with col2:
                     consensus_color = "#4caf50" if round_consensus > 0.7 else "#ff9800" if round_consensus > 0.5 else "#f44336"
-                    st.markdown(f"""
-                    <div style="
-                        background: {consensus_color};
-                        color: white;
-                        padding: 10px;
-                        border-radius: 10px;
-                        text-align: center;
-                    ">
-                        <strong>共识度: {round_consensus:.2f}</strong>
-                    </div>
-                    """, unsafe_allow_html=True)
+                    st.markdown(_SCORE_PILL_TPL.substitute(
+                        color=consensus_color, score=f"{round_consensus:.2f}"
+                    ), unsafe_allow_html=True)
                 
                 # 专家卡片 - 过滤只显示选中的专家
                 round_results = round_data.get("results", {})
                 
                 # 过滤数据
-                filtered_round_results = {}
-                for key, value in round_results.items():
-                    expert_found = False
-                    for expert_name in selected_experts:
-                        possible_keys = EXPERT_NAME_MAPPING.get(expert_name, [expert_name])
-                        if key in possible_keys or expert_name in key:
-                            filtered_round_results[key] = value
-                            expert_found = True
-                            break
-                    # 如果没有找到匹配，检查 agent 字段
-                    if not expert_found and isinstance(value, dict):
-                        agent_name = value.get('agent', '')
-                        for expert_name in selected_experts:
-                            if expert_name in agent_name or any(keyword in agent_name for keyword in EXPERT_NAME_MAPPING.get(expert_name, [])):
-                                filtered_round_results[key] = value
-                                break
+                filtered_round_results = _filter_by_experts(round_results, selected_experts)
 
                 agent_list = list(filtered_round_results.items())
 
@@ -1360,64 +1525,40 @@ def display_multi_round_discussion(multi_round_data: Dict[str, Any], selected_ex
                 if num_agents == 0:
                     st.info("该轮暂无匹配的专家发言。")
                     continue
-                cols_per_row = min(3, num_agents)
-
-                # 分批显示卡片
-                for k in range(0, num_agents, cols_per_row):
-                    batch = agent_list[k:k + cols_per_row]
-                    cols = st.columns(len(batch))
-                    
-                    for l, (agent_name, response) in enumerate(batch):
-                        with cols[l]:
-                            display_expert_card(response, k + l, f"round_{round_num}", round_num)
+
+                _render_expert_grid(agent_list, f"round_{round_num}", round_num)
     else:
         st.markdown("### ✅ 专家意见一致")
         st.info("🎉 专家们的初步意见已经非常一致，无需进行多轮深入讨论")
     
-    st.markdown("</div>", unsafe_allow_html=True)
     st.markdown("---")
 
 def display_consensus_evaluation(consensus_data: Dict[str, Any]):
     """显示共识评估 (全宽专业卡片样式)"""
-    st.markdown("""
-    <div class="phase-wide-card">
-        <h3 class="section-title">📊 共识评估</h3>
-        <p class="sub-note">对专家讨论的最终结果进行共识程度评估</p>
-    """, unsafe_allow_html=True)
-    
-    consensus_reached = consensus_data.get("consensus_reached", False)
-    consensus_score = consensus_data.get("consensus_score", 0.0)
-    threshold = consensus_data.get("threshold", 0.75)
+    get = consensus_data.get
+    consensus_reached, consensus_score, threshold, evaluation, evaluation_details = (
+        get("consensus_reached", False), get("consensus_score", 0.0), get("threshold", 0.75),
+        get("evaluation"), get("evaluation_details"),
+    )
     
     # 创建共识评估卡片
-    consensus_color = "#e8f5e8" if consensus_reached else "#fff8e1"
-    border_color = "#4caf50" if consensus_reached else "#ffb300"
-    icon = "✅" if consensus_reached else "⚠️"
-    status_text = "专家已达成共识" if consensus_reached else "仍需进一步协调"
-
-    st.markdown(f"""
-    <div style="
-        background: {consensus_color};
-        border: 2px solid {border_color};
-        border-radius: 16px;
-        padding: 22px 26px 18px 26px;
-        margin: 18px 0 10px 0;
-        box-shadow: 0 4px 10px rgba(0,0,0,0.08);
-    ">
-        <h3 style="margin: 0 0 8px 0; color: {border_color}; text-align:center;">{icon} 共识评估结果</h3>
-        <p style="margin: 0 0 12px 0; font-size: 16px; color: #333; text-align:center;">{status_text}</p>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(_PHASE_STATUS_CARD_TPL.substitute(
+        title="📊 共识评估",
+        note="对专家讨论的最终结果进行共识程度评估",
+        bg="#e8f5e8" if consensus_reached else "#fff8e1",
+        border="#4caf50" if consensus_reached else "#ffb300",
+        icon="✅" if consensus_reached else "⚠️",
+        heading="共识评估结果",
+        status="专家已达成共识" if consensus_reached else "仍需进一步协调",
+    ), unsafe_allow_html=True)
 
     # 指标区
-    mcol1, mcol2, mcol3 = st.columns(3)
-    with mcol1:
-        st.metric("最终共识度", f"{consensus_score:.2f}")
-    with mcol2:
-        st.metric("共识阈值", f"{threshold:.2f}")
-    with mcol3:
-        gap = consensus_score - threshold
-        st.metric("高于阈值" if gap >= 0 else "低于阈值", f"{gap:+.2f}")
+    gap = consensus_score - threshold
+    _metric_row([
+        ("最终共识度", f"{consensus_score:.2f}"),
+        ("共识阈值", f"{threshold:.2f}"),
+        ("高于阈值" if gap >= 0 else "低于阈值", f"{gap:+.2f}"),
+    ])
     
     # 进度条表示程度
     pct = min(max(consensus_score / max(threshold, 1e-6), 0), 1.5)
@@ -1425,10 +1566,10 @@ def display_consensus_evaluation(consensus_data: Dict[str, Any]):
     
     # 评估详情
     detail_block = None
-    if "evaluation" in consensus_data:
-        detail_block = consensus_data["evaluation"]
-    elif "evaluation_details" in consensus_data:
-        detail_block = {"response": consensus_data["evaluation_details"]}
+    if evaluation is not None:
+        detail_block = evaluation
+    elif evaluation_details is not None:
+        detail_block = {"response": evaluation_details}
 
     if detail_block:
         with st.expander("查看详细评估", expanded=False):
@@ -1438,113 +1579,39 @@ def display_consensus_evaluation(consensus_data: Dict[str, Any]):
             else:
                 st.write(str(detail_block))
     
-    st.markdown("</div>", unsafe_allow_html=True)
     st.markdown("---")
 
 def display_final_coordination(coordination_result: Dict[str, Any]):
     """显示最终MDT协调建议 (全宽专业卡片样式)"""
-    st.markdown("""
-    <div class="phase-wide-card">
-        <h3 class="section-title">🎯 最终MDT协调建议</h3>
-        <p class="sub-note">基于整个讨论过程，MDT协调员生成的综合临床建议</p>
-    """, unsafe_allow_html=True)
-    
-    # 获取关键指标
-    final_consensus = coordination_result.get('consensus_score', 0.0)
-    discussion_rounds = coordination_result.get('discussion_rounds', 0)
-    consensus_reached = coordination_result.get('consensus_reached', False)
-    
-    # 状态指示条
-    status_color = "#4caf50" if consensus_reached else "#ff9800"
-    status_icon = "✅" if consensus_reached else "⚠️"
-    status_text = "已达成专家共识" if consensus_reached else "存在一定分歧"
-    
-    # 关键指标展示
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.markdown(f"""
-        <div style="
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            padding: 20px;
-            border-radius: 15px;
-            text-align: center;
-            box-shadow: 0 4px 8px rgba(0,0,0,0.1);
-        ">
-            <h2 style="margin: 0;">{final_consensus:.2f}</h2>
-            <p style="margin: 5px 0;">最终共识度</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown(f"""
-        <div style="
-            background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
-            color: white;
-            padding: 20px;
-            border-radius: 15px;
-            text-align: center;
-            box-shadow: 0 4px 8px rgba(0,0,0,0.1);
-        ">
-            <h2 style="margin: 0;">{discussion_rounds}</h2>
-            <p style="margin: 5px 0;">讨论轮数</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col3:
-        st.markdown(f"""
-        <div style="
-            background: {status_color};
-            color: white;
-            padding: 20px;
-            border-radius: 15px;
-            text-align: center;
-            box-shadow: 0 4px 8px rgba(0,0,0,0.1);
-        ">
-            <h2 style="margin: 0;">{status_icon}</h2>
-            <p style="margin: 5px 0;">{status_text}</p>
-        </div>
-        """, unsafe_allow_html=True)
+    get = coordination_result.get
+    final_consensus, discussion_rounds, consensus_reached, response_text, agent_name = (
+        get('consensus_score', 0.0), get('discussion_rounds', 0), get('consensus_reached', False),
+        get('response', '无响应'), get('agent', 'MDT协调员'),
+    )
+    
+    st.markdown(_PHASE_HEADER_TPL.substitute(
+        title="🎯 最终MDT协调建议",
+        note="基于整个讨论过程，MDT协调员生成的综合临床建议",
+    ), unsafe_allow_html=True)
+    
+    # 关键指标展示（单次输出）
+    st.markdown(_COORD_METRICS_TPL.substitute(
+        consensus=f"{final_consensus:.2f}",
+        rounds=discussion_rounds,
+        status_color="#4caf50" if consensus_reached else "#ff9800",
+        status_icon="✅" if consensus_reached else "⚠️",
+        status_text="已达成专家共识" if consensus_reached else "存在一定分歧",
+    ), unsafe_allow_html=True)
     
     # 最终建议内容
     st.markdown("#### 📋 协调员综合建议")
     
-    response_text = coordination_result.get('response', '无响应')
-    agent_name = coordination_result.get('agent', 'MDT协调员')
-    
-    # 使用美观的容器展示建议内容
-    st.markdown(f"""
-    <div style="
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 3px;
-        border-radius: 15px;
-        margin: 10px 0;
-    ">
-        <div style="
-            background: white;
-            padding: 25px;
-            border-radius: 12px;
-            box-shadow: 0 4px 8px rgba(0,0,0,0.1);
-        ">
-            <div style="
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                color: white;
-                padding: 10px 20px;
-                border-radius: 10px;
-                text-align: center;
-                margin-bottom: 20px;
-            ">
-                <h4 style="margin: 0;">{agent_name}</h4>
-            </div>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # 在HTML下方紧接着用Markdown渲染实际内容
-    rendered_response = render_markdown_content(response_text)
-    st.markdown(rendered_response, unsafe_allow_html=True)
+    # 协调员标题与建议正文合并到同一容器中输出
+    st.markdown(_COORD_RESPONSE_TPL.substitute(
+        agent=html.escape(agent_name),
+        content=_render_markdown_cached(response_text),
+    ), unsafe_allow_html=True)
     
-    st.markdown("</div>", unsafe_allow_html=True)
     st.markdown("---")
 
 def display_expert_card(response: Dict[str, Any], color_index: int, card_type: str, round_num: Optional[int] = None):
@@ -1564,73 +1631,169 @@ def display_expert_card(response: Dict[str, Any], color_index: int, card_type: s
     
     # 创建卡片 
     response_text = response.get('response', '无响应')
-    timestamp = response.get('timestamp', '')
-    if timestamp:
-        try:
-            dt = datetime.fromisoformat(timestamp)
-            formatted_time = dt.strftime('%H:%M:%S')
-        except:
-            formatted_time = timestamp
-    else:
-        formatted_time = 'N/A'
+    formatted_time = _fmt_ts(response.get('timestamp', ''))
     
     # 转义HTML特殊字符
-    import html
-    import re
-    cleaned_response = re.sub(r"<\/?(script|iframe|style)[^>]*>", "", response_text, flags=re.IGNORECASE)
     safe_name = html.escape(agent_display_name)
     safe_specialty = html.escape(specialty)
     
-    # 规范化多余空行
-    cleaned_response = re.sub(r"\n{3,}", "\n\n", cleaned_response).strip()
-    
-    # 创建卡片头部
-    st.markdown(f"""
-    <div style="
-        background: white;
-        border-radius: 15px;
-        margin-bottom: 20px;
-        box-shadow: 0 4px 12px rgba(0,0,0,0.15);
-        overflow: hidden;
-        border: 1px solid #e0e0e0;
-    ">
-        <div style="background: {color}; color: white; padding: 15px; text-align: center;">
-            <h4 style="margin: 0; color: white; font-size: 16px;">{safe_name}</h4>
-            <p style="margin: 5px 0 0 0; color: rgba(255,255,255,0.9); font-size: 12px;">{safe_specialty}</p>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # 在卡片下方紧接着添加白色背景的内容区域
-    with st.container():
-        # 使用简化的容器，避免样式冲突
-        rendered_content = render_markdown_content(cleaned_response)
-        
-        # 创建完整的卡片内容区域
-        st.markdown(f"""
-        <div style="
-            background: white;
-            padding: 20px;
-            margin-top: -20px;
-            margin-bottom: 20px;
-            border-radius: 0 0 15px 15px;
-            box-shadow: 0 4px 12px rgba(0,0,0,0.15);
-            border: 1px solid #e0e0e0;
-            border-top: none;
-        ">
-                <div class="card-scroll">{rendered_content}</div>
-            <div style="border-top:1px solid #eee; padding-top:10px; margin-top:15px;">
-                <small style="color:#666;">时间: {formatted_time}</small>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+    # 卡片默认只显示摘要，展开后才做清洗与 Markdown 渲染（每阶段首张卡片默认展开）
+    card_key = f"_card_open_{card_type}_{color_index}"
+    default_open = color_index == 0
+    if st.session_state.get(card_key, default_open):
+        cleaned_response = _SCRIPT_TAG_RE.sub("", response_text)
+        # 规范化多余空行
+        cleaned_response = _EXTRA_BLANK_RE.sub("\n\n", cleaned_response).strip()
+        content = _render_markdown_cached(cleaned_response)
+    else:
+        summary = response_text[:_CARD_SUMMARY_CHARS]
+        if len(response_text) > _CARD_SUMMARY_CHARS:
+            summary += "…"
+        content = f"<p>{html.escape(summary)}</p>"
+    
+    # 头部、正文与时间戳一次性输出，不再依赖负 margin 拼接两段 HTML
+    st.markdown(_EXPERT_CARD_TPL.substitute(
+        color=color,
+        name=safe_name,
+        specialty=safe_specialty,
+        content=content,
+        time=formatted_time,
+    ), unsafe_allow_html=True)
+    st.toggle("展开全文", value=default_open, key=card_key)
+
+# 流式过程中流程图 / 协作图的最小重绘间隔（秒）
+_RENDER_DEBOUNCE_S = 0.1
+
+# 流式 token 合并刷新的最小间隔（秒）
+_CHUNK_FLUSH_S = 0.08
+
+# 协作图最多绘制的边数（按互动次数取前 K 条）
+_MAX_GRAPH_EDGES = 200
+# 节点数超过该阈值时改用 <canvas> 绘制，避免大量 SVG 元素反复重建 DOM
+_CANVAS_NODE_THRESHOLD = 12
+
+# Canvas 版协作图：节点坐标在 Python 端算好，以 JSON 放入 data 属性，由脚本一次性绘制
+_CANVAS_GRAPH_TPL = string.Template("""
+<div style="padding:14px 20px;font-family:-apple-system,BlinkMacSystemFont,Roboto,Arial;">
+<h4 style="margin:4px 0 12px 4px;font-weight:700;font-size:16px;color:#2d3e50;">🤝 智能体协作互动图 (实时)</h4>
+<canvas id="mdt-graph" width="600" height="600" data-graph='$payload'
+ style="width:100%;max-width:600px;height:auto;background:linear-gradient(145deg,#ffffff,#f5f7fb);border:1px solid #e1e5ec;border-radius:18px;"></canvas>
+<div style="margin-top:6px;font-size:12px;color:#566176;">箭头表示信息/参考方向；线条越粗表示该方向互动次数越多。</div>
+</div>
+<script>
+(function () {
+  var cv = document.getElementById("mdt-graph");
+  var g = JSON.parse(cv.dataset.graph);
+  var ctx = cv.getContext("2d");
+  ctx.lineCap = "round";
+  g.edges.forEach(function (e) {
+    var a = g.pos[e[0]], b = g.pos[e[1]];
+    if (!a || !b) return;
+    var ang = Math.atan2(b[1] - a[1], b[0] - a[0]);
+    var tx = b[0] - 34 * Math.cos(ang), ty = b[1] - 34 * Math.sin(ang);
+    ctx.globalAlpha = e[3];
+    ctx.strokeStyle = "#667eea";
+    ctx.lineWidth = e[2];
+    ctx.beginPath(); ctx.moveTo(a[0], a[1]); ctx.lineTo(tx, ty); ctx.stroke();
+    ctx.fillStyle = "#555566";
+    ctx.beginPath();
+    ctx.moveTo(tx, ty);
+    ctx.lineTo(tx - 10 * Math.cos(ang - 0.4), ty - 10 * Math.sin(ang - 0.4));
+    ctx.lineTo(tx - 10 * Math.cos(ang + 0.4), ty - 10 * Math.sin(ang + 0.4));
+    ctx.closePath(); ctx.fill();
+  });
+  ctx.font = "600 13px -apple-system,BlinkMacSystemFont,Roboto,Arial";
+  ctx.textAlign = "center";
+  g.nodes.forEach(function (n) {
+    var p = g.pos[n[0]];
+    ctx.globalAlpha = 0.92;
+    ctx.fillStyle = n[2];
+    ctx.beginPath(); ctx.arc(p[0], p[1], 34, 0, 2 * Math.PI); ctx.fill();
+    ctx.globalAlpha = 1;
+    ctx.lineWidth = 3; ctx.strokeStyle = "#ffffff"; ctx.stroke();
+    ctx.fillStyle = "#ffffff";
+    ctx.fillText(n[1], p[0], p[1] + 4);
+  });
+})();
+</script>
+""")
+
+# SVG 版协作图的固定片段（模块级常量，每次重建只拼接边与节点）
+_WRAPPER_OPEN = "<div class='mdt-flow-wrapper' style='padding:14px 20px;'>"
+_TITLE = "<h4 style='margin:4px 0 12px 4px;font-weight:700;font-size:16px;color:#2d3e50;'>🤝 智能体协作互动图 (实时)</h4>"
+_SVG_HEADER = "<svg viewBox='0 0 600 600' width='100%' height='420' class='mdt-graph-svg' style='background:linear-gradient(145deg,#ffffff,#f5f7fb);border:1px solid #e1e5ec;border-radius:18px;shape-rendering:optimizeSpeed;text-rendering:optimizeSpeed;'>"
+_SVG_DEFS = "<defs><marker id='arrow' markerWidth='10' markerHeight='10' refX='10' refY='5' orient='auto' markerUnits='strokeWidth'><path d='M0,0 L10,5 L0,10 z' fill='#556' /></marker></defs>"
+_SVG_EDGE_TMPL = "<line x1='{0}' y1='{1}' x2='{2}' y2='{3}' stroke='#667eea' stroke-width='{4:.1f}' stroke-linecap='round' opacity='{5:.2f}' marker-end='url(#arrow)'/>"
+_SVG_NODE_TMPL = (
+    "<g><circle cx='{x}' cy='{y}' r='34' fill='{color}' stroke='white' stroke-width='3' opacity='0.92' />"
+    "<text x='{x}' y='{ty}' font-size='13' fill='white' text-anchor='middle' font-weight='600' "
+    "style='font-family:-apple-system,BlinkMacSystemFont,Roboto,Arial;'>{abbrev}</text></g>"
+)
+_SVG_FOOTER = "</svg>"
+_LEGEND_HTML = "<div style='margin-top:6px;font-size:12px;color:#566176;'>箭头表示信息/参考方向；线条越粗表示该方向互动次数越多。</div>"
+_WRAPPER_CLOSE = "</div>"
+
+# TXT 报告模板（模块级常量，字段由 _report_fields 一次性展开）
+_REPORT_TMPL = """MDT讨论报告
+=================
+版本: 1.0
+生成时间: {generated_at}
+
+一、基本信息
+--------------------------------
+患者ID        : {patient_id}
+讨论开始时间  : {start_time}
+参与专家（{participant_count}人）: {participants}
+
+二、最终综合建议
+--------------------------------
+{final_recommendation}
+
+三、阶段性摘要（提取）
+--------------------------------
+1. 冲突检测结果: {conflict_analysis}
+2. 共识评估: 共识度 {consensus_score} 阈值 {threshold}
+3. 讨论轮数: {total_rounds}
+
+四、技术元数据
+--------------------------------
+会话ID        : {session_id}
+总时长        : {duration}
+工具版本      : MDT Orchestrator v1
+
+（本报告为自动生成，供临床参考，不替代临床医师最终判断。）
+"""
+
+def _report_fields(result: Dict[str, Any], case_data: Dict[str, Any], final_recommendation: str) -> Dict[str, Any]:
+    """单次遍历结果字典，生成 _REPORT_TMPL 所需的扁平字段"""
+    phases = result.get("phases", {})
+    cd = phases.get("conflict_detection", {})
+    ce = phases.get("consensus_evaluation", {}) or {}
+    mrd = phases.get("multi_round_discussion", {}) or {}
+    participants = result.get("participants", [])
+    return {
+        "generated_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "patient_id": case_data.get('patient_id', 'N/A'),
+        "start_time": result.get('start_time', 'N/A'),
+        "participant_count": len(participants),
+        "participants": ', '.join(participants),
+        "final_recommendation": final_recommendation,
+        "conflict_analysis": cd.get('conflict_analysis', 'N/A') if isinstance(cd, dict) else 'N/A',
+        "consensus_score": ce.get('consensus_score', 'N/A'),
+        "threshold": ce.get('threshold', 'N/A'),
+        "total_rounds": mrd.get('total_rounds', '0'),
+        "session_id": result.get('session_id', 'N/A'),
+        "duration": result.get('duration', 'N/A'),
+    }
 
 def display_download_section(result: Dict[str, Any], case_data: Dict[str, Any]):
     """显示下载结果部分"""
     st.subheader("💾 导出结果")
     
     # 准备下载数据
-    download_data = json.dumps(result, ensure_ascii=False, indent=2)
+    session_raw = st.session_state.get("mdt_phases_raw")
+    phases_raw = session_raw[1] if session_raw and session_raw[0] == result.get("session_id") else None
+    download_data = _dumps_result(result, phases_raw)
     
     col1, col2 = st.columns(2)
     with col1:
@@ -1648,35 +1811,7 @@ def display_download_section(result: Dict[str, Any], case_data: Dict[str, Any]):
             final_recommendation = phases["final_coordination"].get('response', '')
             st.download_button(
                 label="📋 下载MDT报告(TXT)",
-                data=f"""MDT讨论报告
-=================
-版本: 1.0
-生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-
-一、基本信息
---------------------------------
-患者ID        : {case_data.get('patient_id', 'N/A')}
-讨论开始时间  : {result.get('start_time', 'N/A')}
-参与专家（{len(result.get('participants', []))}人）: {', '.join(result.get('participants', []))}
-
-二、最终综合建议
---------------------------------
-{final_recommendation}
-
-三、阶段性摘要（提取）
---------------------------------
-1. 冲突检测结果: {result.get('phases', {}).get('conflict_detection', {}).get('conflict_analysis','N/A') if isinstance(result.get('phases', {}).get('conflict_detection', {}), dict) else 'N/A'}
-2. 共识评估: 共识度 {result.get('phases', {}).get('consensus_evaluation', {}).get('consensus_score','N/A')} 阈值 {result.get('phases', {}).get('consensus_evaluation', {}).get('threshold','N/A')}
-3. 讨论轮数: {result.get('phases', {}).get('multi_round_discussion', {}).get('total_rounds','0')}
-
-四、技术元数据
---------------------------------
-会话ID        : {result.get('session_id','N/A')}
-总时长        : {result.get('duration','N/A')}
-工具版本      : MDT Orchestrator v1
-
-（本报告为自动生成，供临床参考，不替代临床医师最终判断。）
-""",
+                data=_REPORT_TMPL.format_map(_report_fields(result, case_data, final_recommendation)),
                 file_name=f"mdt_report_{result.get('session_id', 'unknown')}.txt",
                 mime="text/plain"
             )
@@ -1685,10 +1820,11 @@ def display_download_section(result: Dict[str, Any], case_data: Dict[str, Any]):
 
 def run_real_stream_mdt(selected_experts: List[str]):
     """运行MDT讨论（使用AI模型） - 含动态流程与协作图"""
+    _t0 = time.monotonic()  # 会议时长按单调时钟计算
     st.info("🤖 正在进行MDT多学科讨论")
 
     try:
-        orchestrator = MDTOrchestrator()
+        orchestrator = _get_orchestrator()
         st.session_state['active_orchestrator'] = orchestrator  # 保存引用供 RAG 片段展示
         case_data = st.session_state.get("case_data", {})
         full_case_data = case_data.get("full_case_data", {})
@@ -1721,6 +1857,8 @@ def run_real_stream_mdt(selected_experts: List[str]):
             "start_time": datetime.now().isoformat(),
             "phases": {}
         }
+        # 阶段结果预序列化（orjson 字节），导出时直接拼接
+        phases_raw: Dict[str, Optional[bytes]] = {}
 
         flow_placeholder = st.empty()
         interaction_placeholder = st.empty()
@@ -1732,99 +1870,209 @@ def run_real_stream_mdt(selected_experts: List[str]):
             ("consensus_evaluation", "共识评估", "量化一致性"),
             ("final_coordination", "最终协调", "综合建议")
         ]
-        flow_state = {k: {"status": "pending", "agents": set(), "rounds": 0, "metrics": {}} for k,_,_ in flow_steps_order}
+        # 流程状态按字段拆分为并列字典（键为步骤名）
+        flow_status: Dict[str, str] = {k: "pending" for k,_,_ in flow_steps_order}
+        flow_agents: Dict[str, set] = {k: set() for k,_,_ in flow_steps_order}
+        flow_rounds: Dict[str, int] = {k: 0 for k,_,_ in flow_steps_order}
+        flow_metrics: Dict[str, dict] = {k: {} for k,_,_ in flow_steps_order}
 
         interaction_nodes: List[str] = []
-        interaction_edges: Dict[tuple, int] = {}
+        interaction_edges: Counter = Counter()
         last_speaker: Optional[str] = None
         coordinator_names = [n for n in EXPERT_NAME_MAPPING if '协调员' in n]
 
+        # 节点信息（缩写, 颜色, 是否协调员）在首次出现时计算一次，绘制与阶段收尾时直接查表
+        node_meta: Dict[str, tuple] = {}
+
         def ensure_node(name: str):
-            if name not in interaction_nodes:
-                interaction_nodes.append(name)
+            if name in node_meta:
+                return
+            abbrev = name.replace('专家','').replace('医生','').replace('MDT','')[:4] or name[:4]
+            is_coord = any(cn in name for cn in coordinator_names)
+            node_meta[name] = (abbrev, get_expert_color(name), is_coord)
+            interaction_nodes.append(name)
 
         def add_edge(src: str, dst: str):
             if not src or not dst or src == dst:
                 return
-            key = (src, dst)
-            interaction_edges[key] = interaction_edges.get(key, 0) + 1
+            interaction_edges[(src, dst)] += 1
+
+        # 协作图缓存：节点/边未变化时直接复用上次生成的 SVG；节点集合不变时复用布局
+        svg_cache: Dict[str, Any] = {"key": None, "svg": "", "nodes": None, "positions": {}}
+        show_all_edges = st.session_state.get("show_all_edges", False)
+
+        def node_positions() -> Dict[str, tuple]:
+            nodes_key = tuple(interaction_nodes)
+            if nodes_key != svg_cache["nodes"]:
+                n = len(interaction_nodes)
+                cx, cy = 300, 300
+                radius = 210 if n <= 8 else 260
+                # 环形布局一次性向量化计算；坐标取整以缩短 SVG 字符串
+                angles = (2 * np.pi / n) * np.arange(n) - np.pi / 2
+                xs = np.rint(cx + radius * np.cos(angles)).astype(int).tolist()
+                ys = np.rint(cy + radius * np.sin(angles)).astype(int).tolist()
+                layout = dict(zip(interaction_nodes, zip(xs, ys)))
+                svg_cache["nodes"] = nodes_key
+                svg_cache["positions"] = layout
+            return svg_cache["positions"]
+
+        def edges_for_render() -> List[tuple]:
+            """返回待绘制的边 [(src, dst, 线宽, 透明度)]，按最大互动次数归一化"""
+            max_w = max(interaction_edges.values()) if interaction_edges else 1
+            edges_to_draw = list(interaction_edges.items())
+            if not show_all_edges:
+                # 剔除弱互动边，并按次数保留前 K 条，控制浏览器绘制的图元数量
+                threshold = max(1, max_w // 8)
+                edges_to_draw = [kv for kv in edges_to_draw if kv[1] >= threshold]
+                if len(edges_to_draw) > _MAX_GRAPH_EDGES:
+                    edges_to_draw = heapq.nlargest(_MAX_GRAPH_EDGES, edges_to_draw, key=lambda kv: kv[1])
+            w_scale, o_scale = 4.5 / max_w, 0.55 / max_w
+            return [(src, dst, 1.5 + w_scale * cnt, 0.35 + o_scale * cnt) for (src, dst), cnt in edges_to_draw]
+
+        def build_interaction_canvas() -> str:
+            positions = node_positions()
+            edges_to_draw = edges_for_render()
+            payload = {
+                "pos": positions,
+                "nodes": [[node, *node_meta[node][:2]] for node in positions],
+                "edges": [[src, dst, round(w, 1), round(o, 2)] for src, dst, w, o in edges_to_draw],
+            }
+            if orjson is not None:
+                payload_json = orjson.dumps(payload).decode()
+            else:
+                payload_json = json.dumps(payload, ensure_ascii=False)
+            # 放在单引号属性中：转义 & 与 '
+            return _CANVAS_GRAPH_TPL.substitute(payload=payload_json.replace("&", "&amp;").replace("'", "&#39;"))
 
         def build_interaction_svg() -> str:
             if not interaction_nodes:
                 return ""
-            import math
-            n = len(interaction_nodes)
-            cx, cy = 300, 300
-            radius = 210 if n <= 8 else 260
-            positions = {}
-            for i, node in enumerate(interaction_nodes):
-                angle = 2 * math.pi * i / n - math.pi/2
-                x = cx + radius * math.cos(angle)
-                y = cy + radius * math.sin(angle)
-                positions[node] = (x, y)
-            max_w = max(interaction_edges.values()) if interaction_edges else 1
-            svg_parts = ["<svg viewBox='0 0 600 600' width='100%' height='420' class='mdt-graph-svg' style='background:linear-gradient(145deg,#ffffff,#f5f7fb);border:1px solid #e1e5ec;border-radius:18px;'>"]
-            svg_parts.append("<defs><marker id='arrow' markerWidth='10' markerHeight='10' refX='10' refY='5' orient='auto' markerUnits='strokeWidth'><path d='M0,0 L10,5 L0,10 z' fill='#556' /></marker></defs>")
-            for (src, dst), cnt in interaction_edges.items():
-                x1,y1 = positions.get(src, (0,0))
-                x2,y2 = positions.get(dst, (0,0))
-                width = 1.5 + 4.5 * (cnt / max_w)
-                opacity = 0.35 + 0.55 * (cnt / max_w)
-                svg_parts.append(f"<line x1='{x1}' y1='{y1}' x2='{x2}' y2='{y2}' stroke='#667eea' stroke-width='{width:.2f}' stroke-linecap='round' opacity='{opacity:.2f}' marker-end='url(#arrow)' />")
-            for node,(x,y) in positions.items():
-                color = get_expert_color(node)
-                abbrev = node.replace('专家','').replace('医生','').replace('MDT','')[:4]
-                svg_parts.append(f"<g><circle cx='{x}' cy='{y}' r='34' fill='{color}' stroke='white' stroke-width='3' opacity='0.92' />")
-                svg_parts.append(f"<text x='{x}' y='{y+4}' font-size='13' fill='white' text-anchor='middle' font-weight='600' style='font-family:-apple-system,BlinkMacSystemFont,Roboto,Arial;'>{abbrev}</text></g>")
-            svg_parts.append("</svg>")
-            legend = "<div style='margin-top:6px;font-size:12px;color:#566176;'>箭头表示信息/参考方向；线条越粗表示该方向互动次数越多。</div>"
-            return "<div class='mdt-flow-wrapper' style='padding:14px 20px;'>" \
-                   + "<h4 style='margin:4px 0 12px 4px;font-weight:700;font-size:16px;color:#2d3e50;'>🤝 智能体协作互动图 (实时)</h4>" \
-                   + ''.join(svg_parts) + legend + "</div>"
-
-        def render_interaction():
-            interaction_placeholder.markdown(build_interaction_svg(), unsafe_allow_html=True)
-
-        def render_flow():
+            cache_key = (tuple(interaction_nodes), tuple(interaction_edges.items()))
+            if cache_key == svg_cache["key"]:
+                return svg_cache["svg"]
+            positions = node_positions()
+            edges_to_draw = edges_for_render()
+            origin = (0, 0)
+            edge_lines = [
+                _SVG_EDGE_TMPL.format(*positions.get(src, origin), *positions.get(dst, origin), w, o)
+                for src, dst, w, o in edges_to_draw
+            ]
+            node_groups = [
+                _SVG_NODE_TMPL.format(x=x, y=y, ty=y + 4, color=node_meta[node][1], abbrev=node_meta[node][0])
+                for node, (x, y) in positions.items()
+            ]
+            svg = "".join([_WRAPPER_OPEN, _TITLE, _SVG_HEADER, _SVG_DEFS, *edge_lines, *node_groups,
+                           _SVG_FOOTER, _LEGEND_HTML, _WRAPPER_CLOSE])
+            svg_cache["key"] = cache_key
+            svg_cache["svg"] = svg
+            return svg
+
+        # 重绘节流：两次绘制间隔不足 _RENDER_DEBOUNCE_S 时只标记为脏，由后续事件补绘
+        last_paint = {"flow": 0.0, "interaction": 0.0}
+        dirty = {"flow": False, "interaction": False}
+
+        def _should_paint(kind: str, force: bool) -> bool:
+            now = time.monotonic()
+            if not force and now - last_paint[kind] < _RENDER_DEBOUNCE_S:
+                dirty[kind] = True
+                return False
+            last_paint[kind] = now
+            dirty[kind] = False
+            return True
+
+        def render_interaction(force: bool = False):
+            if not _should_paint("interaction", force):
+                return
+            if len(interaction_nodes) > _CANVAS_NODE_THRESHOLD:
+                # st.markdown 不执行脚本，Canvas 版本通过组件 iframe 渲染
+                with interaction_placeholder.container():
+                    components.html(build_interaction_canvas(), height=700)
+            else:
+                interaction_placeholder.markdown(build_interaction_svg(), unsafe_allow_html=True)
+
+        # 流程图按步骤缓存 HTML：仅重新生成状态发生变化的步骤；整体未变则跳过重绘
+        step_html_cache: Dict[str, tuple] = {}
+        flow_html_last = {"html": None}
+
+        def render_flow_step(idx: int, title: str, desc: str, status: str, agents: set, rounds: int, metrics: dict) -> str:
+            norm_agents = []
+            for a in agents:
+                na = a.replace('专家','').replace('MDT','').replace('医生','').strip() or a
+                norm_agents.append(na)
+            agents_preview = ", ".join(list(norm_agents)[:3])
+            rounds_txt = f"轮次: {rounds}" if rounds else ""
+            metrics_html = ""
+            if metrics:
+                badges = []
+                for mk, mv in metrics.items():
+                    if mv is None: continue
+                    if isinstance(mv, float):
+                        mv_fmt = f"{mv:.2f}" if abs(mv) < 1000 else f"{mv:.1e}"
+                    else:
+                        mv_fmt = str(mv)
+                    badges.append(f"<span class='mdt-flow-badge'>{mk}:{mv_fmt}</span>")
+                if badges:
+                    metrics_html = f"<div class='mdt-flow-metrics'>{''.join(badges)}</div>"
+            agents_html = f"<div class='mdt-flow-active-agents'>{agents_preview}{'…' if len(agents)>3 else ''}</div>" if agents_preview else ""
+            rounds_html = f"<div class='mdt-flow-rounds'>{rounds_txt}</div>" if rounds_txt else ""
+            return (
+                f"<div class='mdt-flow-step {status}'>"
+                f"<div class='mdt-flow-circle {status}'>{idx}</div>"
+                f"<p class='mdt-flow-title'>{title}</p>"
+                f"<p class='mdt-flow-desc'>{desc}</p>"
+                f"{rounds_html}{agents_html}{metrics_html}"
+                f"</div>"
+            )
+
+        def render_flow(force: bool = False):
+            if not _should_paint("flow", force):
+                return
             html_blocks = ["<div class='mdt-flow-wrapper'><div class='mdt-flow-steps'>"]
             for idx,(key,title,desc) in enumerate(flow_steps_order, start=1):
-                st_info = flow_state[key]
-                status = st_info["status"]
-                norm_agents = []
-                for a in st_info["agents"]:
-                    na = a.replace('专家','').replace('MDT','').replace('医生','').strip() or a
-                    norm_agents.append(na)
-                agents_preview = ", ".join(list(norm_agents)[:3])
-                rounds_txt = f"轮次: {st_info['rounds']}" if st_info['rounds'] else ""
-                metrics_html = ""
-                if st_info["metrics"]:
-                    badges = []
-                    for mk, mv in st_info["metrics"].items():
-                        if mv is None: continue
-                        if isinstance(mv, float):
-                            mv_fmt = f"{mv:.2f}" if abs(mv) < 1000 else f"{mv:.1e}"
-                        else:
-                            mv_fmt = str(mv)
-                        badges.append(f"<span class='mdt-flow-badge'>{mk}:{mv_fmt}</span>")
-                    if badges:
-                        metrics_html = f"<div class='mdt-flow-metrics'>{''.join(badges)}</div>"
-                agents_html = f"<div class='mdt-flow-active-agents'>{agents_preview}{'…' if len(st_info['agents'])>3 else ''}</div>" if agents_preview else ""
-                rounds_html = f"<div class='mdt-flow-rounds'>{rounds_txt}</div>" if rounds_txt else ""
-                html_blocks.append(
-                    f"<div class='mdt-flow-step {status}'>"
-                    f"<div class='mdt-flow-circle {status}'>{idx}</div>"
-                    f"<p class='mdt-flow-title'>{title}</p>"
-                    f"<p class='mdt-flow-desc'>{desc}</p>"
-                    f"{rounds_html}{agents_html}{metrics_html}"
-                    f"</div>"
-                )
+                status, agents, rounds, metrics = flow_status[key], flow_agents[key], flow_rounds[key], flow_metrics[key]
+                sig = (status, rounds, frozenset(agents), tuple(metrics.items()))
+                cached = step_html_cache.get(key)
+                if cached is None or cached[0] != sig:
+                    cached = (sig, render_flow_step(idx, title, desc, status, agents, rounds, metrics))
+                    step_html_cache[key] = cached
+                html_blocks.append(cached[1])
             html_blocks.append("</div></div>")
-            flow_placeholder.markdown("".join(html_blocks), unsafe_allow_html=True)
+            flow_html = "".join(html_blocks)
+            if flow_html == flow_html_last["html"]:
+                return
+            flow_html_last["html"] = flow_html
+            flow_placeholder.markdown(flow_html, unsafe_allow_html=True)
+
+        # 流式 token 缓冲：{专家: (待刷新的完整文本, 上次刷新时间)}
+        pending_chunks: Dict[str, tuple] = {}
+
+        def flush_pending_chunks():
+            for name, (text, _) in pending_chunks.items():
+                if text and name in current_containers:
+                    display_expert_response(current_containers[name], name, text, "typing")
+            pending_chunks.clear()
+
+        # 专家筛选结果在会话内不变：按专家名缓存判定结果，避免每个 chunk 重复别名扫描
+        _selected_exact = frozenset(selected_experts)
+        _selected_memo: Dict[str, bool] = {}
+
+        def _fast_selected(name: str) -> bool:
+            if name in _selected_exact:
+                return True
+            hit = _selected_memo.get(name)
+            if hit is None:
+                hit = _selected_memo[name] = is_expert_selected(name, selected_experts)
+            return hit
 
         # 初次显示
-        render_flow(); render_interaction()
+        render_flow(force=True); render_interaction(force=True)
 
         for stream_result in orchestrator.conduct_mdt_session_stream(case_data, selected_experts):
+            # 补绘上一轮被节流跳过的更新
+            if dirty["flow"]:
+                render_flow()
+            if dirty["interaction"]:
+                render_interaction()
             rtype = stream_result.get("type")
             phase = stream_result.get("phase")
 
@@ -1845,17 +2093,17 @@ def run_real_stream_mdt(selected_experts: List[str]):
                 created_in_phase = 0
                 cols_current_row = []
                 progress_bar.progress(phase_progress_map.get(phase_name, 0.0))
-                for k in flow_state:
-                    if flow_state[k]["status"] == "current":
-                        flow_state[k]["status"] = "done"
-                if phase_name in flow_state:
-                    flow_state[phase_name]["status"] = "current"
+                for k, v in flow_status.items():
+                    if v == "current":
+                        flow_status[k] = "done"
+                if phase_name in flow_status:
+                    flow_status[phase_name] = "current"
                 render_flow()
                 last_speaker = None
 
             elif rtype == "agent_start":
                 expert_name = stream_result.get("agent", "专家")
-                if not is_expert_selected(expert_name, selected_experts):
+                if not _fast_selected(expert_name):
                     continue
                 if expert_name not in current_containers:
                     if created_in_phase % 3 == 0:
@@ -1868,7 +2116,7 @@ def run_real_stream_mdt(selected_experts: List[str]):
                 display_expert_response(current_containers[expert_name], expert_name, "", "thinking")
             elif rtype == "agent_chunk":
                 expert_name = stream_result.get("agent", "专家")
-                if not is_expert_selected(expert_name, selected_experts):
+                if not _fast_selected(expert_name):
                     continue
                 full_response = stream_result.get("full_response") or ""
                 if expert_name not in current_containers:
@@ -1879,16 +2127,24 @@ def run_real_stream_mdt(selected_experts: List[str]):
                     target_col = cols_current_row[created_in_phase % 3]
                     current_containers[expert_name] = target_col.empty()
                     created_in_phase += 1
-                display_expert_response(current_containers[expert_name], expert_name, full_response, "typing")
-                display_expert_response(current_containers[expert_name], expert_name, full_response, "typing")
+                # 合并 token 更新：距上次刷新超过 _CHUNK_FLUSH_S 才重绘，其余暂存
+                _, last_flush = pending_chunks.get(expert_name, ("", 0.0))
+                now = time.monotonic()
+                if now - last_flush >= _CHUNK_FLUSH_S:
+                    display_expert_response(current_containers[expert_name], expert_name, full_response, "typing")
+                    pending_chunks[expert_name] = ("", now)
+                else:
+                    pending_chunks[expert_name] = (full_response, last_flush)
 
             elif rtype == "phase_complete":
+                flush_pending_chunks()
                 phase_name = stream_result.get("phase")
                 phase_result = stream_result.get("result", {})
                 if phase_name:
                     collected_result["phases"][phase_name] = phase_result
-                if phase_name in flow_state:
-                    flow_state[phase_name]["status"] = "done"
+                    phases_raw[phase_name] = _dumps_phase(phase_result)
+                if phase_name in flow_status:
+                    flow_status[phase_name] = "done"
                     metrics_capture = {}
                     if phase_name == "conflict_detection":
                         metrics_capture = {"共识": phase_result.get("consensus_score"), "冲突": "是" if phase_result.get("conflict_detected") else "否"}
@@ -1896,10 +2152,10 @@ def run_real_stream_mdt(selected_experts: List[str]):
                         metrics_capture = {"最终共识": phase_result.get("consensus_score"), "阈值": phase_result.get("threshold")}
                     elif phase_name == "multi_round_discussion":
                         metrics_capture = {"轮数": phase_result.get("total_rounds")}
-                    flow_state[phase_name]["metrics"] = metrics_capture
+                    flow_metrics[phase_name] = metrics_capture
                     if phase_name == "multi_round_discussion":
-                        flow_state[phase_name]["rounds"] = phase_result.get("total_rounds", 0)
-                render_flow()
+                        flow_rounds[phase_name] = phase_result.get("total_rounds", 0)
+                render_flow(force=True)
                 if phase_name == "conflict_detection":
                     consensus_score = phase_result.get("consensus_score", 0.0)
                     conflicts = phase_result.get("conflict_detected", False)
@@ -1917,19 +2173,20 @@ def run_real_stream_mdt(selected_experts: List[str]):
                         with c2: st.metric("共识阈值", f"{threshold:.2f}")
                         with c3: st.metric("高于阈值" if gap >= 0 else "低于阈值", f"{gap:+.2f}")
                 if phase_name in ("conflict_detection", "consensus_evaluation", "final_coordination"):
-                    coord_nodes = [n for n in interaction_nodes if any(cn in n for cn in coordinator_names)]
+                    coord_nodes = [n for n in interaction_nodes if node_meta[n][2]]
                     if coord_nodes:
                         coord = coord_nodes[0]
                         for n in interaction_nodes:
                             if n != coord:
                                 add_edge(n, coord)
-                        render_interaction()
+                        render_interaction(force=True)
 
             elif rtype == "agent_complete":
                 expert_name = stream_result.get("agent", "专家")
-                if not is_expert_selected(expert_name, selected_experts):
+                if not _fast_selected(expert_name):
                     continue
                 full_response = stream_result.get("result", {}).get("response", "")
+                pending_chunks.pop(expert_name, None)
                 if expert_name not in current_containers:
                     if created_in_phase % 3 == 0:
                         if phase_container is None:
@@ -1946,10 +2203,10 @@ def run_real_stream_mdt(selected_experts: List[str]):
             elif rtype == "session_complete":
                 st.success("🎉 MDT讨论完成！")
                 progress_bar.progress(1.0)
-                for k in flow_state:
-                    if flow_state[k]["status"] == "current":
-                        flow_state[k]["status"] = "done"
-                render_flow(); render_interaction()
+                for k, v in flow_status.items():
+                    if v == "current":
+                        flow_status[k] = "done"
+                render_flow(force=True); render_interaction(force=True)
                 final_result = stream_result.get("result", {})
                 if final_result:
                     collected_result.update(final_result)
@@ -1960,37 +2217,39 @@ def run_real_stream_mdt(selected_experts: List[str]):
                         'pulmonary':'呼吸科专家','imaging':'影像科专家','pathology':'病理科专家',
                         'rheumatology':'风湿免疫科专家','data_analysis':'数据分析专家','coordinator':'协调员'
                     }
-                    rag_any = False
-                    rag_container = st.container()
-                    with rag_container:
+                    # 汇总为单个 Markdown 块输出，避免每个片段各建一个 st.code 组件
+                    rag_blocks: List[str] = []
+                    for key, agent in orch.agents.items():
+                        chunks = getattr(agent, 'last_retrieved_chunks', []) or []
+                        if not chunks:
+                            continue
+                        rag_blocks.append(f"### {name_map.get(key, key)}")
+                        for idx, chunk in enumerate(chunks[:5], 1):
+                            # 兼容字符串旧格式与新结构化字典
+                            if isinstance(chunk, dict):
+                                src = chunk.get('source','未知')
+                                score = chunk.get('score')
+                                content = (chunk.get('raw') or chunk.get('content',''))[:800]
+                                meta = f"来源: {src}"
+                                if isinstance(score, (int, float)):
+                                    meta += f" | 相关度: {score:.4f}"
+                                header = f"**#{idx}** {meta}"
+                            else:
+                                content = str(chunk)[:600]
+                                header = f"**#{idx}**"
+                            fence = "~~~~" if "```" in content else "```"
+                            rag_blocks.append(f"{header}\n\n{fence}markdown\n{content}\n{fence}")
+                    with st.container():
                         with st.expander('🔎 RAG片段(预览) - 全部专家汇总', expanded=False):
-                            for key, agent in orch.agents.items():
-                                chunks = getattr(agent, 'last_retrieved_chunks', []) or []
-                                if chunks:
-                                    rag_any = True
-                                    st.markdown(f"### {name_map.get(key, key)}")
-                                    for idx, chunk in enumerate(chunks[:5], 1):
-                                        # 兼容字符串旧格式与新结构化字典
-                                        if isinstance(chunk, dict):
-                                            src = chunk.get('source','未知')
-                                            score = chunk.get('score')
-                                            content = chunk.get('raw') or chunk.get('content','')
-                                            meta = f"来源: {src}"
-                                            if score is not None:
-                                                meta += f" | 相关度: {score:.4f}" if isinstance(score,(int,float)) else ""
-                                            st.markdown(f"**#{idx}** {meta}")
-                                            st.code(content[:800], language='markdown')
-                                        else:
-                                            st.markdown(f"**#{idx}**")
-                                            st.code(str(chunk)[:600], language='markdown')
-                            if not rag_any:
+                            if rag_blocks:
+                                st.markdown("\n\n".join(rag_blocks))
+                            else:
                                 st.info('当前会话未检索到任何RAG片段。')
-                end_time = datetime.now()
-                collected_result["end_time"] = end_time.isoformat()
-                start_time = datetime.fromisoformat(collected_result["start_time"])
-                duration = end_time - start_time
-                collected_result["duration"] = f"{int(duration.total_seconds()//60)}分{int(duration.total_seconds()%60)}秒"
+                elapsed = time.monotonic() - _t0
+                collected_result["end_time"] = datetime.now().isoformat()
+                collected_result["duration"] = f"{int(elapsed//60)}分{int(elapsed%60)}秒"
                 st.session_state.mdt_result = collected_result
+                st.session_state.mdt_phases_raw = (collected_result.get("session_id"), phases_raw)
                 st.session_state.stream_complete = True
                 break
 
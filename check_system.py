@@ -4,6 +4,14 @@
 import os
 from utils.config import config
 
+def _scan_entries(dir_path: str) -> set:
+    """一次 scandir 取得目录下全部条目名，目录不存在时返回空集合"""
+    try:
+        with os.scandir(dir_path) as it:
+            return {entry.name for entry in it}
+    except OSError:
+        return set()
+
 def check_system_configuration():
     """检查系统配置"""
     print("🔍 多智能体MDT系统配置检查")
@@ -29,8 +37,18 @@ def check_system_configuration():
         "tests"
     ]
     
+    # 每个目录只 scandir 一次，之后均为内存集合查找
+    dir_entries = {".": _scan_entries(".")}
+    
+    def _exists(rel_path: str) -> bool:
+        parent, name = os.path.split(rel_path)
+        parent = parent or "."
+        if parent not in dir_entries:
+            dir_entries[parent] = _scan_entries(parent)
+        return name in dir_entries[parent]
+    
     for dir_name in required_dirs:
-        exists = os.path.exists(dir_name)
+        exists = _exists(dir_name)
         print(f"  • {dir_name}/: {'✅' if exists else '❌'}")
     
     # 检查关键文件
@@ -52,7 +70,7 @@ def check_system_configuration():
     ]
     
     for file_name in required_files:
-        exists = os.path.exists(file_name)
+        exists = _exists(file_name)
         print(f"  • {file_name}: {'✅' if exists else '❌'}")
     
     # 系统状态总结
@@ -1,51 +1,315 @@
 import os
-from typing import List, Dict, Any, Optional
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from langchain.embeddings.base import Embeddings
-from langchain_community.vectorstores import FAISS
 from langchain.schema import Document
 from utils.config import config
 import logging
 from prompts import RAG_QUERY_PROMPT  # 保留扩展多查询模板需要
-from langchain_community.document_loaders import DirectoryLoader, TextLoader, PyPDFLoader
+from langchain_community.document_loaders import TextLoader, PyPDFLoader
+import fnmatch
 import glob
+import re
+import bisect
 import pandas as pd  # CSV 解析
 import pickle
+import json
+import functools
+import hashlib
 import uuid
 import time
+import types
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import numpy as np
+import faiss
+try:  # 可选依赖：orjson 读写元数据更快，缺失时沿用 pickle
+    import orjson
+except ImportError:
+    orjson = None
+try:  # 可选依赖：psutil 用于获取物理核数，缺失时按逻辑核数
+    import psutil
+except ImportError:
+    psutil = None
 
 logger = logging.getLogger(__name__)
 
+# meta.pkl 格式版本：2 = 原生 faiss 索引 + int64 id 文档表
+_META_FORMAT = 2
+# IVF 训练使用的向量数（不足 39*nlist 时按后者取）
+_IVF_TRAIN_SAMPLE = 100_000
+# 可选索引类型：auto 按规模分档；其余为手动指定（manage_kb.py rebuild --index-type）
+_INDEX_TYPES = ('auto', 'flat', 'hnsw', 'ivf', 'pq')
+# 向量编码：fp32 原样存储；fp16 为半精度标量量化；pq8 为 8bit 乘积量化（HNSW 下为 8bit 标量量化）
+_QUANT_TYPES = ('fp32', 'fp16', 'pq8')
+# 手动指定 ivf / pq（或 pq8 编码）时，向量数达到该值才训练，之前先用平面索引
+_EXPLICIT_TRAIN_MIN = 10_000
+# 文本达到该长度时改用正则预切分（_fast_split），较短文本仍走 RecursiveCharacterTextSplitter
+_FAST_SPLIT_MIN_CHARS = 32 * 1024
+# 候选断点：段落、换行、中英文句末标点之后
+_BREAK_RE = re.compile(r'\n\n+|\n|(?<=[。！？；!?;])\s*')
+# 本地编码按 token 长度分桶的上界（最后一桶使用模型自身的 max_seq_length）
+_LENGTH_BUCKETS = (32, 128, 512)
+
+
+def configure_faiss_threads(n: Optional[int] = None) -> int:
+    """设置 FAISS OpenMP 线程数（CLI 入口调用一次）：优先 FAISS_THREADS，其次物理核数，避免超线程争用"""
+    n = n or getattr(config, 'FAISS_THREADS', 0)
+    if not n:
+        n = (psutil.cpu_count(logical=False) if psutil is not None else None) or os.cpu_count() or 4
+    faiss.omp_set_num_threads(n)
+    return n
+
+
+def _pq_m(d: int) -> int:
+    """PQ 子空间数：取能整除维度的最大候选值"""
+    for m in (64, 32, 16, 8):
+        if d % m == 0:
+            return m
+    return 1
+
+
+def _ivf_of(index) -> Optional[Any]:
+    """返回索引内部的 IVF 结构（非 IVF 索引返回 None）"""
+    try:
+        return faiss.extract_index_ivf(index)
+    except Exception:
+        return None
+
+
+def _chunk_hash(text: str) -> str:
+    """chunk 内容摘要（入库去重用）"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _join_truncated(chunks: List[str], max_len: int, sep: str = "\n\n") -> str:
+    """等价于 sep.join(chunks)[:max_len] + "..."（超长时），但只拼接到首个越过上限的片段为止"""
+    if not chunks:
+        return ""
+    # 前 m 段拼接后的长度 = cum[m-1] - len(sep)
+    cum = np.cumsum(np.fromiter(map(len, chunks), dtype=np.int64, count=len(chunks)) + len(sep))
+    if cum[-1] - len(sep) <= max_len:
+        return sep.join(chunks)
+    m = int(np.searchsorted(cum, max_len + len(sep))) + 1
+    return sep.join(chunks[:m])[:max_len] + "..."
+
+
+def _make_text_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n", " ", ""]
+    )
+
+
+def _fast_split(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """正则一次性找出候选断点，再按整数偏移贪心打包为不超过 chunk_size 的片段（含 overlap）"""
+    n = len(text)
+    breaks = [m.end() for m in _BREAK_RE.finditer(text)]
+    breaks.append(n)
+    chunks: List[str] = []
+    start = 0
+    while start < n:
+        # 不超过 chunk_size 的最远断点；区间内无断点时硬切
+        j = bisect.bisect_right(breaks, start + chunk_size) - 1
+        end = breaks[j] if j >= 0 and breaks[j] > start else min(start + chunk_size, n)
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= n:
+            break
+        # 下一片段从 end - overlap 之后的第一个断点开始
+        k = bisect.bisect_left(breaks, end - chunk_overlap)
+        next_start = breaks[k] if k < len(breaks) and breaks[k] < end else end
+        start = next_start if next_start > start else end
+    return chunks
+
+
+def _split_documents(splitter: RecursiveCharacterTextSplitter, docs: List[Document],
+                     chunk_size: int, chunk_overlap: int) -> List[Document]:
+    """长文本走 _fast_split，短文本交给 LangChain 递归切分器；保持原文档顺序"""
+    out: List[Document] = []
+    for d in docs:
+        content = d.page_content or ''
+        if len(content) >= _FAST_SPLIT_MIN_CHARS:
+            out.extend(Document(page_content=c, metadata=dict(d.metadata)) for c in _fast_split(content, chunk_size, chunk_overlap))
+        else:
+            out.extend(splitter.split_documents([d]))
+    return out
+
+
+def _read_text_document(path: str) -> Optional[Document]:
+    """读取单个 UTF-8 文本文件为 Document（供线程池并发读取）；失败时记录日志并返回 None"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return Document(page_content=f.read(), metadata={'source': path})
+    except (OSError, UnicodeDecodeError) as e:
+        logger.error(f"读取文件失败 {path}: {e}")
+        return None
+
+
+def _load_and_split(path: str, kind: str, chunk_size: int, chunk_overlap: int,
+                    max_csv_rows: Optional[int] = None) -> List[Document]:
+    """加载单个文件并切分（模块级函数，供进程池调用）。
+
+    kind: txt | pdf | csv_rows（每行一段） | csv_table（列名:值 合并后切分）
+    """
+    abs_path = os.path.abspath(path)
+    if kind == 'txt':
+        docs = TextLoader(path, encoding='utf-8').load()
+    elif kind == 'pdf':
+        docs = [p for p in PyPDFLoader(path).load() if (p.page_content or '').strip()]
+    elif kind == 'csv_rows':
+        df = pd.read_csv(path, nrows=max_csv_rows)
+        # 整表一次转字符串后按行拼接，避免 DataFrame.apply 的逐行 Python 调用
+        flattened = pd.Series(df.astype(str).to_numpy().tolist(), dtype=object).str.join(' | ').tolist()
+        docs = [Document(page_content=t, metadata={}) for t in flattened]
+    elif kind == 'csv_table':
+        df = pd.read_csv(path, nrows=max_csv_rows)
+        # "列名:值" 单元格用 numpy 向量化生成，空白单元格置空后按行拼接
+        vals = df.astype(str).to_numpy(dtype=str)
+        cells = np.char.add(df.columns.astype(str).to_numpy(dtype=str)[None, :], np.char.add(':', vals))
+        cells = np.where(np.char.strip(vals) != '', cells, '')
+        rows_text = [line for line in (' | '.join(filter(None, row)) for row in cells.tolist()) if line]
+        full_text = '\n'.join(rows_text)
+        docs = [Document(page_content=full_text, metadata={'type': 'csv'})] if full_text.strip() else []
+    else:
+        raise ValueError(f"未知文件类型: {kind}")
+    for d in docs:
+        d.metadata['source'] = abs_path
+    split_docs = _split_documents(_make_text_splitter(chunk_size, chunk_overlap), docs, chunk_size, chunk_overlap)
+    return [d for d in split_docs if (d.page_content or '').strip()]
+
+
+class QVCache:
+    """查询级语义缓存：新查询向量与已缓存查询的余弦相似度 ≥ threshold 时直接复用其检索结果
+
+    同一病例下各专科的检索语句常只是措辞不同，命中后可省去一次索引检索。
+    缓存项按 LRU 淘汰；索引内容变化时由知识库调用 clear() 失效。
+    """
+
+    def __init__(self, maxsize: int = 256, threshold: float = 0.95):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vecs: Optional[np.ndarray] = None          # (maxsize, d) 已归一化查询向量
+        self._results: List[Optional[Tuple[np.ndarray, np.ndarray]]] = [None] * maxsize
+        self._last_used = np.zeros(maxsize, dtype='int64')  # LRU 时钟，0 表示空位
+        self._tick = 0
+
+    def lookup(self, q_vec: np.ndarray, k: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """返回 (D, I)；未命中或缓存的 k 不足时返回 None"""
+        with self._lock:
+            if self._vecs is not None and self._vecs.shape[1] == q_vec.shape[1]:
+                sims = self._vecs @ q_vec[0]
+                sims[self._last_used == 0] = -np.inf
+                j = int(np.argmax(sims))
+                if sims[j] >= self.threshold and self._results[j][1].shape[1] >= k:
+                    self._tick += 1
+                    self._last_used[j] = self._tick
+                    self.hits += 1
+                    D, I = self._results[j]
+                    return D[:, :k], I[:, :k]
+            self.misses += 1
+            return None
+
+    def put(self, q_vec: np.ndarray, D: np.ndarray, I: np.ndarray):
+        with self._lock:
+            if self._vecs is None or self._vecs.shape[1] != q_vec.shape[1]:
+                self._vecs = np.zeros((self.maxsize, q_vec.shape[1]), dtype='float32')
+                self._last_used[:] = 0
+            # 优先占用空位，其次淘汰最久未用项
+            j = int(np.argmin(self._last_used))
+            self._vecs[j] = q_vec[0]
+            self._results[j] = (D, I)
+            self._tick += 1
+            self._last_used[j] = self._tick
+
+    def clear(self):
+        with self._lock:
+            self._last_used[:] = 0
+            self._results = [None] * self.maxsize
+
+
 class MedicalKnowledgeStore:
     """医学知识库管理类 (FAISS 后端版本)"""
 
-    def __init__(self):
+    def __init__(self, load_meta: bool = True):
         api_key_raw = getattr(config, 'OPENAI_API_KEY', None) or os.getenv('OPENAI_API_KEY') or ''
+        # 热路径用到的配置项在构造时读取一次
+        self._cfg = types.SimpleNamespace(
+            batch_size=getattr(config, 'EMBEDDING_BATCH_SIZE', 64),
+            show_progress=getattr(config, 'SHOW_EMBED_PROGRESS', True),
+            emb_model=getattr(config, 'EMBEDDING_MODEL', 'text-embedding-3-small'),
+            concurrency=getattr(config, 'EMBEDDING_CONCURRENCY', 8),
+            ivf_nprobe=getattr(config, 'IVF_NPROBE', 16),
+            ivf_train_threshold=getattr(config, 'IVF_TRAIN_THRESHOLD', 50_000),
+            ivf_pq_threshold=getattr(config, 'IVF_PQ_THRESHOLD', 500_000),
+            mmap=getattr(config, 'FAISS_MMAP', False),
+            shared_mmap=getattr(config, 'FAISS_SHARED_MMAP', False),
+            index_type=getattr(config, 'FAISS_INDEX_TYPE', 'auto'),
+            quant=getattr(config, 'FAISS_QUANT', 'fp32'),
+            hnsw_ef_search=getattr(config, 'HNSW_EF_SEARCH', 64),
+            query_embed_cache_size=getattr(config, 'QUERY_EMBED_CACHE_SIZE', 2048),
+            # 嵌入缓存目录，None 表示不使用缓存
+            emb_cache_dir=(getattr(config, 'EMBEDDING_CACHE_DIR', 'knowledge/embeddings_cache')
+                           if getattr(config, 'EMBEDDING_CACHE', True) else None),
+        )
         # 通过环境变量设置避免 proxies 参数冲突
         if api_key_raw:
             os.environ['OPENAI_API_KEY'] = api_key_raw
         # 延迟初始化 embeddings / index，避免导入时阻塞 UI
         self.embeddings: Optional[Embeddings] = None
         self.embedding_model_name: str = getattr(config, 'EMBEDDING_PROVIDER', 'auto')
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=config.CHUNK_SIZE,
-            chunk_overlap=config.CHUNK_OVERLAP,
-            separators=["\n\n", "\n", " ", ""]
-        )
-        self.index: Optional[FAISS] = None
-        self.meta_records: Dict[str, Dict[str, Any]] = {}
+        self.text_splitter = _make_text_splitter(config.CHUNK_SIZE, config.CHUNK_OVERLAP)
+        # 原生 faiss 索引：按规模由 IDMap2(FlatIP) 依次升级为 IVF-SQ8、IVF-PQ
+        self.index: Optional[faiss.Index] = None
+        # 当前索引的构建方式（随元数据持久化）
+        self._index_type: str = self._cfg.index_type
+        self._quant: str = self._cfg.quant
+        # 以 int64 向量 id 为键：元数据与正文分表存放
+        self.meta_records: Dict[int, Dict[str, Any]] = {}
+        self.docstore: Dict[int, str] = {}
+        # 已入库 chunk 的内容摘要，重复内容不再嵌入
+        self._chunk_hashes: set = set()
+        # 已处理文件集合缓存（get_processed_files），入库/清空时失效
+        self._processed_abs: Optional[frozenset] = None
+        self._next_id: int = 0
+        self._legacy_store = False
+        # 以内存映射只读方式打开的索引不能写入，新增前需整体载入内存
+        self._index_mmap = False
+        self._loaded_version = 0
+        # 查询向量缓存（按实例）：同一病例各专科共享的子查询只嵌入一次
+        self._embed_query_cached = functools.lru_cache(maxsize=self._cfg.query_embed_cache_size)(self._embed_query)
+        # 可选的查询级语义缓存（QVCache），由入口（main.init_knowledge）挂载；索引变化时清空
+        self._cache: Optional[QVCache] = None
         # 持久化目录（统一使用 FAISS_DB_PATH）
         self.persist_path = getattr(config, 'FAISS_DB_PATH', './data/faiss_store')
         os.makedirs(self.persist_path, exist_ok=True)
-        # 仅加载 meta 记录，向量索引延迟加载
-        self._load_meta_if_exists()
+        # 仅加载 meta 记录，向量索引延迟加载；随即清空重建的调用方可跳过
+        if load_meta:
+            self._load_meta_if_exists()
 
     # ---- 延迟初始化辅助 ----
     def ensure_embeddings(self):
         if self.embeddings is None:
             self.embeddings = self._init_embeddings()
 
+    def ensure_loaded(self, mmap: Optional[bool] = None) -> bool:
+        """进程启动时预加载索引（mmap=True 时以只读内存映射打开），避免首次检索才反序列化
+
+        Returns:
+            索引是否可用
+        """
+        if mmap is not None and self.index is None:
+            self._cfg.mmap = mmap
+        self.ensure_index_loaded()
+        return self.index is not None
+
     def ensure_index_loaded(self):
         if self.index is not None:
             return
@@ -53,20 +317,263 @@ class MedicalKnowledgeStore:
         idx_file, meta_file = self._faiss_files()
         if os.path.exists(idx_file):
             try:
-                self.ensure_embeddings()
-                try:
-                    self.index = FAISS.load_local(self.persist_path, self.embeddings, allow_dangerous_deserialization=True)  # type: ignore[arg-type]
-                except TypeError:
-                    self.index = FAISS.load_local(self.persist_path, self.embeddings)  # type: ignore[arg-type]
-                logger.info(f"FAISS 索引延迟加载完成: {self.persist_path}")
+                if self._legacy_store:
+                    self._migrate_legacy_store()
+                    return
+                self._loaded_version = self._index_version()
+                if self._cfg.mmap or self._cfg.shared_mmap:
+                    try:
+                        self.index = faiss.read_index(idx_file, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                        self._index_mmap = True
+                    except Exception as e_mmap:
+                        logger.warning(f"FAISS 内存映射加载失败，改为完整读取: {e_mmap}")
+                if self.index is None:
+                    self.index = faiss.read_index(idx_file)
+                self._apply_search_params()
+                logger.info(f"FAISS 索引延迟加载完成: {self.persist_path} ({type(self.index).__name__}, ntotal={self.index.ntotal})")
             except Exception as e:
                 logger.warning(f"延迟加载 FAISS 失败: {e}")
 
     # ---------------- FAISS 持久化 ----------------
     def _faiss_files(self):
-        # FAISS save_local 实际保存为 index.faiss 和 index.pkl，我们只需要 meta.pkl
+        # index.faiss 为 faiss.write_index 原生格式；meta.pkl 保存元数据与正文
         return os.path.join(self.persist_path, 'index.faiss'), os.path.join(self.persist_path, 'meta.pkl')
 
+    def _migrate_legacy_store(self):
+        """将旧版 LangChain FAISS 存储（index.faiss + index.pkl）转换为原生格式"""
+        idx_file, _ = self._faiss_files()
+        with open(os.path.join(self.persist_path, 'index.pkl'), 'rb') as f:
+            lc_docstore, index_to_docstore_id = pickle.load(f)
+        old_index = faiss.read_index(idx_file)
+        vecs = old_index.reconstruct_n(0, old_index.ntotal)
+        self.meta_records, self.docstore = {}, {}
+        for pos, doc_id in index_to_docstore_id.items():
+            doc = lc_docstore.search(doc_id)
+            if isinstance(doc, Document):
+                self.meta_records[pos] = dict(doc.metadata)
+                self.docstore[pos] = doc.page_content
+        self._chunk_hashes = {_chunk_hash(t) for t in self.docstore.values()}
+        self._processed_abs = None
+        vecs = np.ascontiguousarray(vecs, dtype='float32')
+        faiss.normalize_L2(vecs)
+        self.index = None
+        self._index_vectors(vecs, np.arange(len(vecs), dtype='int64'))
+        self._next_id = len(vecs)
+        self._legacy_store = False
+        self._persist()
+        try:
+            os.remove(os.path.join(self.persist_path, 'index.pkl'))
+        except OSError:
+            pass
+        logger.info(f"旧版 LangChain FAISS 存储已迁移为原生索引: records={len(self.meta_records)}")
+
+    def _ensure_index_writable(self):
+        """写入前将内存映射（只读）索引重新完整载入内存"""
+        if self._index_mmap:
+            idx_file, _ = self._faiss_files()
+            self.index = faiss.read_index(idx_file)
+            self._index_mmap = False
+            self._apply_search_params()
+
+    # ---------------- 原生 faiss 索引 ----------------
+    def _apply_search_params(self):
+        if self.index is None:
+            return
+        ivf = _ivf_of(self.index)
+        if ivf is not None:
+            ivf.nprobe = self._cfg.ivf_nprobe
+        elif isinstance(self.index, faiss.IndexIDMap2):
+            inner = faiss.downcast_index(self.index.index)
+            if isinstance(inner, faiss.IndexHNSW):
+                inner.hnsw.efSearch = self._cfg.hnsw_ef_search
+
+    def _index_tier(self, n: int) -> int:
+        """按向量规模选择索引档位：0=Flat，1=IVF-SQ8，2=IVF-PQ"""
+        if n < self._cfg.ivf_train_threshold:
+            return 0
+        if n < self._cfg.ivf_pq_threshold:
+            return 1
+        return 2
+
+    def _current_tier(self) -> int:
+        if isinstance(self.index, faiss.IndexIDMap2):
+            return 0
+        return 1 if isinstance(self.index, faiss.IndexIVFScalarQuantizer) else 2
+
+    def _dump_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """取出当前索引中的全部向量及其 id（IVF 索引为量化后的近似重建）"""
+        if isinstance(self.index, faiss.IndexIDMap2):
+            flat = faiss.downcast_index(self.index.index)
+            return flat.reconstruct_n(0, flat.ntotal), faiss.vector_to_array(self.index.id_map).astype('int64')
+        ivf = faiss.extract_index_ivf(self.index)
+        invlists = ivf.invlists
+        ids = np.concatenate([
+            faiss.rev_swig_ptr(invlists.get_ids(l), invlists.list_size(l)).copy()
+            for l in range(ivf.nlist) if invlists.list_size(l)
+        ])
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return ivf.reconstruct_batch(ids), ids
+
+    def _build_ivf_index(self, vecs: np.ndarray, ids: np.ndarray, tier: int) -> faiss.Index:
+        """训练 IVF 索引并写入全部向量：tier 1 为 IVF1024,SQ8；tier 2 为 IVF4096,PQ"""
+        d = vecs.shape[1]
+        quantizer = faiss.IndexFlatIP(d)
+        if tier == 1:
+            # faiss 建议每个聚类中心至少 39 个训练点
+            nlist = max(1, min(1024, len(vecs) // 39))
+            index = faiss.IndexIVFScalarQuantizer(quantizer, d, nlist, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        else:
+            nlist = 4096 if len(vecs) >= 4096 * 39 else max(1, min(1024, len(vecs) // 39))
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, _pq_m(d), 8, faiss.METRIC_INNER_PRODUCT)
+        index.train(vecs[:max(_IVF_TRAIN_SAMPLE, 39 * nlist)])
+        index.add_with_ids(vecs, ids)
+        return index
+
+    def _flat_index(self, d: int, quant: str) -> faiss.Index:
+        """平面（暴力检索）索引；fp16 为半精度标量量化，内存与带宽减半，无需训练"""
+        if quant == 'fp16':
+            return faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+        if quant == 'pq8':
+            return faiss.IndexPQ(d, _pq_m(d), 8, faiss.METRIC_INNER_PRODUCT)
+        return faiss.IndexFlatIP(d)
+
+    def _build_explicit_index(self, vecs: np.ndarray, ids: np.ndarray) -> faiss.Index:
+        """按手动指定的索引类型与向量编码构建并写入全部向量；需训练而样本不足时先返回平面索引"""
+        n, d = vecs.shape
+        kind, quant = self._index_type, self._quant
+        if n < _EXPLICIT_TRAIN_MIN and (kind in ('ivf', 'pq') or (kind == 'flat' and quant == 'pq8')):
+            kind, quant = 'flat', 'fp32'
+        if kind == 'pq':
+            return self._build_ivf_index(vecs, ids, 2)
+        if kind == 'ivf':
+            # nlist 取 sqrt(N)，且保证每个聚类中心至少 39 个训练点
+            nlist = max(1, min(int(np.sqrt(n)), n // 39))
+            quantizer = faiss.IndexFlatIP(d)
+            if quant == 'fp16':
+                index = faiss.IndexIVFScalarQuantizer(quantizer, d, nlist, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+            elif quant == 'pq8':
+                index = faiss.IndexIVFPQ(quantizer, d, nlist, _pq_m(d), 8, faiss.METRIC_INNER_PRODUCT)
+            else:
+                index = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_INNER_PRODUCT)
+            index.train(vecs[:max(_IVF_TRAIN_SAMPLE, 39 * nlist)])
+            index.add_with_ids(vecs, ids)
+            return index
+        if kind == 'hnsw':
+            if quant == 'fp32':
+                base = faiss.IndexHNSWFlat(d, 32, faiss.METRIC_INNER_PRODUCT)
+            else:
+                qtype = faiss.ScalarQuantizer.QT_fp16 if quant == 'fp16' else faiss.ScalarQuantizer.QT_8bit
+                base = faiss.IndexHNSWSQ(d, qtype, 32, faiss.METRIC_INNER_PRODUCT)
+            base.hnsw.efConstruction = 200
+        else:
+            base = self._flat_index(d, quant)
+        if not base.is_trained:
+            base.train(vecs[:_IVF_TRAIN_SAMPLE])
+        index = faiss.IndexIDMap2(base)
+        index.add_with_ids(vecs, ids)
+        return index
+
+    def _index_vectors(self, vecs: np.ndarray, ids: np.ndarray):
+        """写入已归一化的向量；规模跨过档位阈值时整体重建为更紧凑的索引"""
+        if self._index_type != 'auto':
+            self._index_vectors_explicit(vecs, ids)
+            return
+        if self.index is None:
+            # 平面档无需训练：pq8 在该档按 fp16 存储，规模升级后改用 IVF 量化
+            self.index = faiss.IndexIDMap2(self._flat_index(vecs.shape[1], 'fp16' if self._quant == 'pq8' else self._quant))
+        self.index.add_with_ids(vecs, ids)
+        tier = self._index_tier(self.index.ntotal)
+        if tier > self._current_tier():
+            t0 = time.time()
+            all_vecs, all_ids = self._dump_vectors()
+            self.index = self._build_ivf_index(all_vecs, all_ids, tier)
+            self._apply_search_params()
+            logger.info(f"FAISS 索引升级为 {type(self.index).__name__}: ntotal={self.index.ntotal} 用时={time.time()-t0:.2f}s")
+
+    def _index_vectors_explicit(self, vecs: np.ndarray, ids: np.ndarray):
+        """手动指定索引类型时的写入：首批直接构建；需训练而暂用平面索引的，样本足够后再训练重建"""
+        if self.index is None:
+            self.index = self._build_explicit_index(vecs, ids)
+            self._apply_search_params()
+            return
+        self.index.add_with_ids(vecs, ids)
+        pending_train = (self.index.ntotal >= _EXPLICIT_TRAIN_MIN
+                         and (self._index_type in ('ivf', 'pq') or (self._index_type == 'flat' and self._quant == 'pq8'))
+                         and isinstance(self.index, faiss.IndexIDMap2)
+                         and isinstance(faiss.downcast_index(self.index.index), faiss.IndexFlat))
+        if pending_train:
+            t0 = time.time()
+            all_vecs, all_ids = self._dump_vectors()
+            self.index = self._build_explicit_index(all_vecs, all_ids)
+            self._apply_search_params()
+            logger.info(f"FAISS 索引构建为 {type(self.index).__name__}: ntotal={self.index.ntotal} 用时={time.time()-t0:.2f}s")
+
+    def _embed_query(self, text: str) -> np.ndarray:
+        """嵌入并归一化单条查询，返回只读 (1, d) 数组（供 lru 缓存复用）"""
+        self.ensure_embeddings()
+        q_vec = np.ascontiguousarray([self.embeddings.embed_query(text)], dtype='float32')  # type: ignore[union-attr]
+        faiss.normalize_L2(q_vec)
+        q_vec.flags.writeable = False
+        return q_vec
+
+    def _async_embedding_client(self):
+        """按同步嵌入客户端 (OpenAIEmbeddings) 的 api_key / base_url 等设置构建 AsyncOpenAI，未设置项仍取环境默认"""
+        from openai import AsyncOpenAI
+        emb = self.embeddings
+        api_key = getattr(emb, 'openai_api_key', None)
+        if hasattr(api_key, 'get_secret_value'):
+            api_key = api_key.get_secret_value()
+        return AsyncOpenAI(
+            api_key=api_key or None,
+            base_url=getattr(emb, 'openai_api_base', None) or None,
+            organization=getattr(emb, 'openai_organization', None) or None,
+            default_headers=getattr(emb, 'default_headers', None),
+        )
+
+    async def _embed_all_async(self, texts: List[str], batch_size: int, concurrency: int) -> List[List[float]]:
+        """并发请求 OpenAI embeddings：按批切分，信号量限制同时在途的请求数"""
+        client = self._async_embedding_client()
+        model = self._cfg.emb_model
+        sem = asyncio.Semaphore(concurrency)
+
+        async def _embed_batch_async(batch: List[str]) -> List[List[float]]:
+            async with sem:
+                resp = await client.embeddings.create(model=model, input=batch)
+                return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+        try:
+            results = await asyncio.gather(*(_embed_batch_async(texts[i:i+batch_size]) for i in range(0, len(texts), batch_size)))
+        finally:
+            await client.close()
+        return [v for batch in results for v in batch]
+
+    def _embed_openai_concurrent(self, texts: List[str], batch_size: int) -> Optional[np.ndarray]:
+        """同步入口：已处于事件循环中或请求失败时返回 None，由调用方回退逐批嵌入"""
+        try:
+            asyncio.get_running_loop()
+            return None
+        except RuntimeError:
+            pass
+        try:
+            t0 = time.time()
+            vectors = asyncio.run(self._embed_all_async(texts, batch_size, self._cfg.concurrency))
+            vecs = np.ascontiguousarray(vectors, dtype='float32')
+            faiss.normalize_L2(vecs)
+            logger.info(f"OpenAI 并发嵌入完成: chunks={len(texts)} 用时={time.time()-t0:.2f}s")
+            return vecs
+        except Exception as e:
+            logger.warning(f"OpenAI 并发嵌入失败，回退逐批嵌入: {e}")
+            return None
+
+    def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        if hasattr(self.embeddings, 'embed_documents_array'):
+            # 本地模型：直接取 numpy 数组
+            vecs = np.ascontiguousarray(self.embeddings.embed_documents_array(texts), dtype='float32')  # type: ignore[union-attr]
+        else:
+            vecs = np.ascontiguousarray(self.embeddings.embed_documents(texts), dtype='float32')  # type: ignore[union-attr]
+        faiss.normalize_L2(vecs)
+        return vecs
+
     def _init_embeddings(self) -> Embeddings:
         provider = getattr(config, 'EMBEDDING_PROVIDER', 'auto')
         want_local = provider == 'local'
@@ -96,19 +603,59 @@ class MedicalKnowledgeStore:
             try:
                 from sentence_transformers import SentenceTransformer
                 model_name = getattr(config, 'LOCAL_EMBEDDING_MODEL', 'BAAI/bge-small-zh-v1.5')
-                logger.info(f"Using local embeddings model: {model_name}")
-                model = SentenceTransformer(model_name)
+                # 设备在构造时指定；仅 CUDA 下使用 fp16，CPU 上半精度反而更慢
+                try:
+                    import torch
+                    if torch.cuda.is_available():
+                        device = "cuda"
+                    elif getattr(torch.backends, 'mps', None) is not None and torch.backends.mps.is_available():
+                        device = "mps"
+                    else:
+                        device = "cpu"
+                except Exception:
+                    device = "cpu"
+                logger.info(f"Using local embeddings model: {model_name} (device={device})")
+                model = SentenceTransformer(model_name, device=device)
+                if device == "cuda":
+                    model = model.half()
 
                 class _STEmb(Embeddings):  # 适配 LangChain Embeddings 接口
-                    def __init__(self, m, name):
+                    def __init__(self, m, name, batch_size):
                         self.m = m
                         self.name = name
+                        self.batch_size = batch_size
+                    def _encode(self, texts):
+                        return self.m.encode(texts, batch_size=self.batch_size, show_progress_bar=False,
+                                             normalize_embeddings=True, convert_to_numpy=True)
                     def embed_documents(self, texts):
-                        return [list(v) for v in self.m.encode(texts, batch_size=32, show_progress_bar=False, normalize_embeddings=True)]
+                        return self.embed_documents_array(texts).tolist() if texts else []
+                    def embed_documents_array(self, texts) -> np.ndarray:
+                        """返回 (N, d) float32 数组，入库时直接写入 faiss，不经 Python 列表中转"""
+                        try:
+                            lengths = np.asarray(self.m.tokenizer(texts, add_special_tokens=False, return_length=True)['length'])
+                        except Exception:
+                            # 分词器不支持 return_length 时退回单次 encode
+                            return np.asarray(self._encode(texts), dtype=np.float32)
+                        # 按 token 长度分桶，每桶以各自的 max_seq_length 编码，短文本不再被填充到长文本长度
+                        bucket_ids = np.searchsorted(_LENGTH_BUCKETS, lengths)
+                        base_max = self.m.max_seq_length
+                        order, parts = [], []
+                        try:
+                            for b in np.unique(bucket_ids).tolist():
+                                idx = np.flatnonzero(bucket_ids == b)
+                                self.m.max_seq_length = min(base_max, _LENGTH_BUCKETS[b] + 2) if b < len(_LENGTH_BUCKETS) else base_max
+                                parts.append(self._encode([texts[i] for i in idx.tolist()]))
+                                order.append(idx)
+                        finally:
+                            self.m.max_seq_length = base_max
+                        vecs = np.vstack(parts)
+                        out = np.empty(vecs.shape, dtype=np.float32)
+                        out[np.concatenate(order)] = vecs
+                        return out
                     def embed_query(self, text):
-                        return list(self.m.encode(text, show_progress_bar=False, normalize_embeddings=True))
+                        return self.m.encode(text, show_progress_bar=False, normalize_embeddings=True, convert_to_numpy=True).tolist()
                 self.embedding_model_name = f"local:{model_name}"
-                return _STEmb(model, self.embedding_model_name)
+                return _STEmb(model, self.embedding_model_name, self._cfg.batch_size)
             except Exception as e_local:
                 if want_local:
                     raise RuntimeError(f"本地嵌入模型加载失败: {e_local}")
@@ -119,95 +666,261 @@ class MedicalKnowledgeStore:
         self.embedding_model_name = f"openai:{emb_model}(fallback)"
         return OpenAIEmbeddings(model=emb_model)
 
+    def _meta_json_file(self) -> str:
+        return os.path.join(self.persist_path, 'meta.json')
+
     def _load_meta_if_exists(self):
         idx_file, meta_file = self._faiss_files()
-        if os.path.exists(meta_file):
+        json_file = self._meta_json_file()
+        if os.path.exists(json_file):
+            # orjson 写出的元数据：JSON 键为字符串，载入后还原为 int64 id
+            try:
+                with open(json_file, 'rb') as f:
+                    raw = f.read()
+                payload = orjson.loads(raw) if orjson is not None else json.loads(raw)
+                self.meta_records = {int(k): v for k, v in payload['meta_records'].items()}
+                self.docstore = {int(k): v for k, v in payload['docstore'].items()}
+                self._next_id = payload['next_id']
+                self._chunk_hashes = set(payload.get('chunk_hashes') or ()) or {_chunk_hash(t) for t in self.docstore.values()}
+                self._index_type = payload.get('index_type', 'auto')
+                self._quant = payload.get('quant', 'fp32')
+                logger.info(f"Loaded existing FAISS meta from {json_file}, records={len(self.meta_records)}")
+            except Exception as e:
+                logger.warning(f"Failed loading existing FAISS meta: {e}")
+        elif os.path.exists(meta_file):
             try:
                 with open(meta_file, 'rb') as f:
-                    self.meta_records = pickle.load(f)
+                    payload = pickle.load(f)
+                if isinstance(payload, dict) and payload.get('__format__') == _META_FORMAT:
+                    self.meta_records = payload['meta_records']
+                    self.docstore = payload['docstore']
+                    self._next_id = payload['next_id']
+                    self._chunk_hashes = payload.get('chunk_hashes') or {_chunk_hash(t) for t in self.docstore.values()}
+                    self._index_type = payload.get('index_type', 'auto')
+                    self._quant = payload.get('quant', 'fp32')
+                else:
+                    # 旧版 LangChain 存储：元数据先用于统计，索引在首次加载时迁移
+                    self.meta_records = payload
+                    self._legacy_store = os.path.exists(os.path.join(self.persist_path, 'index.pkl'))
                 logger.info(f"Loaded existing FAISS meta from {self.persist_path}, records={len(self.meta_records)}")
             except Exception as e:
                 logger.warning(f"Failed loading existing FAISS meta: {e}")
 
+    # ---------------- 多进程共享（FAISS_SHARED_MMAP） ----------------
+    def _index_version(self) -> int:
+        """索引版本号：写入方每次持久化后更新的 index.version 文件 mtime"""
+        try:
+            return os.stat(os.path.join(self.persist_path, 'index.version')).st_mtime_ns
+        except OSError:
+            return 0
+
+    def _maybe_reload_shared(self):
+        """共享模式下（只读 worker），写入进程更新索引后重新映射索引与元数据"""
+        if not self._cfg.shared_mmap or self.index is None:
+            return
+        if self._index_version() != self._loaded_version:
+            logger.info("检测到索引版本变化，重新加载共享索引")
+            self.index = None
+            self._index_mmap = False
+            self._processed_abs = None
+            if self._cache is not None:
+                self._cache.clear()
+            self._load_meta_if_exists()
+            self.ensure_index_loaded()
+
     def _persist(self):
         if self.index is None:
             return
         idx_file, meta_file = self._faiss_files()
         try:
-            self.index.save_local(self.persist_path)
-            with open(meta_file, 'wb') as f:
-                pickle.dump(self.meta_records, f)
+            # 先写临时文件再原子替换：已映射旧文件的读进程不受影响
+            faiss.write_index(self.index, idx_file + '.tmp')
+            os.replace(idx_file + '.tmp', idx_file)
+            payload = {
+                '__format__': _META_FORMAT,
+                'meta_records': self.meta_records,
+                'docstore': self.docstore,
+                'next_id': self._next_id,
+                'chunk_hashes': self._chunk_hashes,
+                'index_type': self._index_type,
+                'quant': self._quant,
+            }
+            if orjson is not None:
+                # orjson：dict-of-str 的解析远快于 pickle；int 键需 OPT_NON_STR_KEYS
+                json_file = self._meta_json_file()
+                payload['chunk_hashes'] = list(self._chunk_hashes)
+                with open(json_file + '.tmp', 'wb') as f:
+                    f.write(orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS))
+                os.replace(json_file + '.tmp', json_file)
+                if os.path.exists(meta_file):
+                    os.remove(meta_file)
+            else:
+                with open(meta_file + '.tmp', 'wb') as f:
+                    # protocol 5：大对象流式写出，且无 4GiB 限制
+                    pickle.dump(payload, f, protocol=5)
+                os.replace(meta_file + '.tmp', meta_file)
+                # 清理此前 orjson 写出的 meta.json，避免载入时优先读到旧数据
+                if os.path.exists(self._meta_json_file()):
+                    os.remove(self._meta_json_file())
+            # 最后更新版本文件，通知共享模式下的读进程重新加载
+            with open(os.path.join(self.persist_path, 'index.version'), 'w') as f:
+                f.write(str(time.time_ns()))
+            self._loaded_version = self._index_version()
         except Exception as e:
             logger.error(f"Persist FAISS failed: {e}")
     
-    def add_documents_from_directory(self, directory_path: str, file_pattern: str = "*.txt") -> int:
+    def add_documents_from_directory(self, directory_path: str, file_pattern: str = "*.txt",
+                                     batch_size: Optional[int] = None) -> int:
         if not os.path.exists(directory_path):
             return 0
         try:
-            loader = DirectoryLoader(directory_path, glob=file_pattern, loader_cls=TextLoader, loader_kwargs={'encoding':'utf-8'})
-            docs = loader.load()
+            paths = sorted(p for p in glob.glob(os.path.join(directory_path, file_pattern), recursive=True) if os.path.isfile(p))
+            if not paths:
+                return 0
+            # 磁盘读取为 I/O 密集，线程池并发读取，切分仍在主线程一次完成
+            with ThreadPoolExecutor(max_workers=min(16, len(paths))) as ex:
+                docs = [d for d in ex.map(_read_text_document, paths) if d is not None]
             if not docs:
                 return 0
-            split_docs = self.text_splitter.split_documents(docs)
-            return self._add_docs(split_docs)
+            split_docs = _split_documents(self.text_splitter, docs, config.CHUNK_SIZE, config.CHUNK_OVERLAP)
+            return self._add_docs(split_docs, batch_size=batch_size)
         except Exception as e:
             logger.error(f"add_documents_from_directory error: {e}")
             return 0
     
     def add_document_text(self, text: str, metadata: Optional[Dict[str, Any]] = None) -> bool:
         try:
-            from langchain.schema import Document
-            chunks = self.text_splitter.split_text(text)
-            docs = [Document(page_content=c, metadata=metadata or {}) for c in chunks]
+            docs = _split_documents(self.text_splitter, [Document(page_content=text, metadata=metadata or {})],
+                                    config.CHUNK_SIZE, config.CHUNK_OVERLAP)
             added = self._add_docs(docs)
             return added > 0
         except Exception as e:
             logger.error(f"add_document_text error: {e}")
             return False
 
-    def _add_docs(self, docs) -> int:
+    def set_query_cache(self, enabled: bool):
+        """开关查询缓存（查询向量 lru 缓存与 QVCache），关闭后每次检索都重新嵌入，便于基准对比"""
+        if enabled:
+            self._embed_query_cached = functools.lru_cache(maxsize=self._cfg.query_embed_cache_size)(self._embed_query)
+        else:
+            self._embed_query_cached = self._embed_query
+            self._cache = None
+
+    def set_embedding_cache(self, cache_dir: Optional[str]):
+        """设置嵌入缓存目录；传入 None 关闭缓存"""
+        self._cfg.emb_cache_dir = cache_dir
+
+    def _embedding_cache_root(self) -> Optional[str]:
+        if not self._cfg.emb_cache_dir:
+            return None
+        # 不同嵌入模型的向量不可混用，按模型名分子目录
+        model_dir = re.sub(r'[^\w.-]+', '_', self.embedding_model_name)
+        return os.path.join(self._cfg.emb_cache_dir, model_dir)
+
+    def _embed_with_cache(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """按 chunk 文本 SHA-256 查磁盘缓存 {sha256}.npy，仅对未命中的文本调用嵌入"""
+        root = self._embedding_cache_root()
+        if root is None:
+            return self._embed_batched(texts, batch_size)
+        keys = [hashlib.sha256(t.encode('utf-8')).hexdigest() for t in texts]
+        paths = [os.path.join(root, k[:2], k + '.npy') for k in keys]
+        cached: Dict[int, np.ndarray] = {}
+        for i, path in enumerate(paths):
+            try:
+                cached[i] = np.load(path)
+            except (OSError, ValueError):
+                pass
+        missing = [i for i in range(len(texts)) if i not in cached]
+        logger.info(f"嵌入缓存: 命中 {len(cached)} / {len(texts)}")
+        new_vecs = self._embed_batched([texts[i] for i in missing], batch_size) if missing else None
+        dim = new_vecs.shape[1] if new_vecs is not None else next(iter(cached.values())).shape[0]
+        all_vecs = np.empty((len(texts), dim), dtype='float32')
+        for i, vec in cached.items():
+            all_vecs[i] = vec
+        if new_vecs is not None:
+            all_vecs[missing] = new_vecs
+            for j, i in enumerate(missing):
+                path = paths[i]
+                try:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    tmp = f"{path}.{os.getpid()}.tmp"
+                    with open(tmp, 'wb') as f:
+                        np.save(f, new_vecs[j])
+                    os.replace(tmp, path)
+                except OSError as e:
+                    logger.warning(f"写入嵌入缓存失败: {e}")
+                    break
+        return all_vecs
+
+    def _embed_batched(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """分批嵌入，减少单次请求体积，提高可观测性"""
+        batch_size = max(1, batch_size or self._cfg.batch_size)
+        if self.embedding_model_name.startswith('local:'):
+            # 本地模型整批交给 encode，不在 Python 层再切批
+            batch_size = len(texts)
+        total_batches = (len(texts) + batch_size - 1) // batch_size
+        # OpenAI 路径：各批请求并发发出，避免逐批串行等待网络往返
+        all_vecs = self._embed_openai_concurrent(texts, batch_size) if self.embedding_model_name.startswith('openai:') else None
+        if all_vecs is None:
+            # 逐批嵌入写入预分配数组，全部完成后一次性写入索引
+            batch_counter = 0
+            for i in range(0, len(texts), batch_size):
+                b_texts = texts[i:i+batch_size]
+                b_start = time.time()
+                vecs = self._embed_texts(b_texts)
+                if all_vecs is None:
+                    all_vecs = np.empty((len(texts), vecs.shape[1]), dtype='float32')
+                all_vecs[i:i+len(b_texts)] = vecs
+                b_end = time.time()
+                batch_counter += 1
+                if self._cfg.show_progress:
+                    pct = (batch_counter/total_batches)*100
+                    logger.info(f"[Embed进度] batch {batch_counter}/{total_batches} ({pct:.1f}%) size={len(b_texts)} 用时={(b_end-b_start):.2f}s")
+        return all_vecs
+
+    def _add_docs(self, docs, batch_size: Optional[int] = None) -> int:
+        """嵌入并写入索引；batch_size 为每次嵌入请求的 chunk 数，缺省取 EMBEDDING_BATCH_SIZE"""
         start_total = time.time()
         docs = [d for d in docs if (d.page_content or '').strip()]
         if not docs:
             return 0
         try:
-            # 确保已就绪 embeddings；index 如为空将于首批创建
+            # 确保已就绪 embeddings；index 如为空将于首批创建（旧版存储先迁移）
             self.ensure_embeddings()
+            self.ensure_index_loaded()
+            self._ensure_index_writable()
             t_prep = time.time()
-            texts = [d.page_content for d in docs]
+            texts = []
             metas = []
+            batch_seen = set()
             for d in docs:
+                # 内容去重：已入库或本批内重复的 chunk 直接跳过，不再嵌入
+                h = _chunk_hash(d.page_content)
+                if h in self._chunk_hashes or h in batch_seen:
+                    continue
+                batch_seen.add(h)
                 md = dict(d.metadata)
                 md.setdefault('source', md.get('source','unknown'))
                 md['doc_id'] = md.get('doc_id') or str(uuid.uuid4())
+                md['chunk_hash'] = h
+                texts.append(d.page_content)
                 metas.append(md)
-                self.meta_records[md['doc_id']] = md
+            if len(texts) < len(docs):
+                logger.info(f"内容去重: 跳过重复 chunk {len(docs) - len(texts)} 个")
+            if not texts:
+                return 0
             t_embed_start = time.time()
-            # 分批嵌入，减少单次请求体积，提高可观测性；首批若 index 为空 用 from_texts 创建
-            batch_size = getattr(config, 'EMBEDDING_BATCH_SIZE', 64)
-            total_batches = (len(texts) + batch_size - 1) // batch_size
-            start_idx = 0
-            if self.index is None:
-                first_batch_texts = texts[:batch_size]
-                first_batch_metas = metas[:batch_size]
-                b_start = time.time()
-                self.index = FAISS.from_texts(first_batch_texts, self.embeddings, metadatas=first_batch_metas)
-                b_end = time.time()
-                if getattr(config, 'SHOW_EMBED_PROGRESS', True):
-                    logger.info(f"[Embed进度] batch 1/{total_batches} (首批初始化) size={len(first_batch_texts)} 用时={(b_end-b_start):.2f}s")
-                start_idx = batch_size
-            batch_counter = 1 if start_idx else 0
-            for i in range(start_idx, len(texts), batch_size):
-                b_texts = texts[i:i+batch_size]
-                b_metas = metas[i:i+batch_size]
-                b_start = time.time()
-                if b_texts:
-                    self.index.add_texts(b_texts, metadatas=b_metas)  # type: ignore
-                b_end = time.time()
-                batch_counter += 1
-                if getattr(config, 'SHOW_EMBED_PROGRESS', True) and b_texts:
-                    pct = (batch_counter/total_batches)*100
-                    logger.info(f"[Embed进度] batch {batch_counter}/{total_batches} ({pct:.1f}%) size={len(b_texts)} 用时={(b_end-b_start):.2f}s")
+            all_vecs = self._embed_with_cache(texts, batch_size)
+            ids = np.arange(self._next_id, self._next_id + len(texts), dtype='int64')
+            self._index_vectors(all_vecs, ids)
+            for vid, text, md in zip(ids.tolist(), texts, metas):
+                self.meta_records[vid] = md
+                self.docstore[vid] = text
+                self._chunk_hashes.add(md['chunk_hash'])
+            self._next_id += len(texts)
+            self._processed_abs = None
+            if self._cache is not None:
+                self._cache.clear()
             t_after = time.time()
             self._persist()
             logger.info(
@@ -223,16 +936,27 @@ class MedicalKnowledgeStore:
             q = f"{specialty} {query}" if specialty else query
             # 确保索引可用（若磁盘存在则延迟加载）
             self.ensure_index_loaded()
-            if self.index is None:
+            self._maybe_reload_shared()
+            if self.index is None or self.index.ntotal == 0:
                 return []
-            docs_scores = self.index.similarity_search_with_score(q, k=k)  # type: ignore
+            q_vec = self._embed_query_cached(q)
+            hit = self._cache.lookup(q_vec, k) if self._cache is not None else None
+            if hit is not None:
+                D, I = hit
+            else:
+                D, I = self.index.search(q_vec, k)
+                if self._cache is not None:
+                    self._cache.put(q_vec, D, I)
+            # 一次性过滤无效位（-1）并转为 Python 标量，relevance_score 恒为 float
+            valid = I[0] >= 0
             out = []
-            for doc, score in docs_scores:
+            for vid, score in zip(I[0][valid].tolist(), D[0][valid].tolist()):
+                md = self.meta_records.get(vid, {})
                 out.append({
-                    'content': doc.page_content,
-                    'metadata': doc.metadata,
+                    'content': self.docstore.get(vid, ''),
+                    'metadata': md,
                     'relevance_score': score,
-                    'source': doc.metadata.get('source','unknown')
+                    'source': md.get('source','unknown')
                 })
             return out
         except Exception as e:
@@ -251,15 +975,8 @@ class MedicalKnowledgeStore:
         # 组装带来源和分数
         formatted = []
         for i, r in enumerate(collected, 1):
-            src = r.get('source','未知来源')
-            score = r.get('relevance_score')
-            score_str = f"{score:.4f}" if isinstance(score,(int,float)) else "?"
-            formatted.append(f"[片段#{i} | 来源: {src} | 相关度: {score_str}]\n{r.get('content','')}")
-        context = "\n\n".join(formatted)
-        if len(context) > max_context_length:
-            context = context[:max_context_length] + "..."
-        
-        return context
+            formatted.append(f"[片段#{i} | 来源: {r['source']} | 相关度: {r['relevance_score']:.4f}]\n{r['content']}")
+        return _join_truncated(formatted, max_context_length)
     
     def _build_agent_queries(self, case_info: Dict[str, Any], agent_type: str) -> List[str]:
         """为不同类型的智能体构建查询"""
@@ -285,7 +1002,8 @@ class MedicalKnowledgeStore:
 
         说明：
         - 轻量实现：直接拼装一个指令而非再用单独 RAG_QUERY_PROMPT（保留字段以便未来切换）。
-        - 可扩展点：改为调用一个专用 PROMPT（多查询模板），或返回 JSON 后解析。
+        - OpenAI 提供商：一次请求 n 个独立补全，每个补全只输出一条短查询，无需解析多行文本。
+        - 其他提供商（如 DeepSeek 不支持 n>1）：仍让模型按行输出 n 条查询。
         """
         try:
             from openai import OpenAI
@@ -296,6 +1014,27 @@ class MedicalKnowledgeStore:
                 if v and v not in ("N/A","未提供"):
                     summary_parts.append(f"{k}:{v}")
             summary = " | ".join(summary_parts) or "空"
+            if config.LLM_PROVIDER == 'openai' and n > 1:
+                instruction = (
+                    "请基于间质性肺病病例信息，为" + agent_type + " 专科生成一条检索子查询，"
+                    "任选一个方面聚焦（症状模式/影像特征/实验室指标/风险因素/并发症/治疗反应）。"
+                    "\n直接输出查询本身，不要编号，不要解释。\n病例概要: " + summary
+                )
+                resp = client.chat.completions.create(
+                    model=config.OPENAI_MODEL,
+                    messages=[{"role":"system","content":"你是医学信息检索助手"},{"role":"user","content":instruction}],
+                    n=n,
+                    temperature=0.9,  # 各补全相互独立，需要一定随机性以覆盖不同方面
+                    max_tokens=60
+                )
+                # 独立补全可能撞车：保序去重
+                queries = list(dict.fromkeys(
+                    c.message.content.strip() for c in resp.choices if c.message and c.message.content and c.message.content.strip()
+                ))
+                if queries:
+                    return queries
+                base_q = f"{case_info.get('symptoms','')} {case_info.get('medical_history','')}".strip()
+                return [base_q] if base_q else []
             instruction = (
                 "请基于间质性肺病病例信息，为" + agent_type + " 专科生成"+str(n)+"条检索子查询。"
                 "要求：\n- 每条尽量聚焦一个方面（症状模式/影像特征/实验室指标/风险因素/并发症/治疗反应）"
@@ -327,12 +1066,12 @@ class MedicalKnowledgeStore:
         步骤：
         1. 生成子查询列表
         2. 对每个子查询 top-k 相似度检索
-        3. 去重（基于内容 hash）与合并
+        3. 去重（基于入库时的 chunk_hash 摘要）与合并
         4. 按原加入顺序截断总长度
         """
         queries = self.generate_multi_queries(case_info, agent_type, n=n_queries)
-        seen = set()
-        merged_chunks: List[str] = []
+        seen: set = set()
+        merged_len = 0
         detailed_chunks: List[str] = []
         for q in queries:
             results = self.search_relevant_knowledge(q, agent_type, k=per_query_k)
@@ -340,24 +1079,19 @@ class MedicalKnowledgeStore:
                 content = r.get("content","")
                 if not content:
                     continue
-                h = hash(content)
+                # 优先使用入库时计算的稳定摘要，缺失时（旧数据）现场计算
+                h = r.get('metadata', {}).get('chunk_hash') or _chunk_hash(content)
                 if h in seen:
                     continue
                 seen.add(h)
-                src = r.get('source','未知来源')
-                score = r.get('relevance_score')
-                score_str = f"{score:.4f}" if isinstance(score,(int,float)) else "?"
-                chunk_text = f"[来源: {src} | 相关度: {score_str} | 子查询: {q}]\n{content}"
-                merged_chunks.append(content)
+                chunk_text = f"[来源: {r['source']} | 相关度: {r['relevance_score']:.4f} | 子查询: {q}]\n{content}"
+                merged_len += len(content)
                 detailed_chunks.append(chunk_text)
-                if sum(len(c) for c in merged_chunks) > max_context_length:
+                if merged_len > max_context_length:
                     break
-            if sum(len(c) for c in merged_chunks) > max_context_length:
+            if merged_len > max_context_length:
                 break
-        context = "\n\n".join(detailed_chunks)
-        if len(context) > max_context_length:
-            context = context[:max_context_length] + "..."
-        return context or ""
+        return _join_truncated(detailed_chunks, max_context_length)
     
     def get_collection_stats(self) -> Dict[str, Any]:
         try:
@@ -367,6 +1101,7 @@ class MedicalKnowledgeStore:
                 'backend': 'FAISS',
                 'path': self.persist_path,
                 'embedding_model': getattr(self, 'embedding_model_name', 'lazy'),
+                'index_type': type(self.index).__name__ if self.index is not None else 'lazy',
                 'status': 'healthy'
             }
         except Exception as e:
@@ -379,30 +1114,46 @@ class MedicalKnowledgeStore:
                 shutil.rmtree(self.persist_path)
             os.makedirs(self.persist_path, exist_ok=True)
             self.index = None
+            self._index_mmap = False
             self.meta_records = {}
+            self.docstore = {}
+            self._chunk_hashes = set()
+            self._processed_abs = None
+            if self._cache is not None:
+                self._cache.clear()
+            self._next_id = 0
+            self._legacy_store = False
+            self._index_type = self._cfg.index_type
+            self._quant = self._cfg.quant
             logger.info("FAISS collection cleared")
             return True
         except Exception as e:
             logger.error(f"clear_collection error: {e}")
             return False
 
-    def get_processed_files(self) -> set:
-        """获取已处理文件列表（基于meta_records中的source）"""
-        processed = set()
-        for meta in self.meta_records.values():
-            source = meta.get('source', '')
-            if source and not source.startswith('chunk_'):
-                # 提取文件路径（去掉可能的chunk后缀）
-                if '|chunk_' in source:
-                    source = source.split('|chunk_')[0]
-                processed.add(source)
-        return processed
+    def get_processed_files(self) -> frozenset:
+        """获取已处理文件列表（基于meta_records中的source，统一为 normcase 后的绝对路径）
+
+        结果缓存至下次入库或清空。
+        """
+        if self._processed_abs is None:
+            processed = set()
+            for meta in self.meta_records.values():
+                source = meta.get('source', '')
+                if source and not source.startswith('chunk_'):
+                    # 提取文件路径（去掉可能的chunk后缀）
+                    if '|chunk_' in source:
+                        source = source.split('|chunk_')[0]
+                    processed.add(os.path.normcase(os.path.abspath(source)))
+            self._processed_abs = frozenset(processed)
+        return self._processed_abs
 
     def add_new_files_only(self,
                           directory_path: str = "knowledge/documents",
                           patterns: Optional[List[str]] = None,
                           include_pdf: bool = True,
-                          include_csv: bool = True) -> Dict[str, Any]:
+                          include_csv: bool = True,
+                          batch_size: Optional[int] = None) -> Dict[str, Any]:
         """增量更新：仅处理新文件，并输出耗时统计"""
         patterns = patterns or ["*.txt", "*.md"]
         summary = {"chunks_added":0, "files_processed":0, "txt_files":0, "pdf_files":0, "csv_files":0, "errors": [], "skipped_files": 0}
@@ -412,81 +1163,18 @@ class MedicalKnowledgeStore:
             return summary
         processed_files = self.get_processed_files()
         logger.info(f"Already processed files: {len(processed_files)}")
-        # 预统计总文件数用于百分比
-        total_files = 0
-        for pattern in patterns:
-            total_files += len(glob.glob(os.path.join(directory_path, pattern)))
-        if include_pdf:
-            total_files += len(glob.glob(os.path.join(directory_path, "*.pdf")))
-        if include_csv:
-            total_files += len(glob.glob(os.path.join(directory_path, "*.csv")))
-        processed_file_counter = 0
-        # --- TXT / MD ---
-        for pattern in patterns:
-            file_paths = glob.glob(os.path.join(directory_path, pattern))
-            for file_path in file_paths:
-                try:
-                    abs_path = os.path.abspath(file_path)
-                    if abs_path in processed_files:
-                        summary["skipped_files"] += 1
-                        processed_file_counter += 1
-                        continue
-                    docs = TextLoader(file_path, encoding='utf-8').load()
-                    for d in docs:
-                        d.metadata['source'] = abs_path
-                    added = self._add_documents_batched(docs)
-                    summary['chunks_added'] += added
-                    summary['txt_files'] += 1
-                    summary['files_processed'] += 1
-                    processed_file_counter += 1
-                    if getattr(config, 'SHOW_EMBED_PROGRESS', True) and total_files:
-                        logger.info(f"[文件进度] {processed_file_counter}/{total_files} ({processed_file_counter/total_files*100:.1f}%) 处理: {os.path.basename(file_path)}")
-                except Exception as e:
-                    summary['errors'].append(f"txt({file_path}): {e}")
-        # --- PDF ---
-        if include_pdf:
-            pdf_paths = glob.glob(os.path.join(directory_path, "*.pdf"))
-            for pdf_path in pdf_paths:
-                try:
-                    abs_path = os.path.abspath(pdf_path)
-                    if abs_path in processed_files:
-                        summary['skipped_files'] += 1
-                        processed_file_counter += 1
-                        continue
-                    pages = PyPDFLoader(pdf_path).load()
-                    for p in pages:
-                        p.metadata['source'] = abs_path
-                    added = self._add_documents_batched(pages)
-                    summary['chunks_added'] += added
-                    summary['pdf_files'] += 1
-                    summary['files_processed'] += 1
-                    processed_file_counter += 1
-                    if getattr(config, 'SHOW_EMBED_PROGRESS', True) and total_files:
-                        logger.info(f"[文件进度] {processed_file_counter}/{total_files} ({processed_file_counter/total_files*100:.1f}%) 处理: {os.path.basename(pdf_path)}")
-                except Exception as e:
-                    summary['errors'].append(f"pdf({pdf_path}): {e}")
-        # --- CSV ---
-        if include_csv:
-            csv_paths = glob.glob(os.path.join(directory_path, "*.csv"))
-            for csv_path in csv_paths:
-                try:
-                    abs_path = os.path.abspath(csv_path)
-                    if abs_path in processed_files:
-                        summary['skipped_files'] += 1
-                        processed_file_counter += 1
-                        continue
-                    df = pd.read_csv(csv_path)
-                    flattened = df.apply(lambda row: ' | '.join(row.astype(str)), axis=1).tolist()
-                    docs = [Document(page_content=t, metadata={'source': abs_path}) for t in flattened]
-                    added = self._add_documents_batched(docs)
-                    summary['chunks_added'] += added
-                    summary['csv_files'] += 1
-                    summary['files_processed'] += 1
-                    processed_file_counter += 1
-                    if getattr(config, 'SHOW_EMBED_PROGRESS', True) and total_files:
-                        logger.info(f"[文件进度] {processed_file_counter}/{total_files} ({processed_file_counter/total_files*100:.1f}%) 处理: {os.path.basename(csv_path)}")
-                except Exception as e:
-                    summary['errors'].append(f"csv({csv_path}): {e}")
+        # 目录先转绝对路径，scandir 产出的路径即为绝对路径，无需逐文件 abspath
+        jobs = self._collect_ingest_jobs(os.path.abspath(directory_path), patterns, include_pdf, include_csv, csv_kind='csv_rows')
+        normcase = os.path.normcase
+        pending = []
+        for path, kind in jobs:
+            if normcase(path) in processed_files:
+                summary['skipped_files'] += 1
+            else:
+                pending.append((path, kind))
+        docs = self._load_files_parallel(pending, summary, progress_base=summary['skipped_files'], progress_total=len(jobs))
+        if docs:
+            summary['chunks_added'] = self._add_documents_batched(docs, batch_size=batch_size)
         self._persist()
         elapsed = time.time() - start_all
         avg = (elapsed / summary['chunks_added']) if summary['chunks_added'] else 0
@@ -494,9 +1182,79 @@ class MedicalKnowledgeStore:
         return summary
 
     # ---------------- New ingestion / rebuild helpers -----------------
-    def _add_documents_batched(self, docs, batch_size: int = 50, retries: int = 2):
-        # 对 FAISS 简化：直接一次性走 _add_docs（FAISS add_texts 已内部分批）
-        return self._add_docs(docs)
+    def _add_documents_batched(self, docs, batch_size: Optional[int] = None, retries: int = 2):
+        # 对 FAISS 简化：直接一次性走 _add_docs（_add_docs 内部按 batch_size 分批嵌入）
+        return self._add_docs(docs, batch_size=batch_size)
+
+    def _collect_ingest_jobs(self, directory_path: str, patterns: List[str], include_pdf: bool, include_csv: bool,
+                             csv_kind: str) -> List[tuple]:
+        """列出待处理文件 [(路径, 类型)]：单次 os.scandir 遍历目录后按后缀分桶"""
+        # "*.ext" 形式的通配符直接按后缀判断，其余通配符用 fnmatch
+        suffixes = tuple(p[1:] for p in patterns if p.startswith('*.') and not any(ch in p[1:] for ch in '*?['))
+        other_patterns = [p for p in patterns if not (p.startswith('*.') and p[1:] in suffixes)]
+        buckets: Dict[str, List[tuple]] = {'txt': [], 'pdf': [], 'csv': []}
+        with os.scandir(directory_path) as it:
+            for entry in it:
+                name = entry.name
+                # 与 glob 一致：忽略隐藏文件
+                if name.startswith('.') or not entry.is_file():
+                    continue
+                if name.endswith(suffixes) or any(fnmatch.fnmatch(name, p) for p in other_patterns):
+                    buckets['txt'].append((entry.path, 'txt'))
+                elif include_pdf and name.endswith('.pdf'):
+                    buckets['pdf'].append((entry.path, 'pdf'))
+                elif include_csv and name.endswith('.csv'):
+                    buckets['csv'].append((entry.path, csv_kind))
+        return buckets['txt'] + buckets['pdf'] + buckets['csv']
+
+    def _load_files_parallel(self, jobs: List[tuple], summary: Dict[str, Any], max_csv_rows: Optional[int] = None,
+                             progress_base: int = 0, progress_total: Optional[int] = None) -> List[Document]:
+        """多进程并行加载并切分文件，返回合并后的文档列表，同时更新 summary 统计"""
+        docs: List[Document] = []
+        if not jobs:
+            return docs
+        total = progress_total or len(jobs)
+        done = progress_base
+        show_progress = self._cfg.show_progress
+        for path, kind, file_docs, err in self._iter_loaded_files(jobs, max_csv_rows):
+            done += 1
+            file_type = kind.split('_')[0]
+            if err is not None:
+                logger.error(f"{file_type.upper()} ingest error {path}: {err}")
+                summary['errors'].append(f"{file_type}({path}): {err}")
+                continue
+            if not file_docs:
+                logger.warning(f"文件为空或无法提取文本: {path}")
+                continue
+            docs.extend(file_docs)
+            summary[f'{file_type}_files'] += 1
+            summary['files_processed'] += 1
+            if show_progress and total:
+                logger.info(f"[文件进度] {done}/{total} ({done/total*100:.1f}%) 处理: {os.path.basename(path)}")
+        return docs
+
+    def _iter_loaded_files(self, jobs: List[tuple], max_csv_rows: Optional[int]):
+        """逐个产出 (路径, 类型, 文档列表, 异常)；多文件时使用进程池，进程池不可用则回退串行"""
+        args = (config.CHUNK_SIZE, config.CHUNK_OVERLAP, max_csv_rows)
+        workers = min(len(jobs), os.cpu_count() or 1)
+        if workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = {pool.submit(_load_and_split, path, kind, *args): (path, kind) for path, kind in jobs}
+                    for fut in as_completed(futures):
+                        path, kind = futures[fut]
+                        try:
+                            yield path, kind, fut.result(), None
+                        except Exception as e:
+                            yield path, kind, None, e
+                return
+            except (OSError, NotImplementedError) as e_pool:
+                logger.warning(f"进程池不可用，改为串行加载: {e_pool}")
+        for path, kind in jobs:
+            try:
+                yield path, kind, _load_and_split(path, kind, *args), None
+            except Exception as e:
+                yield path, kind, None, e
 
     def rebuild_from_directory(self,
                                 directory_path: str = "knowledge/documents",
@@ -504,93 +1262,37 @@ class MedicalKnowledgeStore:
                                 include_pdf: bool = True,
                                 include_csv: bool = True,
                                 max_csv_rows: int = 5000,
-                                batch_size: int = 40) -> Dict[str, Any]:
+                                batch_size: Optional[int] = None,
+                                index_type: Optional[str] = None,
+                                quant: Optional[str] = None) -> Dict[str, Any]:
         """清空并重建索引，支持多格式 (txt, pdf, csv)。
 
+        batch_size 为每次嵌入请求的 chunk 数，缺省取 EMBEDDING_BATCH_SIZE；
+        index_type 为 auto / flat / hnsw / ivf / pq，缺省取 FAISS_INDEX_TYPE；
+        quant 为 fp32 / fp16 / pq8，缺省取 FAISS_QUANT。
+
         Returns summary 统计。
         """
         patterns = patterns or ["*.txt", "*.md"]
         summary = {"chunks_added":0, "files_processed":0, "txt_files":0, "pdf_files":0, "csv_files":0, "errors": []}
         try:
             rebuild_start = time.time()
+            if index_type is not None and index_type not in _INDEX_TYPES:
+                raise ValueError(f"Unknown index type: {index_type}")
+            if quant is not None and quant not in _QUANT_TYPES:
+                raise ValueError(f"Unknown quantization: {quant}")
             self.clear_collection()
+            if index_type is not None:
+                self._index_type = index_type
+            if quant is not None:
+                self._quant = quant
             if not os.path.isdir(directory_path):
                 logger.warning(f"Rebuild directory not found: {directory_path}")
                 return summary
-            # TXT/MD
-            for pat in patterns:
-                try:
-                    files = glob.glob(os.path.join(directory_path, pat))
-                    if not files:
-                        continue
-                    loader = DirectoryLoader(directory_path, glob=pat, loader_cls=TextLoader, loader_kwargs={'encoding':'utf-8'})
-                    docs = loader.load()
-                    if not docs:
-                        continue
-                    split_docs = self.text_splitter.split_documents(docs)
-                    # 填充 source
-                    for d in split_docs:
-                        d.metadata.setdefault('source', d.metadata.get('source', 'unknown'))
-                    if split_docs:
-                        added = self._add_documents_batched(split_docs, batch_size=batch_size)
-                        summary['chunks_added'] += added
-                    summary['txt_files'] += len(files)
-                    summary['files_processed'] += len(files)
-                except Exception as e:
-                    logger.error(f"TXT ingest error pattern {pat}: {e}")
-                    summary['errors'].append(f"txt({pat}): {e}")
-            # PDF
-            if include_pdf:
-                pdf_paths = glob.glob(os.path.join(directory_path, "*.pdf"))
-                for pdf in pdf_paths:
-                    try:
-                        loader = PyPDFLoader(pdf)
-                        pages = loader.load()
-                        # 过滤空内容页
-                        pages = [p for p in pages if (p.page_content or '').strip()]
-                        for p in pages:
-                            p.metadata['source'] = pdf
-                        if not pages:
-                            logger.warning(f"PDF 空或无法提取文本: {pdf}")
-                            continue
-                        split_pages = self.text_splitter.split_documents(pages)
-                        split_pages = [sp for sp in split_pages if (sp.page_content or '').strip()]
-                        if split_pages:
-                            added = self._add_documents_batched(split_pages, batch_size=batch_size)
-                            summary['chunks_added'] += added
-                        summary['pdf_files'] += 1
-                        summary['files_processed'] += 1
-                    except Exception as e:
-                        logger.error(f"PDF ingest error {pdf}: {e}")
-                        summary['errors'].append(f"pdf({pdf}): {e}")
-            # CSV
-            if include_csv:
-                csv_paths = glob.glob(os.path.join(directory_path, "*.csv"))
-                for csv_file in csv_paths:
-                    try:
-                        df = pd.read_csv(csv_file, nrows=max_csv_rows)
-                        # 简单：每行合并为一段；可改进为列选择/字段截断
-                        rows_text = []
-                        for _, row in df.iterrows():
-                            line = ' | '.join(f"{c}:{row[c]}" for c in df.columns if str(row[c]).strip() != '')
-                            if line:
-                                rows_text.append(line)
-                        full_text = '\n'.join(rows_text)
-                        if not full_text.strip():
-                            continue
-                        from langchain.schema import Document
-                        docs = [Document(page_content=full_text, metadata={'source': csv_file, 'type':'csv'})]
-                        split_docs = self.text_splitter.split_documents(docs)
-                        for d in split_docs:
-                            d.metadata.setdefault('source', csv_file)
-                        if split_docs:
-                            added = self._add_documents_batched(split_docs, batch_size=batch_size)
-                            summary['chunks_added'] += added
-                        summary['csv_files'] += 1
-                        summary['files_processed'] += 1
-                    except Exception as e:
-                        logger.error(f"CSV ingest error {csv_file}: {e}")
-                        summary['errors'].append(f"csv({csv_file}): {e}")
+            jobs = self._collect_ingest_jobs(directory_path, patterns, include_pdf, include_csv, csv_kind='csv_table')
+            docs = self._load_files_parallel(jobs, summary, max_csv_rows=max_csv_rows)
+            if docs:
+                summary['chunks_added'] = self._add_documents_batched(docs, batch_size=batch_size)
             logger.info(f"Rebuild finished: {summary} | 总耗时={time.time()-rebuild_start:.2f}s")
             return summary
         except Exception as e:
@@ -601,8 +1303,9 @@ class MedicalKnowledgeStore:
 # 单例与惰性 getter，避免导入即初始化重资源
 _singleton: Optional[MedicalKnowledgeStore] = None
 
-def get_knowledge_store() -> MedicalKnowledgeStore:
+def get_knowledge_store(load_meta: bool = True) -> MedicalKnowledgeStore:
+    """返回进程内单例；load_meta 仅在首次创建时生效（clear / rebuild 无需读取旧元数据）"""
     global _singleton
     if _singleton is None:
-        _singleton = MedicalKnowledgeStore()
+        _singleton = MedicalKnowledgeStore(load_meta=load_meta)
     return _singleton
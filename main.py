@@ -8,21 +8,29 @@
 from __future__ import annotations
 import asyncio
 import argparse
+import functools
 import json
 import os
 import sys
+import threading
 from typing import Any, Dict, List, Optional
 import logging
+try:  # 可选依赖：orjson 解析病例 JSON 更快，缺失时回退标准库 json
+    import orjson
+except ImportError:
+    orjson = None
 
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# 确保可导入本地包；直接运行脚本时该目录已在 sys.path[0]，不再重复追加
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
 
-from mdt_system.orchestrator import MDTOrchestrator
+# 编排器 / 向量库（faiss、numpy、嵌入模型等重依赖）在用到时才导入，--help 与配置错误可即时退出
 from utils.config import config
 from utils.helpers import setup_logging
-from knowledge.vector_store import get_knowledge_store
-knowledge_store = get_knowledge_store()
 
 ACTIVE_AGENT_KEYS = ["pulmonary", "imaging", "pathology", "rheumatology", "data_analysis"]  # 协调员自动加入
+ACTIVE_AGENT_SET = frozenset(ACTIVE_AGENT_KEYS)
 AGENT_LABELS = {
     "pulmonary": "呼吸科",
     "imaging": "影像科",
@@ -34,40 +42,69 @@ AGENT_LABELS = {
 
 def load_json(path: str) -> Optional[Dict[str, Any]]:
     try:
+        if orjson is not None:
+            with open(path, 'rb') as f:
+                return orjson.loads(f.read())
         with open(path, 'r', encoding='utf-8') as f:
             return json.load(f)
     except Exception as e:
         print(f"⚠️ 无法加载 {path}: {e}")
         return None
 
-def init_knowledge():
+async def ainput(prompt: str = "") -> str:
+    """异步 input()：在守护线程中读取输入，等待期间事件循环可继续预热（Ctrl+C 不会卡在读线程上）"""
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+
+    def _read():
+        try:
+            val = input(prompt)
+        except BaseException as e:  # EOFError / KeyboardInterrupt 交回事件循环
+            loop.call_soon_threadsafe(lambda: fut.done() or fut.set_exception(e))
+        else:
+            loop.call_soon_threadsafe(lambda: fut.done() or fut.set_result(val))
+
+    threading.Thread(target=_read, daemon=True).start()
+    return await fut
+
+def init_knowledge(query_cache: bool = True):
+    from knowledge.vector_store import get_knowledge_store, QVCache
+    knowledge_store = get_knowledge_store()
     stats = knowledge_store.get_collection_stats()
     if stats.get("total_documents", 0) == 0:
         docs_dir = os.path.join("knowledge", "documents")
         if os.path.isdir(docs_dir):
             print("📥 构建向量知识库...")
-            knowledge_store.add_documents_from_directory(docs_dir, "*.txt")
+            knowledge_store.add_documents_from_directory(docs_dir, "*.txt", batch_size=config.EMBEDDING_BATCH_SIZE)
         else:
             print("⚠️ 未找到知识文档目录，跳过初始化")
     else:
+        # 启动时一次性以内存映射方式打开索引，多轮检索不再承担冷加载开销
+        knowledge_store.ensure_loaded(mmap=True)
         print(f"📚 知识库可用 (文档片段: {stats['total_documents']})")
+    if not query_cache:
+        knowledge_store.set_query_cache(False)
+        return
+    # 各专科对同一病例的检索语句高度相似，挂载查询级语义缓存
+    if config.QVCACHE_SIZE > 0:
+        knowledge_store._cache = QVCache(config.QVCACHE_SIZE, config.QVCACHE_THRESHOLD)
 
-def build_case_interactive() -> Dict[str, Any]:
+async def build_case_interactive() -> Dict[str, Any]:
     print("请输入病例信息 (留空则标记为 N/A):")
-    def ask(k: str) -> str:
-        val = input(f"{k}: ").strip()
+    async def ask(k: str) -> str:
+        val = (await ainput(f"{k}: ")).strip()
         return val or "N/A"
     return {
-        "patient_id": ask("患者ID"),
-        "symptoms": ask("症状"),
-        "medical_history": ask("病史"),
-        "imaging_results": ask("影像学"),
-        "lab_results": ask("实验室检查"),
-        "pathology_results": ask("病理"),
-        "additional_info": ask("其他")
+        "patient_id": await ask("患者ID"),
+        "symptoms": await ask("症状"),
+        "medical_history": await ask("病史"),
+        "imaging_results": await ask("影像学"),
+        "lab_results": await ask("实验室检查"),
+        "pathology_results": await ask("病理"),
+        "additional_info": await ask("其他")
     }
 
-def select_agents(interactive: bool, preset: Optional[str]) -> List[str]:
+async def select_agents(interactive: bool, preset: Optional[str]) -> List[str]:
     if preset == "all":
         return ACTIVE_AGENT_KEYS.copy()
     if not interactive:
@@ -75,7 +112,7 @@ def select_agents(interactive: bool, preset: Optional[str]) -> List[str]:
     print("\n可选专科 (输入序号, 逗号分隔, 回车=全部):")
     for i, k in enumerate(ACTIVE_AGENT_KEYS, 1):
         print(f"  {i}. {AGENT_LABELS[k]}")
-    raw = input("选择: ").strip()
+    raw = (await ainput("选择: ")).strip()
     if not raw:
         return ACTIVE_AGENT_KEYS.copy()
     chosen: List[str] = []
@@ -85,77 +122,109 @@ def select_agents(interactive: bool, preset: Optional[str]) -> List[str]:
             idx = int(token) - 1
             if 0 <= idx < len(ACTIVE_AGENT_KEYS):
                 chosen.append(ACTIVE_AGENT_KEYS[idx])
-    return chosen or ACTIVE_AGENT_KEYS.copy()
+    # 去重并保持输入顺序，避免同一专科被重复调度
+    return list(dict.fromkeys(chosen)) or ACTIVE_AGENT_KEYS.copy()
 
-def summarize_phase_block(title: str):
-    print("\n" + title)
-    print("-" * 48)
+def summarize_phase_block(buf: List[str], title: str):
+    buf.append("\n" + title)
+    buf.append("-" * 48)
 
-def render_result(phases: Dict[str, Any]):
+def render_result(phases: Dict[str, Any]) -> str:
+    """将各阶段结果渲染为整段文本（由调用方一次性写出，避免逐行 print 的系统调用开销）"""
+    buf: List[str] = []
+    out = buf.append
     # 独立分析
     if "individual_analysis" in phases:
-        summarize_phase_block("🔍 独立分析阶段")
+        summarize_phase_block(buf, "🔍 独立分析阶段")
         for k, v in phases["individual_analysis"].items():
             agent = v.get("agent", k)
-            print(f"【{agent}】")
-            print(v.get("response", "(无)"))
-            print()
+            out(f"【{agent}】")
+            out(str(v.get("response", "(无)")))
+            out("")
     # 共享讨论
     if "sharing_discussion" in phases:
-        summarize_phase_block("🤝 共享讨论阶段")
+        summarize_phase_block(buf, "🤝 共享讨论阶段")
         for k, v in phases["sharing_discussion"].items():
             agent = v.get("agent", k)
-            print(f"【{agent}】 {v.get('response', '(无)')}")
+            out(f"【{agent}】 {v.get('response', '(无)')}")
     # 冲突检测
     if "conflict_detection" in phases:
-        summarize_phase_block("⚠️ 冲突检测")
+        summarize_phase_block(buf, "⚠️ 冲突检测")
         cd = phases["conflict_detection"]
-        print(f"存在冲突: {cd.get('conflict_detected')}  共识初值: {cd.get('consensus_score')}")
-        print(cd.get("conflict_analysis", "(无分析)"))
+        out(f"存在冲突: {cd.get('conflict_detected')}  共识初值: {cd.get('consensus_score')}")
+        out(str(cd.get("conflict_analysis", "(无分析)")))
     # 多轮讨论
     if "multi_round_discussion" in phases:
-        summarize_phase_block("🔄 多轮讨论")
+        summarize_phase_block(buf, "🔄 多轮讨论")
         mrd = phases["multi_round_discussion"]
         rounds = mrd.get("rounds", [])
         for r_idx, r in enumerate(rounds, 1):
-            print(f"第 {r_idx} 轮：")
-            for a in r.get("responses", []):
-                agent = a.get("agent", "?")
-                print(f"  - {agent}: {a.get('response', '')[:120]}...")
+            # 每轮一次 join；str 切片按字符截断，不会切坏中文
+            out("\n".join([f"第 {r_idx} 轮："] + [
+                f"  - {a.get('agent', '?')}: {(a.get('response') or '')[:120]}..."
+                for a in r.get("responses", [])
+            ]))
     # 共识评估
     if "consensus_evaluation" in phases:
-        summarize_phase_block("� 共识评估")
+        summarize_phase_block(buf, "� 共识评估")
         ce = phases["consensus_evaluation"]
-        print(f"共识达成: {ce.get('consensus_reached')}  分数: {ce.get('consensus_score')}")
-        print(ce.get("evaluation_details") or ce.get("evaluation") or "")
+        out(f"共识达成: {ce.get('consensus_reached')}  分数: {ce.get('consensus_score')}")
+        out(str(ce.get("evaluation_details") or ce.get("evaluation") or ""))
     # 最终协调
     if "final_coordination" in phases:
-        summarize_phase_block("🎯 最终协调")
+        summarize_phase_block(buf, "🎯 最终协调")
         fc = phases["final_coordination"]
-        print(fc.get("coordinator_summary") or fc.get("response") or "(无总结)")
+        out(str(fc.get("coordinator_summary") or fc.get("response") or "(无总结)"))
         recs = fc.get("final_recommendations") or []
         if recs:
-            print("\n建议列表:")
+            out("\n建议列表:")
             for i, r in enumerate(recs, 1):
-                print(f"  {i}. {r}")
+                out(f"  {i}. {r}")
+    return "\n".join(buf)
 
-async def run_cli(case_data: Dict[str, Any], selected: List[str]):
+async def run_cli(args):
+    from mdt_system.orchestrator import MDTOrchestrator
     orchestrator = MDTOrchestrator()
+    if args.max_concurrency:
+        orchestrator.max_concurrency = args.max_concurrency
+    # 等待用户输入病例/选择专科期间，后台预热共享 LLM 连接与嵌入模型
+    prep_task = asyncio.create_task(orchestrator.prewarm())
+    case_data = await load_case_from_args(args)
+    if not case_data.get("patient_id"):
+        print("❌ 病例缺少 patient_id，已终止")
+        prep_task.cancel()
+        return
+    selected = await resolve_agents(args)
+    print("选择专科:", ", ".join(AGENT_LABELS[a] for a in selected))
+    await prep_task
     result = await orchestrator.conduct_mdt_session(case_data, selected)
+    if args.quiet:
+        return
     phases = result.get("phases", {})
-    print(f"\n会话ID: {result.get('session_id')}")
-    print(f"参与专家: {', '.join(result.get('participants', []))}")
-    render_result(phases)
-    print("\n💾 结果已保存到 data/sessions/ (若启用了保存逻辑)")
+    text = "\n".join((
+        f"\n会话ID: {result.get('session_id')}",
+        f"参与专家: {', '.join(result.get('participants', []))}",
+        render_result(phases),
+        "\n💾 结果已保存到 data/sessions/ (若启用了保存逻辑)\n",
+    ))
+    sys.stdout.write(text)
+    sys.stdout.flush()
 
-def parse_args():
+@functools.cache
+def _get_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(description="ILD 专门化多轮 MDT CLI")
     p.add_argument("--auto", action="store_true", help="使用默认病例与全部主要专科")
     p.add_argument("--case", type=str, help="提供病例 JSON 文件路径")
     p.add_argument("--agents", type=str, help="逗号分隔的专科键 (pulmonary,imaging,...) 不含coordinator")
-    return p.parse_args()
+    p.add_argument("--max-concurrency", type=int, default=None, help="同一阶段并发的智能体调用上限 (默认 MDT_MAX_CONCURRENCY)")
+    p.add_argument("--quiet", action="store_true", help="不输出会话结果（结果仍保存到 data/sessions/）")
+    p.add_argument("--no-query-cache", action="store_true", help="关闭查询向量缓存与语义缓存（基准对比用）")
+    return p
+
+def parse_args():
+    return _get_parser().parse_args()
 
-def load_case_from_args(args) -> Dict[str, Any]:
+async def load_case_from_args(args) -> Dict[str, Any]:
     if args.case:
         data = load_json(args.case)
         if data:
@@ -170,23 +239,24 @@ def load_case_from_args(args) -> Dict[str, Any]:
             "lab_results": "KL-6 升高，ANA 阴性",
             "pathology_results": "外科活检提示 UIP 模式",
             "additional_info": "FVC 70% DLCO 52%"}
-    return build_case_interactive()
+    return await build_case_interactive()
 
-def resolve_agents(args) -> List[str]:
+async def resolve_agents(args) -> List[str]:
     if args.agents:
         chosen = []
         for a in args.agents.split(','):
             a = a.strip()
-            if a in ACTIVE_AGENT_KEYS:
+            if a in ACTIVE_AGENT_SET:
                 chosen.append(a)
         if chosen:
-            return chosen
+            return list(dict.fromkeys(chosen))
         print("⚠️ --agents 参数无有效项，使用全部")
     if args.auto:
         return ACTIVE_AGENT_KEYS.copy()
-    return select_agents(interactive=True, preset=None)
+    return await select_agents(interactive=True, preset=None)
 
 def main():
+    args = parse_args()
     print("🏥 ILD 多智能体 MDT 系统 (CLI)")
     if not config.OPENAI_API_KEY:
         print("❌ 未检测到 OPENAI_API_KEY，请在 .env 中配置")
@@ -197,16 +267,11 @@ def main():
         print(f"❌ 配置错误: {e}")
         return
     setup_logging()
-    init_knowledge()
-    args = parse_args()
-    case_data = load_case_from_args(args)
-    if not case_data.get("patient_id"):
-        print("❌ 病例缺少 patient_id，已终止")
-        return
-    agents = resolve_agents(args)
-    print("选择专科:", ", ".join(AGENT_LABELS[a] for a in agents))
+    from knowledge.vector_store import configure_faiss_threads
+    configure_faiss_threads()
+    init_knowledge(query_cache=not args.no_query_cache)
     try:
-        asyncio.run(run_cli(case_data, agents))
+        asyncio.run(run_cli(args))
     except KeyboardInterrupt:
         print("\n⏹ 中断退出")
     except Exception as e:
@@ -12,6 +12,11 @@
   --no-pdf        不处理 PDF
   --no-csv        不处理 CSV
   --patterns "*.txt,*.md"  自定义文本通配符(逗号分隔)
+  --batch-size N  每次嵌入请求的 chunk 数 (默认 EMBEDDING_BATCH_SIZE)
+  --no-cache      不使用嵌入磁盘缓存
+  --cache-dir DIR 嵌入缓存目录 (默认 EMBEDDING_CACHE_DIR)
+  --index-type T  (rebuild) 索引类型 auto/flat/hnsw/ivf/pq (默认 FAISS_INDEX_TYPE)
+  --quant Q       (rebuild) 向量编码 fp32/fp16/pq8 (默认 FAISS_QUANT)
   --debug         设置日志级别为 DEBUG
 
 示例:
@@ -24,23 +29,23 @@
 import os
 import sys
 import argparse
+import functools
 import logging
 from typing import List
 
 # 确保可导入本地包
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 if BASE_DIR not in sys.path:
-    sys.path.append(BASE_DIR)
+    sys.path.insert(0, BASE_DIR)
 
-from knowledge.vector_store import get_knowledge_store  # noqa: E402
-knowledge_store = get_knowledge_store()
 from utils.config import config  # noqa: E402
 
 
 def parse_patterns(pat_str: str) -> List[str]:
     return [p.strip() for p in pat_str.split(',') if p.strip()]
 
-def main():
+@functools.cache
+def _get_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="医学知识库 FAISS 管理")
     sub = parser.add_subparsers(dest="cmd", required=True)
 
@@ -49,25 +54,43 @@ def main():
     common.add_argument('--patterns', default='*.txt,*.md', help='文本文件通配符, 逗号分隔')
     common.add_argument('--no-pdf', action='store_true', help='不处理 PDF')
     common.add_argument('--no-csv', action='store_true', help='不处理 CSV')
+    common.add_argument('--batch-size', type=int, default=None, help='每次嵌入请求的 chunk 数 (默认 EMBEDDING_BATCH_SIZE)')
+    common.add_argument('--no-cache', action='store_true', help='不使用嵌入磁盘缓存')
+    common.add_argument('--cache-dir', default=None, help='嵌入缓存目录 (默认 EMBEDDING_CACHE_DIR)')
     common.add_argument('--debug', action='store_true', help='DEBUG 日志')
 
-    sub.add_parser('rebuild', parents=[common], help='全量重建索引')
+    rebuild_p = sub.add_parser('rebuild', parents=[common], help='全量重建索引')
+    rebuild_p.add_argument('--index-type', choices=['auto', 'flat', 'hnsw', 'ivf', 'pq'], default=None,
+                           help='索引类型 (默认 FAISS_INDEX_TYPE)')
+    rebuild_p.add_argument('--quant', choices=['fp32', 'fp16', 'pq8'], default=None,
+                           help='向量编码 (默认 FAISS_QUANT)')
     sub.add_parser('incremental', parents=[common], help='增量新增')
     sub.add_parser('stats', help='查看统计')
     sub.add_parser('clear', help='清空索引')
+    return parser
 
-    args = parser.parse_args()
+def main():
+    args = _get_parser().parse_args()
 
     log_level = 'DEBUG' if getattr(args, 'debug', False) else getattr(config, 'LOG_LEVEL', 'INFO')
     logging.basicConfig(level=log_level,
                         format='[%(asctime)s] %(levelname)s %(message)s',
                         datefmt='%H:%M:%S')
+    # 参数解析后再导入向量库（faiss / 嵌入依赖），--help 无需加载
+    from knowledge.vector_store import get_knowledge_store, configure_faiss_threads
+    configure_faiss_threads()
+    # clear / rebuild 会先清空目录，不必载入现有元数据
+    knowledge_store = get_knowledge_store(load_meta=args.cmd not in ('rebuild', 'clear'))
 
     if args.cmd in ('rebuild', 'incremental'):
         patterns = parse_patterns(args.patterns)
         include_pdf = not args.no_pdf
         include_csv = not args.no_csv
         directory = args.dir
+        if args.no_cache:
+            knowledge_store.set_embedding_cache(None)
+        elif args.cache_dir:
+            knowledge_store.set_embedding_cache(args.cache_dir)
 
         if args.cmd == 'rebuild':
             logging.info('开始全量重建...')
@@ -75,7 +98,10 @@ def main():
                 directory_path=directory,
                 patterns=patterns,
                 include_pdf=include_pdf,
-                include_csv=include_csv
+                include_csv=include_csv,
+                batch_size=args.batch_size,
+                index_type=args.index_type,
+                quant=args.quant
             )
             logging.info(f'重建完成: {summary}')
         else:
@@ -84,7 +110,8 @@ def main():
                 directory_path=directory,
                 patterns=patterns,
                 include_pdf=include_pdf,
-                include_csv=include_csv
+                include_csv=include_csv,
+                batch_size=args.batch_size
             )
             logging.info(f'增量完成: {summary}')
     elif args.cmd == 'stats':
@@ -96,7 +123,7 @@ def main():
         ok = knowledge_store.clear_collection()
         print('已清空' if ok else '清空失败')
     else:
-        parser.print_help()
+        _get_parser().print_help()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,20 @@
+"""LLM 调用并发控制
+
+编排器与冲突分析组件共用的全局 LLM 调用并发上限（跨会话共享）。
+asyncio 信号量绑定首次使用它的事件循环，故按事件循环各建一个。
+"""
+import asyncio
+import weakref
+
+from utils.config import config
+
+_LLM_SEMS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def llm_semaphore() -> asyncio.Semaphore:
+    """当前事件循环的 LLM 调用信号量"""
+    loop = asyncio.get_running_loop()
+    sem = _LLM_SEMS.get(loop)
+    if sem is None:
+        sem = _LLM_SEMS[loop] = asyncio.Semaphore(config.MAX_CONCURRENT_LLM_CALLS)
+    return sem
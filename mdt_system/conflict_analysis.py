@@ -3,69 +3,181 @@
 独立出：
 - 冲突检测 detect_conflicts
 - 共识评估 evaluate_consensus
+- 异步并发版本 adetect / aevaluate_consensus / analyze_round
 - 共识与冲突文本解析方法
 
 便于针对性替换 / 实验不同冲突度量算法。
 """
 from __future__ import annotations
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+import asyncio
 import logging
+import re
+from dataclasses import dataclass
 from datetime import datetime
 
+from .concurrency import llm_semaphore
+
 logger = logging.getLogger(__name__)
 
+# 协调员回答中的冲突分数行，如 "CONFLICT_SCORE: 0.3"
+_CONFLICT_RE = re.compile(r'conflict[_\s-]?score\s*[:=]\s*([0-9]*\.?[0-9]+)', re.IGNORECASE)
+DEFAULT_CONFLICT_THRESHOLD = 0.5
+
+
+def extract_conflict_score(text: Any) -> Optional[float]:
+    """从协调员回答中提取冲突分数 (0~1)，未给出时返回 None"""
+    if not isinstance(text, str):
+        return None
+    m = _CONFLICT_RE.search(text)
+    return min(float(m.group(1)), 1.0) if m else None
+
+
+@dataclass(slots=True)
+class ConflictResult:
+    """冲突检测的规范化结果：协调员返回的两种字段名在此统一解析一次"""
+    agent: str
+    detected: bool
+    response: Any
+    raw: Dict[str, Any]
+    timestamp: str
+    score: Optional[float] = None
+
+    @staticmethod
+    def _from_raw(raw: Dict[str, Any], coord_name: str, ts: str,
+                  threshold: float = DEFAULT_CONFLICT_THRESHOLD) -> "ConflictResult":
+        """冲突分数优先：给出分数时按阈值判定，否则沿用协调员的布尔判定"""
+        score = raw.get("conflict_score")
+        if score is None:
+            score = extract_conflict_score(raw.get("response"))
+        if score is not None:
+            detected = score >= threshold
+        else:
+            detected = raw.get("conflicts_detected")
+            if detected is None:
+                detected = raw.get("conflict_detected")
+        return ConflictResult(coord_name, bool(detected), raw.get("response") or raw, raw, ts, score)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "agent": self.agent,
+            "conflict_detected": self.detected,
+            "conflicts_detected": self.detected,
+            "conflict_score": self.score,
+            "response": self.response,
+            "raw": self.raw,
+            "timestamp": self.timestamp,
+        }
+
+
 class ConflictAnalyzer:
-    def __init__(self, coordinator_agent):
+    def __init__(self, coordinator_agent, conflict_threshold: float = DEFAULT_CONFLICT_THRESHOLD):
         self.coordinator = coordinator_agent
+        self.conflict_threshold = conflict_threshold   # 冲突分数达到该值才判定为显著冲突
 
-    def detect(self, case_data: Dict[str, Any], opinions: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """执行冲突检测，返回结构化结果"""
+    def _normalize_detection(self, agent_name: str, result: Dict[str, Any], ts: str) -> Dict[str, Any]:
+        """规范化冲突检测字段"""
+        return ConflictResult._from_raw(result, agent_name, ts, self.conflict_threshold).as_dict()
+
+    @staticmethod
+    def _detection_error(agent_name: str, e: BaseException, ts: str) -> Dict[str, Any]:
+        # 检测失败按无冲突处理，避免无谓地进入多轮讨论
+        logger.error(f"Conflict detection error, treating as no conflict: {e}")
+        return {
+            "agent": agent_name,
+            "conflict_detected": False,
+            "conflicts_detected": False,
+            "error": str(e),
+            "timestamp": ts
+        }
+
+    @staticmethod
+    def _normalize_consensus(agent_name: str, result: Dict[str, Any], ts: str) -> Dict[str, Any]:
+        """规范化共识评估字段"""
+        score = result.get("consensus_score", 0.0)
+        return {
+            "agent": agent_name,
+            "consensus_score": score,
+            "consensus_reached": score >= 0.75,
+            "raw": result,
+            "timestamp": ts,
+        }
+
+    @staticmethod
+    def _consensus_error(agent_name: str, e: BaseException, ts: str) -> Dict[str, Any]:
+        logger.error(f"Consensus evaluation error: {e}")
+        return {
+            "agent": agent_name,
+            "consensus_score": 0.0,
+            "consensus_reached": False,
+            "error": str(e),
+            "timestamp": ts
+        }
+
+    def detect(self, case_data: Dict[str, Any], opinions: List[Dict[str, Any]],
+               phase_ts: Optional[str] = None) -> Dict[str, Any]:
+        """执行冲突检测，返回结构化结果；phase_ts 为本阶段统一时间戳，缺省时取调用时刻"""
+        ts = phase_ts or datetime.now().isoformat()
         try:
             result = self.coordinator.detect_conflicts(case_data, opinions)
-            # 规范化字段
-            normalized = {
-                "agent": self.coordinator.name,
-                "conflict_detected": result.get("conflicts_detected") or result.get("conflict_detected"),
-                "conflicts_detected": result.get("conflicts_detected") or result.get("conflict_detected"),
-                "response": result.get("response") or result,
-                "raw": result,
-                "timestamp": datetime.now().isoformat(),
-            }
-            return normalized
+            return self._normalize_detection(self.coordinator.name, result, ts)
         except Exception as e:
-            logger.error(f"Conflict detection error: {e}")
-            return {
-                "agent": self.coordinator.name,
-                "conflict_detected": True,
-                "error": str(e),
-                "timestamp": datetime.now().isoformat()
-            }
+            return self._detection_error(self.coordinator.name, e, ts)
 
-    def evaluate_consensus(self, opinions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def evaluate_consensus(self, opinions: List[Dict[str, Any]], phase_ts: Optional[str] = None) -> Dict[str, Any]:
+        ts = phase_ts or datetime.now().isoformat()
         try:
             result = self.coordinator.evaluate_consensus(opinions)
-            normalized = {
-                "agent": self.coordinator.name,
-                "consensus_score": result.get("consensus_score", 0.0),
-                "consensus_reached": result.get("consensus_score", 0.0) >= 0.75,
-                "raw": result,
-                "timestamp": datetime.now().isoformat(),
-            }
-            return normalized
+            return self._normalize_consensus(self.coordinator.name, result, ts)
         except Exception as e:
-            logger.error(f"Consensus evaluation error: {e}")
-            return {
-                "agent": self.coordinator.name,
-                "consensus_score": 0.0,
-                "consensus_reached": False,
-                "error": str(e),
-                "timestamp": datetime.now().isoformat()
-            }
+            return self._consensus_error(self.coordinator.name, e, ts)
+
+    async def adetect(self, case_data: Dict[str, Any], opinions: List[Dict[str, Any]],
+                      phase_ts: Optional[str] = None) -> Dict[str, Any]:
+        """异步冲突检测：阻塞 LLM 调用放到线程中执行"""
+        ts = phase_ts or datetime.now().isoformat()
+        try:
+            async with llm_semaphore():
+                result = await asyncio.to_thread(self.coordinator.detect_conflicts, case_data, opinions)
+            return self._normalize_detection(self.coordinator.name, result, ts)
+        except Exception as e:
+            return self._detection_error(self.coordinator.name, e, ts)
+
+    async def aevaluate_consensus(self, opinions: List[Dict[str, Any]], phase_ts: Optional[str] = None) -> Dict[str, Any]:
+        """异步共识评估"""
+        ts = phase_ts or datetime.now().isoformat()
+        try:
+            async with llm_semaphore():
+                result = await asyncio.to_thread(self.coordinator.evaluate_consensus, opinions)
+            return self._normalize_consensus(self.coordinator.name, result, ts)
+        except Exception as e:
+            return self._consensus_error(self.coordinator.name, e, ts)
+
+    async def analyze_round(self, case_data: Dict[str, Any], opinions: List[Dict[str, Any]],
+                            phase_ts: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """并发执行冲突检测与共识评估，耗时取两者较慢者而非之和；两项结果共用同一时间戳
+
+        Returns:
+            (冲突检测结果, 共识评估结果)，均为规范化后的字典
+        """
+        ts = phase_ts or datetime.now().isoformat()
+        detection, consensus = await asyncio.gather(
+            self.adetect(case_data, opinions, ts),
+            self.aevaluate_consensus(opinions, ts),
+            return_exceptions=True,
+        )
+        if isinstance(detection, BaseException):
+            detection = self._detection_error(self.coordinator.name, detection, ts)
+        if isinstance(consensus, BaseException):
+            consensus = self._consensus_error(self.coordinator.name, consensus, ts)
+        return detection, consensus
 
-    def final_coordination(self, case_data: Dict[str, Any], all_phases: Dict[str, Any], consensus_reached: bool) -> Dict[str, Any]:
+    def final_coordination(self, case_data: Dict[str, Any], all_phases: Dict[str, Any], consensus_reached: bool,
+                           phase_ts: Optional[str] = None) -> Dict[str, Any]:
+        ts = phase_ts or datetime.now().isoformat()
         try:
             result = self.coordinator.final_coordination(case_data, all_phases, consensus_reached)
-            result.setdefault("timestamp", datetime.now().isoformat())
+            result.setdefault("timestamp", ts)
             return result
         except Exception as e:
             logger.error(f"Final coordination error: {e}")
@@ -73,5 +185,5 @@ class ConflictAnalyzer:
                 "agent": self.coordinator.name,
                 "response": f"最终协调失败: {e}",
                 "error": str(e),
-                "timestamp": datetime.now().isoformat()
+                "timestamp": ts
             }
@@ -13,14 +13,19 @@ MDT系统编排器模块
 版本: 1.0
 """
 
-from typing import Dict, List, Any, Optional, Callable, Generator
+from typing import Dict, List, Any, Optional, Callable, Generator, AsyncGenerator
+from dataclasses import dataclass
 from datetime import datetime
 import asyncio
 import threading
 import queue
 import logging
 from enum import Enum  # legacy import kept if other parts still reference Enum locally
+import os
 import time
+import hashlib
+from collections import Counter
+import math
 
 # 导入各专科智能体 - ILD专门化配置
 from agents.coordinator_agent import CoordinatorAgent
@@ -29,20 +34,86 @@ from agents.imaging_agent import ImagingAgent
 from agents.pathology_agent import PathologyAgent
 from agents.rheumatology_agent import RheumatologyAgent
 from agents.data_analysis_agent import DataAnalysisAgent
+from agents.base_agent import prewarm_llm_client
 
 # 导入工具函数和配置
-from utils.helpers import format_agent_response, save_mdt_session, parse_medical_case
+from utils.helpers import (format_agent_response, save_mdt_session, parse_medical_case,
+                           session_journal_path, append_session_record)
 from utils.config import config
 
 # 外部分离的阶段与冲突分析组件
 from .phases import MDTPhase
-from .conflict_analysis import ConflictAnalyzer
+from .conflict_analysis import ConflictAnalyzer, extract_conflict_score
+from .concurrency import llm_semaphore as _llm_semaphore
 
 # 配置日志记录器
 logger = logging.getLogger(__name__)
 
 ## 已迁移：阶段枚举见 phases.MDTPhase；保留此处删除记录供历史 diff 追踪。
 
+# 专家名称映射：中文名称 -> 英文键名（模块级常量，避免每次会话重建）
+_EXPERT_NAME_MAP: Dict[str, str] = {
+    "呼吸科专家": "pulmonary",
+    "影像科专家": "imaging",
+    "病理科专家": "pathology",
+    "风湿免疫科专家": "rheumatology",
+    "数据分析专家": "data_analysis",
+    "协调员": "coordinator",
+}
+
+
+@dataclass(slots=True, frozen=True)
+class Opinion:
+    """编排器内部的专家意见记录；传给智能体或持久化时再转换为字典"""
+    agent: str
+    response: str
+    timestamp: str
+    specialty: str = ""
+    round: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'agent': self.agent,
+            'response': self.response,
+            'timestamp': self.timestamp,
+            'specialty': self.specialty,
+            'round': self.round,
+        }
+
+
+def _opinion_dicts(opinions: List[Opinion]) -> List[Dict[str, Any]]:
+    """智能体接口边界：意见记录转为字典列表"""
+    return [op.as_dict() for op in opinions]
+
+
+# 流式时间戳缓存：(整秒, 该秒的 ISO 字符串)，整秒变化时才重新格式化；元组整体替换保证线程间读取一致
+_ts_cache = (0, "")
+
+
+def _now_iso() -> str:
+    """流式输出用的 ISO 时间戳（微秒精度），避免每个片段都构造 datetime 对象"""
+    global _ts_cache
+    ns = time.time_ns()
+    sec = ns // 1_000_000_000
+    cached_sec, base = _ts_cache
+    if sec != cached_sec:
+        base = datetime.fromtimestamp(sec).isoformat()
+        _ts_cache = (sec, base)
+    return f"{base}.{(ns % 1_000_000_000) // 1000:06d}"
+
+
+def _text_similarity(a: str, b: str) -> float:
+    """基于字符二元组计数的余弦相似度（廉价的意见变化检测，不调用 LLM）"""
+    if a == b:
+        return 1.0
+    ca = Counter(a[i:i + 2] for i in range(len(a) - 1))
+    cb = Counter(b[i:i + 2] for i in range(len(b) - 1))
+    if not ca or not cb:
+        return 0.0
+    dot = sum(n * cb[k] for k, n in ca.items() if k in cb)
+    norm = math.sqrt(sum(n * n for n in ca.values())) * math.sqrt(sum(n * n for n in cb.values()))
+    return dot / norm
+
 class MDTOrchestrator:
     """
     MDT系统编排器 - 协调多智能体协作的核心类
@@ -65,8 +136,8 @@ class MDTOrchestrator:
         agents (Dict): 存储所有专科智能体实例的字典
         current_phase (MDTPhase): 当前执行阶段
         session_data (Dict): 会话数据存储
-        agent_responses (List): 智能体响应结果列表
-        progress_callbacks (List): 进度回调函数列表
+        agent_responses_by_name (Dict): 按智能体名称索引的响应结果
+        progress_callbacks (tuple): 进度回调函数（不可变快照）
     """
     
     def __init__(self):
@@ -95,17 +166,93 @@ class MDTOrchestrator:
         # MDT会话状态管理
         self.current_phase = MDTPhase.INITIALIZATION   # 当前执行阶段
         self.session_data = {}         # 会话数据存储
-        self.agent_responses = []      # 智能体响应结果列表
-        self.progress_callbacks = []   # 进度回调函数列表
+        self.agent_responses_by_name: Dict[str, Dict[str, Any]] = {}   # 智能体名称 -> 响应结果
+        self.progress_callbacks: tuple = ()   # 进度回调函数（注册时重建的不可变快照）
 
         # 多轮讨论配置
         self.max_discussion_rounds = 3                 # 最大讨论轮数
         self.consensus_threshold = 0.75                # 共识阈值
+        self.max_concurrency = config.MDT_MAX_CONCURRENCY  # 同一阶段并发智能体调用上限
         self.current_round = 0                         # 当前讨论轮数
 
         # 冲突/共识分析组件
         self.conflict_analyzer = ConflictAnalyzer(self.agents["coordinator"])
-        
+        # 提前得到的共识评估 (意见快照, 原始结果或进行中的任务)：来自步骤3的并发评估或步骤4结束时的推测执行，
+        # 意见未变时步骤5直接复用
+        self._round_consensus: Optional[tuple] = None
+        
+    @property
+    def conflict_threshold(self) -> float:
+        """冲突分数达到该值才进入多轮讨论（由冲突分析组件在构建检测结果时使用）"""
+        return self.conflict_analyzer.conflict_threshold
+
+    @conflict_threshold.setter
+    def conflict_threshold(self, value: float) -> None:
+        self.conflict_analyzer.conflict_threshold = value
+
+    @property
+    def agent_responses(self) -> List[Dict[str, Any]]:
+        """智能体响应结果列表（按名称索引的只读视图）"""
+        return list(self.agent_responses_by_name.values())
+
+    def _discard_round_consensus(self) -> None:
+        """丢弃提前得到的共识评估，取消仍在进行的推测任务"""
+        cached, self._round_consensus = self._round_consensus, None
+        if cached is not None and isinstance(cached[1], asyncio.Task):
+            cached[1].cancel()
+
+    async def _journal_phases(self, journal: str, *phase_names: str) -> None:
+        """将已完成阶段的结果追加到会话增量记录（后台线程写入，失败只记录日志）"""
+        phases = self.session_data.get("phases", {})
+        for name in phase_names:
+            if name not in phases:
+                continue
+            record = {"phase": name, "data": phases[name], "timestamp": datetime.now().isoformat()}
+            try:
+                await asyncio.to_thread(append_session_record, journal, record)
+            except Exception as e:
+                logger.warning(f"Failed to journal phase {name}: {e}")
+
+    def _current_opinions(self) -> List[Opinion]:
+        """收集当前各专家意见（冲突检测与共识评估的输入）"""
+        return [
+            Opinion(
+                agent=resp.get('agent', ''),
+                response=resp['response'],
+                timestamp=resp.get('timestamp', ''),
+                specialty=resp.get('specialty', '')
+            )
+            for resp in self.agent_responses_by_name.values()
+            if isinstance(resp, dict) and resp.get('response')
+        ]
+
+    def _opinions_drifted(self, before: List[Opinion], after: List[Opinion]) -> bool:
+        """初步讨论后意见是否明显变化（参与者不同或任一专家文本相似度低于阈值）"""
+        prev = {op.agent: op.response for op in before}
+        curr = {op.agent: op.response for op in after}
+        if prev.keys() != curr.keys():
+            return True
+        threshold = config.CONFLICT_RECHECK_SIMILARITY
+        return any(_text_similarity(prev[k], curr[k]) < threshold for k in curr)
+
+    async def prewarm(self) -> None:
+        """会前预热：并发建立 LLM 连接并初始化知识库嵌入，缩短首个回答的等待
+
+        供入口在等待用户输入期间后台调用；任何失败只记录日志。
+        """
+        # 延迟导入：仅预热时才加载知识库模块（faiss / 嵌入依赖较重）
+        from knowledge.vector_store import get_knowledge_store
+
+        # 各智能体共用一个客户端，连接只需预热一次（与 BaseAgent.prewarm 共用同一守卫）
+        results = await asyncio.gather(
+            asyncio.to_thread(prewarm_llm_client),
+            asyncio.to_thread(get_knowledge_store().ensure_embeddings),
+            return_exceptions=True,
+        )
+        for r in results:
+            if isinstance(r, Exception):
+                logger.warning(f"Prewarm error: {r}")
+
     def add_progress_callback(self, callback: Callable):
         """
         添加进度回调函数
@@ -125,7 +272,7 @@ class MDTOrchestrator:
             
             orchestrator.add_progress_callback(progress_handler)
         """
-        self.progress_callbacks.append(callback)
+        self.progress_callbacks = (*self.progress_callbacks, callback)
     
     def _notify_progress(self, phase: MDTPhase, message: str, data: Optional[Dict] = None):
         """
@@ -143,13 +290,25 @@ class MDTOrchestrator:
             - 所有回调函数都会被调用，即使前面的回调出现异常
             - 回调异常会被记录到日志中，但不会中断执行流程
         """
-        for callback in self.progress_callbacks:
+        callbacks = self.progress_callbacks
+        if not callbacks:
+            return
+        # 阶段值只取一次；回调异常就地捕获并记录，不中断执行
+        phase_value = phase.value
+        for callback in callbacks:
             try:
-                # 调用回调函数，传递阶段、消息和数据
-                callback(phase.value, message, data)
+                callback(phase_value, message, data)
             except Exception as e:
-                # 记录回调异常，但不中断执行
-                logger.error(f"Progress callback error: {e}")
+                logger.error("Progress callback error: %s", e)
+    
+    def _map_selected_agents(self, selected: Optional[List[str]]) -> Optional[List[str]]:
+        """将选中的专家名称映射为智能体键名；已是英文键名的直接使用，未知名称记录警告后丢弃"""
+        if not selected:
+            return None
+        unknown = set(selected) - _EXPERT_NAME_MAP.keys() - self.agents.keys()
+        if unknown:
+            logger.warning(f"Unknown agent names: {sorted(unknown)}")
+        return [key for key in (_EXPERT_NAME_MAP.get(n, n) for n in selected) if key in self.agents]
     
     async def conduct_mdt_session(self, case_data: Dict[str, Any], 
                                  selected_agents: Optional[List[str]] = None) -> Dict[str, Any]:
@@ -173,28 +332,8 @@ class MDTOrchestrator:
             Dict[str, Any]: 完整的多轮MDT会话结果
         """
         try:
-            # 专家名称映射：中文名称 -> 英文键名
-            expert_name_mapping = {
-                "呼吸科专家": "pulmonary",
-                "影像科专家": "imaging", 
-                "病理科专家": "pathology",
-                "风湿免疫科专家": "rheumatology",
-                "数据分析专家": "data_analysis",
-                "协调员": "coordinator"
-            }
-            
-            # 转换选中的专家名称
-            if selected_agents:
-                mapped_agents = []
-                for agent_name in selected_agents:
-                    if agent_name in expert_name_mapping:
-                        mapped_agents.append(expert_name_mapping[agent_name])
-                    elif agent_name in self.agents:
-                        # 如果已经是英文键名，直接使用
-                        mapped_agents.append(agent_name)
-                    else:
-                        logger.warning(f"Unknown agent name: {agent_name}")
-                selected_agents = mapped_agents
+            # 转换选中的专家名称（中文名称 -> 英文键名）
+            selected_agents = self._map_selected_agents(selected_agents)
             
             # === 第一步：初始化会话环境 ===
             session_id = f"mdt_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
@@ -213,6 +352,7 @@ class MDTOrchestrator:
             
             # 重置讨论轮数
             self.current_round = 0
+            self._discard_round_consensus()
             
             logger.info(f"Starting multi-round MDT session: {session_id}")
             self._notify_progress(MDTPhase.INITIALIZATION, "多轮MDT会议开始", {"session_id": session_id})
@@ -221,23 +361,56 @@ class MDTOrchestrator:
             parsed_case = parse_medical_case(case_data)
             self.session_data["parsed_case"] = parsed_case
             
+            journal = session_journal_path(session_id)
+            
             # === 执行新的7步工作流程 ===
             await self._step_1_individual_analysis(parsed_case, selected_agents)
-            await self._step_2_sharing_discussion(parsed_case)
-            conflict_detected = await self._step_3_conflict_detection(parsed_case)
+            await self._journal_phases(journal, "individual_analysis")
+            # 冲突检测只依赖步骤1的意见：仅做检测（不预评估共识），与初步讨论并发执行，把协调员调用移出关键路径
+            initial_opinions = self._current_opinions()
+            conflict_task = asyncio.create_task(
+                self._step_3_conflict_detection(parsed_case, initial_opinions)
+            )
+            try:
+                await self._step_2_sharing_discussion(parsed_case, selected_agents)
+            except BaseException:
+                conflict_task.cancel()
+                raise
+            conflict_detected = await conflict_task
+            # 初步讨论使意见明显变化时，基于新意见重新检测，并预先评估共识供步骤5复用；
+            # 否则沿用基于步骤1意见的检测结果，并在会话记录中注明
+            current_opinions = self._current_opinions()
+            if self._opinions_drifted(initial_opinions, current_opinions):
+                logger.info("Opinions changed notably after sharing discussion, re-running conflict detection")
+                conflict_detected = await self._step_3_conflict_detection(
+                    parsed_case, current_opinions, precompute_consensus=True
+                )
+            else:
+                logger.info("Conflict detection based on individual-analysis opinions (no notable drift after sharing discussion)")
+                conflict_data = self.session_data["phases"].get("conflict_detection")
+                if isinstance(conflict_data, dict):
+                    conflict_data["opinions_source"] = "individual_analysis"
+            await self._journal_phases(journal, "sharing_discussion", "conflict_detection")
             
             if conflict_detected:
-                await self._step_4_multi_round_discussion(parsed_case)
+                await self._step_4_multi_round_discussion(parsed_case, selected_agents)
+                await self._journal_phases(journal, "multi_round_discussion")
             
             consensus_reached = await self._step_5_consensus_evaluation()
             await self._step_6_final_coordination(parsed_case, consensus_reached)
+            await self._journal_phases(journal, "consensus_evaluation", "final_coordination")
             
             # === 完成会话 ===
             self.current_phase = MDTPhase.COMPLETED
             self.session_data["end_time"] = datetime.now().isoformat()
             self.session_data["duration"] = self._calculate_duration()
             
-            session_file = save_mdt_session(self.session_data)
+            # 完整记录在线程中序列化写入，不阻塞事件循环；写入成功后增量记录不再需要
+            session_file = await asyncio.to_thread(save_mdt_session, self.session_data)
+            try:
+                os.remove(journal)
+            except OSError:
+                pass
             logger.info(f"Multi-round MDT session completed: {session_file}")
             
             self._notify_progress(MDTPhase.COMPLETED, "多轮MDT会议完成", 
@@ -273,28 +446,8 @@ class MDTOrchestrator:
             Dict[str, Any]: 流式输出的MDT会话结果片段
         """
         try:
-            # 专家名称映射：中文名称 -> 英文键名
-            expert_name_mapping = {
-                "呼吸科专家": "pulmonary",
-                "影像科专家": "imaging", 
-                "病理科专家": "pathology",
-                "风湿免疫科专家": "rheumatology",
-                "数据分析专家": "data_analysis",
-                "协调员": "coordinator"
-            }
-            
-            # 转换选中的专家名称
-            if selected_agents:
-                mapped_agents = []
-                for agent_name in selected_agents:
-                    if agent_name in expert_name_mapping:
-                        mapped_agents.append(expert_name_mapping[agent_name])
-                    elif agent_name in self.agents:
-                        # 如果已经是英文键名，直接使用
-                        mapped_agents.append(agent_name)
-                    else:
-                        logger.warning(f"Unknown agent name: {agent_name}")
-                selected_agents = mapped_agents
+            # 转换选中的专家名称（中文名称 -> 英文键名）
+            selected_agents = self._map_selected_agents(selected_agents)
             
             # === 第一步：初始化会话环境 ===
             session_id = f"mdt_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
@@ -316,7 +469,7 @@ class MDTOrchestrator:
                 "phase": "initialization",
                 "message": "会话初始化完成",
                 "session_id": session_id,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             
             # === 第二步：独立分析阶段 (流式) ===
@@ -324,7 +477,7 @@ class MDTOrchestrator:
                 "type": "phase_start", 
                 "phase": "individual_analysis",
                 "message": "开始各专科独立分析阶段",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             
             # 流式执行独立分析
@@ -336,7 +489,7 @@ class MDTOrchestrator:
                 "type": "phase_start",
                 "phase": "sharing_discussion", 
                 "message": "开始专科间初步讨论阶段",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             
             # 流式执行共享讨论
@@ -348,7 +501,7 @@ class MDTOrchestrator:
                 "type": "phase_start",
                 "phase": "conflict_detection",
                 "message": "开始意见冲突检测",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             
             conflict_detected = False
@@ -363,7 +516,7 @@ class MDTOrchestrator:
                     "type": "phase_start",
                     "phase": "multi_round_discussion",
                     "message": "检测到意见分歧，开始多轮深入讨论",
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": _now_iso()
                 }
                 
                 # 流式执行多轮讨论
@@ -374,7 +527,7 @@ class MDTOrchestrator:
                     "type": "phase_skip",
                     "phase": "multi_round_discussion", 
                     "message": "专家意见一致，跳过多轮讨论",
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": _now_iso()
                 }
             
             # === 第六步：共识评估阶段 ===
@@ -382,7 +535,7 @@ class MDTOrchestrator:
                 "type": "phase_start",
                 "phase": "consensus_evaluation",
                 "message": "开始共识评估",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             
             consensus_reached = False
@@ -396,7 +549,7 @@ class MDTOrchestrator:
                 "type": "phase_start",
                 "phase": "final_coordination",
                 "message": "开始最终协调和建议生成",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             
             # 流式执行最终协调
@@ -424,7 +577,7 @@ class MDTOrchestrator:
                 "message": "多轮MDT会议完成",
                 "session_data": self.session_data,
                 "session_file": session_file,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             
         except Exception as e:
@@ -436,10 +589,62 @@ class MDTOrchestrator:
                 "phase": "error",
                 "message": f"多轮MDT会议出错: {str(e)}",
                 "error": str(e),
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             raise
     
+    async def aconduct_mdt_session_stream(self, case_data: Dict[str, Any],
+                                         selected_agents: Optional[List[str]] = None) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        异步流式执行多轮讨论MDT会话
+        
+        与conduct_mdt_session_stream输出相同的片段序列，但以异步生成器形式提供：
+        同步流水线在后台线程中运行，片段经asyncio队列转交，事件循环在等待LLM期间不被阻塞，
+        同一进程可并发驱动多个会话。消费者提前退出时，后台线程在下一个片段处停止。
+        
+        Args:
+            case_data (Dict[str, Any]): 病例数据字典
+            selected_agents (Optional[List[str]]): 参与讨论的智能体列表
+                
+        Yields:
+            Dict[str, Any]: 流式输出的MDT会话结果片段
+        """
+        loop = asyncio.get_running_loop()
+        out: "asyncio.Queue[tuple]" = asyncio.Queue()
+        stop = threading.Event()
+
+        def _emit(kind: str, payload: Any = None):
+            try:
+                loop.call_soon_threadsafe(out.put_nowait, (kind, payload))
+            except RuntimeError:
+                # 事件循环已关闭，消费者不再接收
+                stop.set()
+
+        def _pump():
+            gen = self.conduct_mdt_session_stream(case_data, selected_agents)
+            try:
+                for item in gen:
+                    _emit("item", item)
+                    if stop.is_set():
+                        break
+            except Exception as e:
+                _emit("error", e)
+            finally:
+                gen.close()
+                _emit("end")
+
+        threading.Thread(target=_pump, name="mdt-stream", daemon=True).start()
+        try:
+            while True:
+                kind, payload = await out.get()
+                if kind == "end":
+                    return
+                if kind == "error":
+                    raise payload
+                yield payload
+        finally:
+            stop.set()
+    
     async def _step_1_individual_analysis(self, case_data: Dict[str, Any], 
                                          selected_agents: Optional[List[str]]):
         """
@@ -460,38 +665,42 @@ class MDTOrchestrator:
         # 确定参与分析的智能体（排除协调员）
         active_agents = selected_agents or ["pulmonary", "imaging", "pathology", "rheumatology", "data_analysis"]
         
-        # 创建并行任务
-        tasks = []
-        for agent_name in active_agents:
-            if agent_name in self.agents and agent_name != "coordinator":
-                agent = self.agents[agent_name]
-                task = asyncio.create_task(
-                    self._run_agent_analysis(agent, case_data, [])
-                )
-                tasks.append((agent_name, task))
+        # 结构化并发：信号量限制同时进行的 LLM 调用数；单个智能体失败在任务内处理，不取消其他任务
+        sem = asyncio.Semaphore(self.max_concurrency)
+
+        async def _analyze(agent_name: str):
+            async with sem:
+                try:
+                    result = await self._run_agent_analysis(self.agents[agent_name], case_data, [])
+                except Exception as e:
+                    logger.error(f"Agent {agent_name} analysis failed: {e}")
+                    return format_agent_response(
+                        agent_name, f"分析过程出现错误: {str(e)}", datetime.now()
+                    ), False
+            agent_display_name = result.get('agent') or result.get('agent_name', '未知智能体')
+            self._notify_progress(self.current_phase, 
+                                f"{agent_display_name}独立分析完成", result)
+            return result, True
+
+        async with asyncio.TaskGroup() as tg:
+            tasks = {
+                agent_name: tg.create_task(_analyze(agent_name))
+                for agent_name in active_agents
+                if agent_name in self.agents and agent_name != "coordinator"
+            }
         
-        # 等待所有分析完成并收集结果
-        for agent_name, task in tasks:
-            try:
-                result = await task
-                phase_results[agent_name] = result
-                self.agent_responses.append(result)
-                
-                agent_display_name = result.get('agent') or result.get('agent_name', '未知智能体')
-                self._notify_progress(self.current_phase, 
-                                    f"{agent_display_name}独立分析完成", result)
-                                    
-            except Exception as e:
-                logger.error(f"Agent {agent_name} analysis failed: {e}")
-                error_result = format_agent_response(
-                    agent_name, f"分析过程出现错误: {str(e)}", datetime.now()
-                )
-                phase_results[agent_name] = error_result
+        # 按选择顺序收集结果
+        for agent_name, task in tasks.items():
+            result, ok = task.result()
+            phase_results[agent_name] = result
+            if ok:
+                self.agent_responses_by_name[result.get('agent') or agent_name] = result
         
         self.session_data["phases"]["individual_analysis"] = phase_results
         logger.info(f"Step 1 completed with {len(phase_results)} agent responses")
     
-    async def _step_2_sharing_discussion(self, case_data: Dict[str, Any]):
+    async def _step_2_sharing_discussion(self, case_data: Dict[str, Any],
+                                         selected_agents: Optional[List[str]] = None):
         """
         步骤2：共享和初步讨论
         
@@ -503,44 +712,54 @@ class MDTOrchestrator:
         
         phase_results = {}
         
-        # 为每个智能体进行初步讨论
-        for agent_name, agent in self.agents.items():
-            if agent_name == "coordinator":
+        # 启动前对步骤1的意见做一次快照，所有智能体看到一致的视图
+        snapshot = dict(self.agent_responses_by_name)
+        sem = asyncio.Semaphore(self.max_concurrency)
+
+        async def _discuss(agent, other_opinions):
+            async with sem:
+                result = await self._run_agent_analysis(agent, case_data, other_opinions)
+            agent_display_name = result.get('agent') or result.get('agent_name', '未知智能体')
+            self._notify_progress(MDTPhase.SHARING_DISCUSSION, 
+                                f"{agent_display_name}初步讨论完成", result)
+            return result
+
+        # 仅为本次选中的专科智能体并发进行初步讨论（排除自己的意见）
+        specialist_agents = [name for name in (selected_agents or self.agents.keys()) if name != "coordinator"]
+        tasks = []
+        for agent_name in specialist_agents:
+            agent = self.agents[agent_name]
+            other_opinions = [v for k, v in snapshot.items() if k != agent.name]
+            if other_opinions:
+                tasks.append((agent_name, agent, _discuss(agent, other_opinions)))
+        results = await asyncio.gather(*(coro for _, _, coro in tasks), return_exceptions=True)
+
+        # 按智能体名称合并回全局响应
+        for (agent_name, agent, _), result in zip(tasks, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Sharing discussion failed for {agent_name}: {result}")
                 continue
-                
-            try:
-                # 收集其他专家的意见（排除自己的）
-                other_opinions = [resp for resp in self.agent_responses 
-                                if resp.get("agent") != agent.name]
-                
-                if other_opinions:
-                    # 执行初步讨论分析
-                    result = await self._run_agent_analysis(agent, case_data, other_opinions)
-                    phase_results[agent_name] = result
-                    
-                    # 更新全局响应列表
-                    for i, resp in enumerate(self.agent_responses):
-                        resp_agent = resp.get("agent") or resp.get("agent_name")
-                        if resp_agent == agent.name:
-                            self.agent_responses[i] = result
-                            break
-                    
-                    agent_display_name = result.get('agent') or result.get('agent_name', '未知智能体')
-                    self._notify_progress(self.current_phase, 
-                                        f"{agent_display_name}初步讨论完成", result)
-                
-            except Exception as e:
-                logger.error(f"Sharing discussion failed for {agent_name}: {e}")
+            phase_results[agent_name] = result
+            # 只覆盖快照中已有的意见，避免把步骤1未产出意见的智能体混入后续检测与共识
+            if agent.name in snapshot:
+                self.agent_responses_by_name[agent.name] = result
         
         self.session_data["phases"]["sharing_discussion"] = phase_results
         logger.info(f"Step 2 completed with {len(phase_results)} updated responses")
     
-    async def _step_3_conflict_detection(self, case_data: Dict[str, Any]) -> bool:
+    async def _step_3_conflict_detection(self, case_data: Dict[str, Any],
+                                         opinions: Optional[List[Opinion]] = None,
+                                         precompute_consensus: bool = False) -> bool:
         """
         步骤3：冲突检测
         
         使用协调员智能体检测各专科意见之间的冲突和分歧。
         
+        Args:
+            case_data (Dict[str, Any]): 病例数据
+            opinions (Optional[List[Opinion]]): 待检测的意见快照，默认取当前意见
+            precompute_consensus (bool): 是否与检测并发预先评估共识（无冲突时步骤5复用）
+        
         Returns:
             bool: 是否检测到显著冲突，决定是否需要进入多轮讨论
         """
@@ -550,19 +769,17 @@ class MDTOrchestrator:
         try:
             coordinator = self.agents["coordinator"]
             
-            # 准备当前所有专家意见
-            current_opinions = []
-            for resp in self.agent_responses:
-                if isinstance(resp, dict) and resp.get('response'):
-                    current_opinions.append({
-                        'agent': resp.get('agent', ''),
-                        'response': resp.get('response', ''),
-                        'timestamp': resp.get('timestamp', ''),
-                        'specialty': resp.get('specialty', '')
-                    })
-            
-            # 新：调用外部冲突分析组件
-            conflict_result = await self._run_conflict_detection(coordinator, case_data, current_opinions)
+            # 准备专家意见（流水线模式下为步骤1的快照）
+            current_opinions = opinions if opinions is not None else self._current_opinions()
+            
+            opinion_dicts = _opinion_dicts(current_opinions)
+            if precompute_consensus:
+                # 冲突检测与共识评估并发执行；若无需多轮讨论，步骤5直接复用共识结果
+                conflict_result, consensus_result = await self.conflict_analyzer.analyze_round(case_data, opinion_dicts)
+                if "error" not in consensus_result:
+                    self._round_consensus = (current_opinions, consensus_result["raw"])
+            else:
+                conflict_result = await self._run_conflict_detection(case_data, opinion_dicts)
             conflicts_detected = self._parse_conflict_result(conflict_result)
             conflict_data = conflict_result
             
@@ -579,11 +796,12 @@ class MDTOrchestrator:
             return conflicts_detected
             
         except Exception as e:
-            logger.error(f"Conflict detection failed: {e}")
-            # 如果冲突检测失败，默认进行多轮讨论
-            return True
+            # 冲突检测失败按无冲突处理，避免无谓地多跑三轮讨论
+            logger.error(f"Conflict detection failed, treating as no conflict: {e}")
+            return False
     
-    async def _step_4_multi_round_discussion(self, case_data: Dict[str, Any]):
+    async def _step_4_multi_round_discussion(self, case_data: Dict[str, Any],
+                                             selected_agents: Optional[List[str]] = None):
         """
         步骤4：多轮讨论（最多3轮）
         
@@ -593,6 +811,10 @@ class MDTOrchestrator:
         self._notify_progress(self.current_phase, "开始多轮深入讨论...")
         
         discussion_rounds = []
+        sem = asyncio.Semaphore(self.max_concurrency)
+        prev_signature = None   # 上一轮各专家回答的摘要，用于判断意见是否已稳定
+        # 之前各轮的意见，每轮结束后追加；以初步讨论后的意见（第0轮）起始，使首轮并发讨论也能看到他人观点
+        accumulator: List[Opinion] = self._current_opinions()
         
         for round_num in range(1, self.max_discussion_rounds + 1):
             self.current_round = round_num
@@ -600,46 +822,27 @@ class MDTOrchestrator:
             
             round_results = {}
             
-            # 每一轮讨论中，所有智能体再次分析
-            for agent_name, agent in self.agents.items():
-                if agent_name == "coordinator":
-                    continue
-                    
-                try:
-                    # 包含所有之前轮次的意见和当前轮次已完成的意见
-                    all_opinions = []
-                    
-                    # 添加当前轮次已完成的其他意见
-                    for other_agent, other_result in round_results.items():
-                        if other_agent != agent_name and isinstance(other_result, dict):
-                            all_opinions.append({
-                                'agent': other_result.get('agent', ''),
-                                'response': other_result.get('response', ''),
-                                'round': round_num,
-                                'timestamp': other_result.get('timestamp', '')
-                            })
-                    
-                    # 添加之前轮次的意见
-                    for prev_round in discussion_rounds:
-                        for prev_agent, prev_result in prev_round.items():
-                            if isinstance(prev_result, dict):
-                                all_opinions.append({
-                                    'agent': prev_result.get('agent', ''),
-                                    'response': prev_result.get('response', ''),
-                                    'round': prev_round.get('round', 0),
-                                    'timestamp': prev_result.get('timestamp', '')
-                                })
-                    
-                    # 执行本轮讨论
+            # 同一轮内各智能体同时发言：共享之前轮次意见的同一份快照（每轮转换一次字典）
+            all_opinions = _opinion_dicts(accumulator)
+
+            async def _discuss_round(agent, round_num=round_num, all_opinions=all_opinions):
+                async with sem:
                     result = await self._run_agent_discussion_round(agent, case_data, all_opinions, round_num)
-                    round_results[agent_name] = result
-                    
-                    agent_display_name = result.get('agent') or result.get('agent_name', '未知智能体')
-                    self._notify_progress(self.current_phase, 
-                                        f"第{round_num}轮：{agent_display_name}讨论完成", result)
-                    
-                except Exception as e:
-                    logger.error(f"Round {round_num} discussion failed for {agent_name}: {e}")
+                agent_display_name = result.get('agent') or result.get('agent_name', '未知智能体')
+                self._notify_progress(self.current_phase, 
+                                    f"第{round_num}轮：{agent_display_name}讨论完成", result)
+                return result
+
+            # 每一轮讨论中，所有智能体并发再次分析
+            names = [name for name in (selected_agents or self.agents.keys()) if name != "coordinator"]
+            results = await asyncio.gather(
+                *(_discuss_round(self.agents[name]) for name in names), return_exceptions=True
+            )
+            for agent_name, result in zip(names, results):
+                if isinstance(result, BaseException):
+                    logger.error(f"Round {round_num} discussion failed for {agent_name}: {result}")
+                    continue
+                round_results[agent_name] = result
             
             # 记录本轮结果
             round_data = {
@@ -648,6 +851,24 @@ class MDTOrchestrator:
                 "timestamp": datetime.now().isoformat()
             }
             discussion_rounds.append(round_data)
+            accumulator.extend(
+                Opinion(agent=r['agent'], response=r['response'], timestamp=r['timestamp'], round=round_num)
+                for r in round_results.values()
+            )
+            
+            # 各专家回答与上一轮完全相同时视为意见已稳定，直接结束讨论：
+            # 节省的是后续轮次的专家 LLM 调用（本轮共识度本身是本地关键词重叠计算，并不调用 LLM）
+            round_signature = tuple(
+                hashlib.blake2b(r.get("response", "").encode(), digest_size=8).digest()
+                for _, r in sorted(round_results.items())
+            )
+            if round_signature == prev_signature:
+                round_data["consensus_score"] = 1.0
+                round_data["converged_by_stability"] = True
+                self._notify_progress(self.current_phase, 
+                                    f"第{round_num}轮意见与上一轮一致，讨论已收敛")
+                break
+            prev_signature = round_signature
             
             # 评估本轮后的共识情况
             round_consensus = await self._evaluate_round_consensus(round_results)
@@ -668,10 +889,19 @@ class MDTOrchestrator:
             "max_rounds": self.max_discussion_rounds
         }
         
-        # 更新agent_responses为最后一轮的结果
+        # 更新智能体响应为最后一轮的结果
         if discussion_rounds:
             last_round = discussion_rounds[-1]["results"]
-            self.agent_responses = list(last_round.values())
+            self.agent_responses_by_name = {
+                result.get('agent') or agent_name: result for agent_name, result in last_round.items()
+            }
+            # 推测执行：讨论结束即启动共识评估，与阶段收尾（记录持久化等）重叠，步骤5意见未变时直接等待该任务
+            opinions = self._current_opinions()
+            self._discard_round_consensus()
+            self._round_consensus = (
+                opinions,
+                asyncio.create_task(self._run_consensus_evaluation(self.agents["coordinator"], _opinion_dicts(opinions))),
+            )
         
         logger.info(f"Step 4 completed with {len(discussion_rounds)} rounds")
     
@@ -691,18 +921,18 @@ class MDTOrchestrator:
             coordinator = self.agents["coordinator"]
             
             # 收集当前所有意见
-            current_opinions = []
-            for resp in self.agent_responses:
-                if isinstance(resp, dict) and resp.get('response'):
-                    current_opinions.append({
-                        'agent': resp.get('agent', ''),
-                        'response': resp.get('response', ''),
-                        'timestamp': resp.get('timestamp', ''),
-                        'specialty': resp.get('specialty', '')
-                    })
-            
-            # 使用协调员评估共识（结构留存，未来可替换外部 analyzer.evaluate_consensus）
-            consensus_result = await self._run_consensus_evaluation(coordinator, current_opinions)
+            current_opinions = self._current_opinions()
+            
+            # 意见与提前评估时一致则复用（推测任务则等待其完成），否则重新评估
+            cached = self._round_consensus
+            if cached is not None and cached[0] == current_opinions:
+                self._round_consensus = None
+                consensus_result = cached[1]
+                if isinstance(consensus_result, asyncio.Task):
+                    consensus_result = await consensus_result
+            else:
+                self._discard_round_consensus()
+                consensus_result = await self._run_consensus_evaluation(coordinator, _opinion_dicts(current_opinions))
             consensus_score = consensus_result.get('consensus_score', 0.0)
             consensus_reached = consensus_score >= self.consensus_threshold
             
@@ -747,12 +977,11 @@ class MDTOrchestrator:
             coordinator = self.agents["coordinator"]
             
             # 准备传递给协调员的所有阶段数据
+            phases = self.session_data.get("phases", {})
             all_phases = {
-                "individual_analysis": self.session_data.get("phases", {}).get("individual_analysis", {}),
-                "sharing_discussion": self.session_data.get("phases", {}).get("sharing_discussion", {}),
-                "conflict_detection": self.session_data.get("phases", {}).get("conflict_detection", {}),
-                "multi_round_discussion": self.session_data.get("phases", {}).get("multi_round_discussion", {}),
-                "consensus_evaluation": self.session_data.get("phases", {}).get("consensus_evaluation", {})
+                k: phases.get(k, {})
+                for k in ("individual_analysis", "sharing_discussion", "conflict_detection",
+                          "multi_round_discussion", "consensus_evaluation")
             }
             
             # 执行最终协调
@@ -812,12 +1041,13 @@ class MDTOrchestrator:
         
         # 在线程池中运行同步的智能体分析方法
         # 这样不会阻塞主事件循环
-        return await loop.run_in_executor(
-            None,                           # 使用默认的ThreadPoolExecutor
-            agent.analyze_case,             # 要执行的同步方法
-            case_data,                      # 传递给方法的参数
-            other_opinions
-        )
+        async with _llm_semaphore():
+            return await loop.run_in_executor(
+                None,                           # 使用默认的ThreadPoolExecutor
+                agent.analyze_case,             # 要执行的同步方法
+                case_data,                      # 传递给方法的参数
+                other_opinions
+            )
     
     async def _run_coordinator_analysis(self, coordinator, case_data: Dict[str, Any], 
                                       phase_results: Dict[str, Any]) -> Dict[str, Any]:
@@ -848,12 +1078,13 @@ class MDTOrchestrator:
         loop = asyncio.get_event_loop()
         
         # 在线程池中运行协调员的专门方法
-        return await loop.run_in_executor(
-            None,                                    # 使用默认线程池
-            coordinator.coordinate_mdt_discussion,   # 协调员专用方法
-            case_data,                              # 病例数据
-            phase_results                           # 结构化的阶段结果
-        )
+        async with _llm_semaphore():
+            return await loop.run_in_executor(
+                None,                                    # 使用默认线程池
+                coordinator.coordinate_mdt_discussion,   # 协调员专用方法
+                case_data,                              # 病例数据
+                phase_results                           # 结构化的阶段结果
+            )
     
     def _calculate_duration(self) -> str:
         """
@@ -909,7 +1140,7 @@ class MDTOrchestrator:
             "current_phase": self.current_phase.value,
             "participants": self.session_data.get("participants", []),
             "completed_phases": list(self.session_data.get("phases", {}).keys()),
-            "agent_responses_count": len(self.agent_responses),
+            "agent_responses_count": len(self.agent_responses_by_name),
             "start_time": self.session_data.get("start_time")
         }
     
@@ -948,60 +1179,65 @@ class MDTOrchestrator:
             - 清空会话数据
             - 清空智能体响应列表
             - 重置讨论轮数
+            - 清空各智能体的对话历史与RAG检索缓存
             
         注意：
-            - 不会重置智能体实例本身
+            - 不会重建智能体实例本身
             - 不会清除进度回调函数
             - 主要用于多次会话之间的状态清理
         """
         self.current_phase = MDTPhase.INITIALIZATION
         self.session_data = {}
-        self.agent_responses = []
+        self.agent_responses_by_name = {}
         self.current_round = 0
+        self._discard_round_consensus()
+        for agent in self.agents.values():
+            agent.clear_history()
         logger.info("MDT session reset")
     
     # === 新增的辅助方法 ===
     
-    async def _run_conflict_detection(self, coordinator, case_data: Dict[str, Any], opinions: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """运行冲突检测分析 (委派给 ConflictAnalyzer / 仍保持异步接口)"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            None,
-            self.conflict_analyzer.detect,
-            case_data,
-            opinions
-        )
+    async def _run_conflict_detection(self, case_data: Dict[str, Any], opinions: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """仅运行冲突检测 (委派给 ConflictAnalyzer，返回规范化结果)"""
+        return await self.conflict_analyzer.adetect(case_data, opinions)
     
     def _parse_conflict_result(self, conflict_result: Dict[str, Any]) -> bool:
-        """解析冲突检测结果 (可替换为更复杂的解析逻辑)"""
+        """解析冲突检测结果：冲突分数优先，其次结构化布尔字段，最后关键词"""
         try:
+            score = conflict_result.get('conflict_score')
+            if score is None:
+                score = extract_conflict_score(conflict_result.get('response'))
+            if score is not None:
+                return score >= self.conflict_threshold
             if 'conflicts_detected' in conflict_result:
                 return conflict_result['conflicts_detected']
             if 'conflict_detected' in conflict_result:
                 return conflict_result['conflict_detected']
-            text = (conflict_result.get('response') or '').lower()
-            for kw in ['冲突', '分歧', '矛盾', '不一致']:
-                if kw in text:
-                    return True
+            text = str(conflict_result.get('response') or '')
+            if any(kw in text for kw in ('冲突', '分歧', '矛盾', '不一致')):
+                return True
             score = conflict_result.get('consensus_score')
             if score is not None:
                 return score < self.consensus_threshold
             return False
-        except Exception:
-            return True
+        except Exception as e:
+            # 解析失败不默认进入多轮讨论，避免无谓地多跑三轮
+            logger.warning(f"Failed to parse conflict result: {e}")
+            return False
     
     async def _run_agent_discussion_round(self, agent, case_data: Dict[str, Any], 
                                         all_opinions: List[Dict[str, Any]], 
                                         round_num: int) -> Dict[str, Any]:
         """运行智能体的讨论轮次"""
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            None,
-            agent.discuss_round,
-            case_data,
-            all_opinions,
-            round_num
-        )
+        async with _llm_semaphore():
+            return await loop.run_in_executor(
+                None,
+                agent.discuss_round,
+                case_data,
+                all_opinions,
+                round_num
+            )
     
     async def _evaluate_round_consensus(self, round_results: Dict[str, Any]) -> float:
         """评估单轮讨论后的共识度"""
@@ -1042,24 +1278,26 @@ class MDTOrchestrator:
                                       opinions: List[Dict[str, Any]]) -> Dict[str, Any]:
         """运行共识评估"""
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            None,
-            coordinator.evaluate_consensus,
-            opinions
-        )
+        async with _llm_semaphore():
+            return await loop.run_in_executor(
+                None,
+                coordinator.evaluate_consensus,
+                opinions
+            )
     
     async def _run_final_coordination(self, coordinator, case_data: Dict[str, Any], 
                                     all_phases: Dict[str, Any], 
                                     consensus_reached: bool) -> Dict[str, Any]:
         """运行最终协调"""
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            None,
-            coordinator.final_coordination,
-            case_data,
-            all_phases,
-            consensus_reached
-        )
+        async with _llm_semaphore():
+            return await loop.run_in_executor(
+                None,
+                coordinator.final_coordination,
+                case_data,
+                all_phases,
+                consensus_reached
+            )
     
     # ==================== 流式执行方法 ====================
     
@@ -1080,7 +1318,7 @@ class MDTOrchestrator:
                     "agent": agent.name,
                     "specialty": agent.specialty,
                     "message": f"{agent.name}开始独立分析",
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": _now_iso()
                 })
                 for chunk in agent.analyze_case(case_data, stream=True):
                     if not isinstance(chunk, dict):
@@ -1092,7 +1330,7 @@ class MDTOrchestrator:
                             "response": chunk.get("response", chunk.get("full_response", "")),
                             "specialty": agent.specialty,
                             "phase": "individual_analysis",
-                            "timestamp": datetime.now().isoformat()
+                            "timestamp": _now_iso()
                         }
                         with results_lock:
                             analysis_results[agent_key] = standard_result
@@ -1102,7 +1340,7 @@ class MDTOrchestrator:
                             "agent": agent.name,
                             "specialty": agent.specialty,
                             "result": standard_result,
-                            "timestamp": datetime.now().isoformat()
+                            "timestamp": _now_iso()
                         })
                     else:
                         event_queue.put({
@@ -1112,7 +1350,7 @@ class MDTOrchestrator:
                             "specialty": agent.specialty,
                             "chunk": chunk.get("response_chunk", ""),
                             "full_response": chunk.get("full_response", ""),
-                            "timestamp": datetime.now().isoformat()
+                            "timestamp": _now_iso()
                         })
             except Exception as e:
                 logger.error(f"Parallel individual analysis error for {agent_key}: {e}")
@@ -1139,7 +1377,7 @@ class MDTOrchestrator:
             "phase": "individual_analysis",
             "message": "独立分析阶段完成",
             "results": analysis_results,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _now_iso()
         }
     
     def _step_2_sharing_discussion_stream(self, case_data: Dict[str, Any], 
@@ -1160,7 +1398,7 @@ class MDTOrchestrator:
                     "agent": agent.name,
                     "specialty": agent.specialty,
                     "message": f"{agent.name}开始参与讨论",
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": _now_iso()
                 })
                 for chunk in agent.analyze_case(case_data, individual_results, stream=True):
                     if chunk.get("is_complete"):
@@ -1169,7 +1407,7 @@ class MDTOrchestrator:
                             "response": chunk.get("response", chunk.get("full_response", "")),
                             "specialty": agent.specialty,
                             "phase": "sharing_discussion",
-                            "timestamp": datetime.now().isoformat()
+                            "timestamp": _now_iso()
                         }
                         with results_lock:
                             sharing_results[agent_key] = standard_result
@@ -1179,7 +1417,7 @@ class MDTOrchestrator:
                             "agent": agent.name,
                             "specialty": agent.specialty,
                             "result": standard_result,
-                            "timestamp": datetime.now().isoformat()
+                            "timestamp": _now_iso()
                         })
                     else:
                         event_queue.put({
@@ -1189,7 +1427,7 @@ class MDTOrchestrator:
                             "specialty": agent.specialty,
                             "chunk": chunk.get("response_chunk", ""),
                             "full_response": chunk.get("full_response", ""),
-                            "timestamp": datetime.now().isoformat()
+                            "timestamp": _now_iso()
                         })
             except Exception as e:
                 logger.error(f"Parallel sharing discussion error for {agent_key}: {e}")
@@ -1215,7 +1453,7 @@ class MDTOrchestrator:
             "phase": "sharing_discussion",
             "message": "初步讨论阶段完成",
             "results": sharing_results,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _now_iso()
         }
     
     def _step_3_conflict_detection_stream(self, case_data: Dict[str, Any]) -> Generator[Dict[str, Any], None, None]:
@@ -1236,7 +1474,7 @@ class MDTOrchestrator:
             "phase": "conflict_detection",
             "agent": coordinator.name,
             "message": "协调员开始冲突检测分析",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _now_iso()
         }
         
         # ===== 真正流式：直接流式调用 LLM =====
@@ -1262,6 +1500,7 @@ class MDTOrchestrator:
 如果没有显著冲突，请说明专家意见的一致性。
 
 请以"检测结果："开头，明确回答是否有显著冲突。
+并单独一行给出 CONFLICT_SCORE: <0~1 的小数，分歧越大越高>。
 """
             full_response = ""
             # 底层流式生成器（逐小块内容）
@@ -1275,27 +1514,32 @@ class MDTOrchestrator:
                     "agent": coordinator.name,
                     "chunk": piece,
                     "full_response": full_response,
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": _now_iso()
                 }
             # 生成最终结果结构
-            conflict_detected = coordinator._analyze_conflict_response(full_response)
+            conflict_score = extract_conflict_score(full_response)
+            if conflict_score is not None:
+                conflict_detected = conflict_score >= self.conflict_threshold
+            else:
+                conflict_detected = coordinator._analyze_conflict_response(full_response)
             consensus_score = coordinator._calculate_consensus(opinions_text)
             conflict_result = {
                 "agent": coordinator.name,
                 "conflict_detected": conflict_detected,
                 "conflicts_detected": conflict_detected,
+                "conflict_score": conflict_score,
                 "conflict_analysis": full_response,
                 "response": full_response,
                 "consensus_score": consensus_score,
                 "opinions_analyzed": len(all_opinions),
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             yield {
                 "type": "agent_complete",
                 "phase": "conflict_detection",
                 "agent": coordinator.name,
                 "result": conflict_result,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             self.session_data["phases"]["conflict_detection"] = conflict_result
             yield {
@@ -1304,33 +1548,33 @@ class MDTOrchestrator:
                 "conflict_detected": conflict_detected,
                 "result": conflict_result,
                 "message": "检测到意见分歧" if conflict_detected else "专家意见基本一致",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             # 结束：不直接 return 布尔值，生成器自然结束
             return
         except Exception as e:
-            logger.error(f"Streaming conflict detection failed: {e}")
+            logger.error(f"Streaming conflict detection failed, treating as no conflict: {e}")
             error_result = {
                 "agent": coordinator.name,
-                "conflict_detected": True,
+                "conflict_detected": False,
                 "response": f"冲突检测流式过程出现错误: {e}",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             yield {
                 "type": "agent_complete",
                 "phase": "conflict_detection",
                 "agent": coordinator.name,
                 "result": error_result,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             self.session_data["phases"]["conflict_detection"] = error_result
             yield {
                 "type": "phase_complete",
                 "phase": "conflict_detection",
-                "conflict_detected": True,
+                "conflict_detected": False,
                 "result": error_result,
                 "message": "冲突检测失败",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             return
     
@@ -1347,7 +1591,7 @@ class MDTOrchestrator:
                 "phase": "multi_round_discussion",
                 "round": round_num,
                 "message": f"开始第{round_num}轮讨论",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             
             round_results = {"round": round_num, "results": {}}
@@ -1378,7 +1622,7 @@ class MDTOrchestrator:
                     "agent": agent.name,
                     "specialty": agent.specialty,
                     "message": f"{agent.name}开始第{round_num}轮讨论",
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": _now_iso()
                 }
                 
                 # 流式获取讨论结果
@@ -1391,7 +1635,7 @@ class MDTOrchestrator:
                             "specialty": agent.specialty,
                             "phase": "multi_round_discussion",
                             "round": round_num,
-                            "timestamp": datetime.now().isoformat()
+                            "timestamp": _now_iso()
                         }
                         round_results["results"][agent_name] = standard_result
                         yield {
@@ -1401,7 +1645,7 @@ class MDTOrchestrator:
                             "agent": agent.name,
                             "specialty": agent.specialty,
                             "result": standard_result,
-                            "timestamp": datetime.now().isoformat()
+                            "timestamp": _now_iso()
                         }
                     else:
                         yield {
@@ -1412,7 +1656,7 @@ class MDTOrchestrator:
                             "specialty": agent.specialty,
                             "chunk": chunk.get("response_chunk", ""),
                             "full_response": chunk.get("full_response", ""),
-                            "timestamp": datetime.now().isoformat()
+                            "timestamp": _now_iso()
                         }
             
             # 评估本轮共识度
@@ -1428,7 +1672,7 @@ class MDTOrchestrator:
                 "round": round_num,
                 "consensus_score": consensus_score,
                 "message": f"第{round_num}轮讨论完成，共识度: {consensus_score:.2f}",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             
             # 如果达到共识阈值，提前结束
@@ -1438,7 +1682,7 @@ class MDTOrchestrator:
                     "phase": "multi_round_discussion",
                     "total_rounds": round_num,
                     "message": f"在第{round_num}轮达成共识，结束讨论",
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": _now_iso()
                 }
                 break
         
@@ -1453,7 +1697,7 @@ class MDTOrchestrator:
             "phase": "multi_round_discussion",
             "total_rounds": len(discussion_rounds),
             "results": discussion_rounds,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _now_iso()
         }
     
     def _step_5_consensus_evaluation_stream(self) -> Generator[Dict[str, Any], None, None]:
@@ -1479,7 +1723,7 @@ class MDTOrchestrator:
             "phase": "consensus_evaluation",
             "agent": coordinator.name,
             "message": "协调员开始共识评估",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _now_iso()
         }
         
         # ===== 真正流式：直接流式调用 LLM =====
@@ -1510,7 +1754,7 @@ class MDTOrchestrator:
                     "agent": coordinator.name,
                     "chunk": piece,
                     "full_response": full_response,
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": _now_iso()
                 }
             llm_score = coordinator._extract_consensus_score(full_response)
             calculated_score = coordinator._calculate_consensus(opinions_text)
@@ -1527,14 +1771,14 @@ class MDTOrchestrator:
                 "llm_score": llm_score,
                 "calculated_score": calculated_score,
                 "opinions_count": len(all_opinions),
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             yield {
                 "type": "agent_complete",
                 "phase": "consensus_evaluation",
                 "agent": coordinator.name,
                 "result": consensus_result,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             self.session_data["phases"]["consensus_evaluation"] = consensus_result
             yield {
@@ -1543,7 +1787,7 @@ class MDTOrchestrator:
                 "consensus_reached": consensus_reached,
                 "result": consensus_result,
                 "message": "专家已达成共识" if consensus_reached else "需要进一步协调",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             return
         except Exception as e:
@@ -1554,14 +1798,14 @@ class MDTOrchestrator:
                 "consensus_reached": False,
                 "threshold": 0.75,
                 "response": f"共识评估流式过程出现错误: {e}",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             yield {
                 "type": "agent_complete",
                 "phase": "consensus_evaluation",
                 "agent": coordinator.name,
                 "result": error_result,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             self.session_data["phases"]["consensus_evaluation"] = error_result
             yield {
@@ -1570,7 +1814,7 @@ class MDTOrchestrator:
                 "consensus_reached": False,
                 "result": error_result,
                 "message": "共识评估失败",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
             return
     
@@ -1585,7 +1829,7 @@ class MDTOrchestrator:
             "phase": "final_coordination",
             "agent": coordinator.name,
             "message": "协调员开始生成最终建议",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _now_iso()
         }
         
         # 收集所有标准格式的专家意见
@@ -1612,7 +1856,7 @@ class MDTOrchestrator:
                     "response": chunk.get("response", chunk.get("full_response", "")),
                     "specialty": coordinator.specialty,
                     "phase": "final_coordination",
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": _now_iso()
                 }
                 
                 # 保存最终协调结果
@@ -1624,7 +1868,7 @@ class MDTOrchestrator:
                     "phase": "final_coordination",
                     "agent": coordinator.name,
                     "result": standard_result,
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": _now_iso()
                 }
                 
                 yield {
@@ -1632,7 +1876,7 @@ class MDTOrchestrator:
                     "phase": "final_coordination",
                     "message": "最终协调完成",
                     "result": standard_result,
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": _now_iso()
                 }
             else:
                 yield {
@@ -1641,7 +1885,7 @@ class MDTOrchestrator:
                     "agent": coordinator.name,
                     "chunk": chunk.get("response_chunk", ""),
                     "full_response": chunk.get("full_response", ""),
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": _now_iso()
                 }
     
     def _calculate_simple_consensus(self, responses: List[str]) -> float:
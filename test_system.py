@@ -143,6 +143,79 @@ def test_orchestrator():
         print(f"❌ 编排器测试失败: {e}")
         return False
 
+def test_pipelined_conflict_detection_reuse():
+    """测试流水线冲突检测：初步讨论后选中专家意见未变时沿用步骤1的检测结果，不再重复检测"""
+    print("\n🔀 测试流水线冲突检测复用...")
+
+    import asyncio
+    import tempfile
+    from datetime import datetime
+    import mdt_system.orchestrator as orch_module
+
+    class FakeSpecialist:
+        specialty = "测试专科"
+
+        def __init__(self):
+            self.name = type(self).__name__
+            self.conversation_history = []
+            self.last_retrieved_chunks = []
+
+        def analyze_case(self, case_data, other_opinions=None):
+            # 无论是否看到他人意见都给出相同回答，模拟初步讨论后意见未变
+            return {
+                "agent": self.name,
+                "specialty": self.specialty,
+                "response": f"{self.name}：考虑普通型间质性肺炎，建议随访肺功能",
+                "timestamp": datetime.now().isoformat(),
+            }
+
+    class FakeCoordinator(FakeSpecialist):
+        def __init__(self):
+            super().__init__()
+            self.detect_calls = []
+            self.consensus_calls = 0
+
+        def detect_conflicts(self, case_data, opinions):
+            self.detect_calls.append(len(opinions))
+            return {"response": "CONFLICT_SCORE: 0.1\n意见基本一致"}
+
+        def evaluate_consensus(self, opinions):
+            self.consensus_calls += 1
+            return {"consensus_score": 0.9}
+
+        def final_coordination(self, case_data, all_phases, consensus_reached):
+            return {"agent": self.name, "response": "最终建议", "timestamp": datetime.now().isoformat()}
+
+    patched = ("PulmonaryAgent", "ImagingAgent", "PathologyAgent",
+               "RheumatologyAgent", "DataAnalysisAgent", "CoordinatorAgent")
+    originals = {name: getattr(orch_module, name) for name in patched}
+    for name in patched:
+        base = FakeCoordinator if name == "CoordinatorAgent" else FakeSpecialist
+        setattr(orch_module, name, type(name, (base,), {}))
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)   # 会话记录写入临时目录下的 ./data/sessions
+            orchestrator = orch_module.MDTOrchestrator()
+            case_data = {"patient_id": "T001", "symptoms": "活动后气促", "medical_history": "无"}
+            session = asyncio.run(orchestrator.conduct_mdt_session(case_data, ["呼吸科专家", "影像科专家"]))
+    finally:
+        os.chdir(cwd)
+        for name, cls in originals.items():
+            setattr(orch_module, name, cls)
+
+    coordinator = orchestrator.agents["coordinator"]
+    # 仅选中的两位专家参与讨论，初步讨论不会混入未选中的专家
+    assert set(session["phases"]["sharing_discussion"]) == {"pulmonary", "imaging"}
+    assert set(orchestrator.agent_responses_by_name) == {"PulmonaryAgent", "ImagingAgent"}
+    # 意见未漂移：冲突检测只执行一次（基于步骤1的两条意见），结果被直接沿用
+    assert coordinator.detect_calls == [2], coordinator.detect_calls
+    assert session["phases"]["conflict_detection"]["opinions_source"] == "individual_analysis"
+    assert coordinator.consensus_calls == 1
+    assert "multi_round_discussion" not in session["phases"]
+    print("✅ 初步讨论后意见未变，沿用步骤1的冲突检测结果")
+    return True
+
 def run_all_tests():
     """运行所有测试"""
     print("🏥 多智能体MDT系统 - 系统测试")
@@ -153,7 +226,8 @@ def run_all_tests():
         ("系统配置", test_configuration),
         ("知识库连接", test_knowledge_store),
         ("智能体创建", test_agents),
-        ("MDT编排器", test_orchestrator)
+        ("MDT编排器", test_orchestrator),
+        ("流水线冲突检测", test_pipelined_conflict_detection_reuse)
     ]
     
     passed = 0
@@ -30,16 +30,45 @@ class Config:
     # 系统配置
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     MAX_TOKENS: int = int(os.getenv("MAX_TOKENS", "2000"))
+    MDT_MAX_CONCURRENCY: int = int(os.getenv("MDT_MAX_CONCURRENCY", "8"))  # 同一阶段内并发的智能体 LLM 调用上限
+    MAX_CONCURRENT_LLM_CALLS: int = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "8"))  # 进程内同时进行的 LLM 调用上限（跨会话共享）
+    CONFLICT_RECHECK_SIMILARITY: float = float(os.getenv("CONFLICT_RECHECK_SIMILARITY", "0.5"))  # 初步讨论后意见相似度低于该值时重新检测冲突
     CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", "1000"))
     CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "200"))
     RAG_MULTI_QUERY: bool = False  # 是否启用多查询扩展检索
     # Embedding
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
     EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    EMBEDDING_CONCURRENCY: int = int(os.getenv("EMBEDDING_CONCURRENCY", "8"))  # OpenAI 嵌入并发请求数
+    # 嵌入磁盘缓存：按 chunk 文本 SHA-256 存 .npy，重建时未变化的 chunk 不再调用嵌入
+    EMBEDDING_CACHE: bool = os.getenv("EMBEDDING_CACHE", "true").lower() in ("1","true","yes")
+    EMBEDDING_CACHE_DIR: str = os.getenv("EMBEDDING_CACHE_DIR", "knowledge/embeddings_cache")
+    # 查询向量 lru 缓存条数（同文本查询只嵌入一次）
+    QUERY_EMBED_CACHE_SIZE: int = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "2048"))
+    # 查询级语义缓存（QVCache）：与已缓存查询余弦相似度不低于阈值时复用检索结果
+    QVCACHE_SIZE: int = int(os.getenv("QVCACHE_SIZE", "256"))
+    QVCACHE_THRESHOLD: float = float(os.getenv("QVCACHE_THRESHOLD", "0.95"))
     SHOW_EMBED_PROGRESS: bool = os.getenv("SHOW_EMBED_PROGRESS", "true").lower() in ("1","true","yes")
     # 本地嵌入后备策略: auto | openai | local
     EMBEDDING_PROVIDER: str = os.getenv("EMBEDDING_PROVIDER", "auto").lower()
     LOCAL_EMBEDDING_MODEL: str = os.getenv("LOCAL_EMBEDDING_MODEL", "BAAI/bge-small-zh-v1.5")
+    # FAISS 索引档位：不足 IVF_TRAIN_THRESHOLD 用平面索引，其后为 IVF-SQ8，达到 IVF_PQ_THRESHOLD 改用 IVF-PQ；
+    # IVF_NPROBE 为检索时探查的倒排列表数
+    IVF_TRAIN_THRESHOLD: int = int(os.getenv("IVF_TRAIN_THRESHOLD", "50000"))
+    IVF_PQ_THRESHOLD: int = int(os.getenv("IVF_PQ_THRESHOLD", "500000"))
+    IVF_NPROBE: int = int(os.getenv("IVF_NPROBE", "16"))
+    # 索引类型：auto 按上述阈值分档；flat / hnsw / ivf / pq 为固定类型（manage_kb.py rebuild --index-type 可覆盖）
+    FAISS_INDEX_TYPE: str = os.getenv("FAISS_INDEX_TYPE", "auto").lower()
+    HNSW_EF_SEARCH: int = int(os.getenv("HNSW_EF_SEARCH", "64"))
+    # FAISS OpenMP 线程数，0 表示取物理核数
+    FAISS_THREADS: int = int(os.getenv("FAISS_THREADS", "0"))
+    # 向量编码：fp32 / fp16（半精度，内存减半）/ pq8（8bit 乘积量化）；auto 档位下仅作用于平面档
+    FAISS_QUANT: str = os.getenv("FAISS_QUANT", "fp32").lower()
+    # 以内存映射只读方式加载索引（冷启动快、由 OS 分页）；写入时会自动整体载入内存
+    FAISS_MMAP: bool = os.getenv("FAISS_MMAP", "false").lower() in ("1","true","yes")
+    # 多 worker 部署：各进程以只读 mmap 共享同一索引（共用 OS 页缓存）。入库应只在单独的写入进程中执行，
+    # 写入后更新 index.version，读进程在下次检索时发现版本变化即重新映射
+    FAISS_SHARED_MMAP: bool = os.getenv("FAISS_SHARED_MMAP", "false").lower() in ("1","true","yes")
     
     @classmethod
     def validate(cls) -> bool:
@@ -2,6 +2,13 @@ import logging
 import json
 from typing import Dict, List, Any, Optional
 from datetime import datetime
+try:  # 可选依赖：orjson 读写会话记录更快，缺失时回退标准库 json
+    import orjson
+except ImportError:
+    orjson = None
+
+# 阶段数据中可能混入 numpy 分数/向量，由 orjson 直接序列化
+_ORJSON_OPTS = (orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson is not None else 0
 
 def setup_logging(level: str = "INFO") -> None:
     """设置日志配置"""
@@ -53,13 +60,44 @@ def save_mdt_session(session_data: Dict[str, Any], filename: Optional[str] = Non
     filepath = f"./data/sessions/{filename}"
     os.makedirs(os.path.dirname(filepath), exist_ok=True)
     
+    if orjson is not None:
+        try:
+            payload = orjson.dumps(session_data, option=_ORJSON_OPTS)
+        except TypeError:  # orjson.JSONEncodeError 是 TypeError 子类；交给标准库处理
+            payload = None
+        if payload is not None:
+            with open(filepath, 'wb') as f:
+                f.write(payload)
+            return filepath
     with open(filepath, 'w', encoding='utf-8') as f:
         json.dump(session_data, f, ensure_ascii=False, indent=2)
     
     return filepath
 
+def session_journal_path(session_id: str) -> str:
+    """会话增量记录 (JSONL) 的路径"""
+    return f"./data/sessions/{session_id}.jsonl"
+
+def append_session_record(filepath: str, record: Dict[str, Any]) -> None:
+    """向会话增量记录追加一行；会话中途崩溃时已完成阶段的结果仍可恢复"""
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    if orjson is not None:
+        try:
+            line = orjson.dumps(record, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            line = None
+        if line is not None:
+            with open(filepath, 'ab') as f:
+                f.write(line)
+            return
+    with open(filepath, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
 def load_mdt_session(filepath: str) -> Dict[str, Any]:
     """加载MDT会议记录"""
+    if orjson is not None:
+        with open(filepath, 'rb') as f:
+            return orjson.loads(f.read())
     with open(filepath, 'r', encoding='utf-8') as f:
         return json.load(f)
 